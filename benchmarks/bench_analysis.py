@@ -0,0 +1,290 @@
+"""
+Benchmark and accuracy suite for vox/audio_processing.py.
+
+Runs every extractor on synthetic vowels (known f0, formants, jitter and
+noise) for a range of chunk sizes and reports per-call p50/p99 latency, peak
+traced allocations and the estimation error against the synthesizer's ground
+truth:
+
+    pitch        |estimate - f0| in cents
+    formants     mean |F1..F3 - truth| in Hz
+    hnr          |HNR - SNR| in dB (approximate: jitter also lowers HNR)
+    jitter       |jitter_local - truth| in percentage points
+    harmonics    mean |level - truth| in dB, relative to H1
+
+The ``aubio_stream`` row is the raw_audio path: frames pushed through an
+AudioStream (decimation, ring buffer, per-session aubio tracker), timed per
+frame.
+
+    python -m benchmarks.bench_analysis
+    python -m benchmarks.bench_analysis --json baseline.json
+    python -m benchmarks.bench_analysis --compare baseline.json
+
+Allocations are what tracemalloc sees (Python and NumPy buffers); memory
+allocated inside Praat or aubio is not traced.
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+import numpy as np
+
+from vox.audio_processing import (
+    PitchTracker,
+    analyze_batch,
+    estimate_harmonics,
+    extract_formants_parselmouth,
+    extract_harmonics,
+    extract_hnr_parselmouth,
+    extract_pitch_parselmouth,
+    extract_voice_quality_parselmouth,
+    formant_summary,
+    track_formants,
+)
+from vox.audio_stream import AudioStream, ANALYSIS_SAMPLE_RATE
+from benchmarks.synthetic import DEFAULT_FORMANTS, glottal_epochs, harmonic_levels, jitter_local, synth_voice
+
+SR = 44100
+CHUNK_SIZES = (1024, 2048, 4096, 8192)
+PITCHES = (110, 180, 250)
+JITTER = 0.01
+NOISE_DB = 30
+REPEATS = 30
+# Slower by more than this fraction of the baseline p50 is flagged by --compare
+REGRESSION_THRESHOLD = 0.2
+# extractor -> the reference it must be at least as accurate as, per chunk
+# size. The formant tracker stays out of analyze_chunk/analyze_segment until
+# it passes this on real recordings too.
+ACCURACY_GATES = {"tracked_formants": "praat_formants"}
+
+
+def cents(estimate, truth):
+    if not estimate or estimate <= 0:
+        return float("nan")
+    return abs(1200 * np.log2(estimate / truth))
+
+
+def formant_error(formants):
+    # A formant that wasn't found counts as 0 Hz, i.e. the whole truth is missed
+    freqs = [f["freq"] or 0.0 for f in formants[:len(DEFAULT_FORMANTS)]]
+    return float(np.mean([abs(f - truth) for f, (truth, _) in zip(freqs, DEFAULT_FORMANTS)]))
+
+
+def harmonic_error(harmonics, f0):
+    amps = np.array([max(h["amp"], 1e-12) for h in harmonics])
+    levels = 20 * np.log10(amps)
+    return float(np.mean(np.abs((levels - levels[0]) - harmonic_levels(f0, SR))))
+
+
+def lpc_formants(audio, sr):
+    return analyze_batch(audio[np.newaxis, :], sr)[0]["formants"]
+
+
+# name -> (call(audio, f0), error(result, case))
+EXTRACTORS = {
+    "praat_pitch": (
+        lambda audio, f0: extract_pitch_parselmouth(audio, SR),
+        lambda result, case: cents(result, case["f0"])
+    ),
+    "praat_formants": (
+        lambda audio, f0: extract_formants_parselmouth(audio, SR),
+        lambda result, case: formant_error(result)
+    ),
+    "lpc_formants": (
+        lambda audio, f0: lpc_formants(audio, SR),
+        lambda result, case: formant_error(result)
+    ),
+    "tracked_formants": (
+        lambda audio, f0: formant_summary(track_formants(audio, SR)),
+        lambda result, case: formant_error(result)
+    ),
+    "praat_hnr": (
+        lambda audio, f0: extract_hnr_parselmouth(audio, SR),
+        lambda result, case: abs(result - NOISE_DB)
+    ),
+    "praat_jitter": (
+        lambda audio, f0: extract_voice_quality_parselmouth(audio, SR),
+        lambda result, case: 100 * abs(result["jitter_local"] - case["jitter"])
+    ),
+    "hpss_harmonics": (
+        lambda audio, f0: extract_harmonics(audio, f0, SR),
+        lambda result, case: harmonic_error(result, case["f0"])
+    ),
+    "fft_harmonics": (
+        lambda audio, f0: estimate_harmonics(audio, f0, SR)["harmonics"],
+        lambda result, case: harmonic_error(result, case["f0"])
+    ),
+}
+
+UNITS = {
+    "praat_pitch": "cents", "aubio_stream": "cents",
+    "praat_formants": "Hz", "lpc_formants": "Hz", "tracked_formants": "Hz",
+    "praat_hnr": "dB", "praat_jitter": "pp",
+    "hpss_harmonics": "dB", "fft_harmonics": "dB",
+}
+
+
+def make_case(f0, chunk):
+    # Take the chunk from the middle of a longer vowel so it starts mid-cycle
+    duration = (3 * chunk) / SR
+    audio = synth_voice(f0, SR, duration, jitter=JITTER, noise_db=NOISE_DB)
+    start = chunk
+    epochs = glottal_epochs(f0, SR, duration, jitter=JITTER)
+    return {
+        "f0": f0,
+        "audio": audio[start:start + chunk],
+        "jitter": jitter_local(epochs, start, start + chunk),
+    }
+
+
+def peak_allocation(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def measure(fn, repeats):
+    fn()  # warm-up (librosa/numba compile, Praat initialisation)
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return times, peak_allocation(fn)
+
+
+def bench_extractor(name, chunk, repeats):
+    call, error = EXTRACTORS[name]
+    times, errors, peaks = [], [], []
+    for f0 in PITCHES:
+        case = make_case(f0, chunk)
+        case_times, peak = measure(lambda: call(case["audio"], f0), repeats)
+        times.extend(case_times)
+        peaks.append(peak)
+        errors.append(error(call(case["audio"], f0), case))
+    return times, max(peaks), errors
+
+
+def bench_aubio_stream(chunk, repeats):
+    """
+    Push consecutive frames of ``chunk`` samples through an AudioStream with
+    an aubio tracker, timing each push. At least a second of audio is pushed
+    so that small chunks still complete some analysis windows.
+    """
+    times, errors, peaks = [], [], []
+    analysis_rate = min(SR, ANALYSIS_SAMPLE_RATE)
+    buf_size = 2048 if analysis_rate > 24000 else 1024
+    n_frames = max(repeats, -(-SR // chunk)) + 2
+    for f0 in PITCHES:
+        audio = synth_voice(f0, SR, n_frames * chunk / SR, jitter=JITTER, noise_db=NOISE_DB)
+        stream = AudioStream(SR, pitch_tracker=PitchTracker(analysis_rate, buf_size=buf_size, hop_size=buf_size // 2), vad=False)
+        frames = [audio[i * chunk:(i + 1) * chunk] for i in range(n_frames)]
+        stream.push(frames[0])  # warm-up
+        windows = []
+        for frame in frames[1:-1]:
+            start = time.perf_counter()
+            windows.extend(stream.push(frame))
+            times.append(time.perf_counter() - start)
+        peaks.append(peak_allocation(lambda: stream.push(frames[-1])))
+        pitches = [w["pitch"] for w in windows if w["pitch"]]
+        errors.append(float(np.median([cents(p, f0) for p in pitches])) if pitches else float("nan"))
+    return times, max(peaks), errors
+
+
+def run(chunk_sizes, repeats, names):
+    results = []
+    for chunk in chunk_sizes:
+        for name in names:
+            if name == "aubio_stream":
+                times, peak, errors = bench_aubio_stream(chunk, repeats)
+            else:
+                times, peak, errors = bench_extractor(name, chunk, repeats)
+            times_ms = np.array(times) * 1000
+            results.append({
+                "extractor": name,
+                "chunk": chunk,
+                "p50_ms": float(np.percentile(times_ms, 50)),
+                "p99_ms": float(np.percentile(times_ms, 99)),
+                "peak_kib": peak / 1024,
+                "error": float(np.nanmean(errors)) if not np.all(np.isnan(errors)) else float("nan"),
+                "unit": UNITS[name],
+            })
+            print_row(results[-1])
+    return results
+
+
+def print_header():
+    print(f"{'extractor':<16} {'chunk':>6} {'dur ms':>6} {'p50 ms':>9} {'p99 ms':>9} {'peak KiB':>9} {'error':>6}")
+
+
+def print_row(row, note=""):
+    print(f"{row['extractor']:<16} {row['chunk']:>6} {row['chunk'] / SR * 1000:>6.1f} {row['p50_ms']:>9.3f} "
+          f"{row['p99_ms']:>9.3f} {row['peak_kib']:>9.1f} {row['error']:>6.2f} {row['unit']:<5}{note}")
+
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = {(r["extractor"], r["chunk"]): r for r in json.load(f)}
+    print(f"\nCompared with {baseline_path}:")
+    regressions = 0
+    for row in results:
+        old = baseline.get((row["extractor"], row["chunk"]))
+        if old is None:
+            continue
+        change = row["p50_ms"] / old["p50_ms"] - 1 if old["p50_ms"] else 0.0
+        flag = "  SLOWER" if change > REGRESSION_THRESHOLD else ""
+        regressions += bool(flag)
+        print(f"{row['extractor']:<16} {row['chunk']:>6} p50 {old['p50_ms']:>8.3f} -> {row['p50_ms']:>8.3f} ms "
+              f"({change:+.0%}), error {old['error']:.2f} -> {row['error']:.2f} {row['unit']}{flag}")
+    return regressions
+
+
+def accuracy_gate(results):
+    """
+    Check every ACCURACY_GATES extractor against its reference from the same
+    run; returns the number of chunk sizes where it is less accurate.
+    """
+    rows = {(r["extractor"], r["chunk"]): r for r in results}
+    failures = 0
+    for (name, chunk), row in rows.items():
+        reference = rows.get((ACCURACY_GATES.get(name), chunk))
+        if reference is None:
+            continue
+        failed = not row["error"] <= reference["error"]
+        failures += failed
+        print(f"{name:<16} {chunk:>6} error {row['error']:.2f} vs {reference['extractor']} "
+              f"{reference['error']:.2f} {row['unit']}{'  WORSE' if failed else ''}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark audio analysis latency, allocations and accuracy.")
+    parser.add_argument("--chunks", type=int, nargs="+", default=list(CHUNK_SIZES), help="chunk sizes in samples at 44.1 kHz")
+    parser.add_argument("--repeats", type=int, default=REPEATS, help="timed calls per pitch and chunk size")
+    parser.add_argument("--only", nargs="+", choices=list(EXTRACTORS) + ["aubio_stream"], help="extractors to run")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--compare", help="baseline JSON from an earlier --json run")
+    args = parser.parse_args()
+
+    names = args.only or list(EXTRACTORS) + ["aubio_stream"]
+    print(f"Synthetic vowels: f0 {PITCHES} Hz, jitter {JITTER:.0%}, SNR {NOISE_DB} dB, {SR} Hz\n")
+    print_header()
+    results = run(args.chunks, args.repeats, names)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    print()
+    failures = accuracy_gate(results)
+    if args.compare and compare(results, args.compare):
+        failures += 1
+    if failures:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
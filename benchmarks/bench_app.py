@@ -0,0 +1,224 @@
+"""
+Application benchmark over the in-memory storage backend: the FastAPI
+routes and the vocal_data write path, without Postgres.
+
+Requests go straight into the ASGI app (no server, no HTTP client), from
+``concurrency`` simulated users, each with its own session seeded with
+``--history`` vocal_data rows and their rollups. Every storage round trip
+sleeps for the injected latency, so the numbers separate the app's own cost
+(``--latency-ms 0``) from what a database of a given speed adds. Reports
+per-call p50/p99 latency and throughput.
+
+    python -m benchmarks.bench_app
+    python -m benchmarks.bench_app --latency-ms 0.8 --jitter-ms 0.3 --row-us 2 --concurrency 32
+    python -m benchmarks.bench_app --only performances_page trends --json app.json
+"""
+import os
+
+# Picked up when vox is imported
+os.environ["VOX_STORAGE"] = "memory"
+os.environ.setdefault("VOX_WRITER_FLUSH_MS", "50")
+
+import argparse
+import asyncio
+import base64
+import json
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import numpy as np
+
+REPEATS = 200
+CONCURRENCY = 16
+HISTORY = 500
+WRITER_ROWS = 20000
+
+
+async def asgi_request(app, method, path, body=None, cookie=None):
+    """One request through the ASGI app; returns (status, headers, body)."""
+    path, _, query = path.partition("?")
+    payload = json.dumps(body).encode() if body is not None else b""
+    headers = [(b"host", b"bench"), (b"content-type", b"application/json")]
+    if cookie:
+        headers.append((b"cookie", cookie.encode()))
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method,
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": query.encode(),
+        "root_path": "", "headers": headers, "client": ("127.0.0.1", 1), "server": ("bench", 80),
+    }
+    sent = False
+    response = {"status": None, "headers": [], "body": []}
+
+    async def receive():
+        nonlocal sent
+        if sent:
+            await asyncio.Event().wait()  # no disconnect while the response streams
+        sent = True
+        return {"type": "http.request", "body": payload, "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            response["status"] = message["status"]
+            response["headers"] = message["headers"]
+        elif message["type"] == "http.response.body":
+            response["body"].append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return response["status"], response["headers"], b"".join(response["body"])
+
+
+def session_cookie(headers):
+    for name, value in headers:
+        if name == b"set-cookie" and value.startswith(b"session="):
+            return value.split(b";")[0].decode()
+    return None
+
+
+def cookie_session_id(cookie):
+    # Starlette's session cookie: base64(JSON).timestamp.signature
+    data = cookie.split("=", 1)[1].split(".")[0]
+    return json.loads(base64.b64decode(data + "=" * (-len(data) % 4)))["id"]
+
+
+async def seed_user(app, history):
+    """A session cookie whose session has a user with ``history`` rows and rollups."""
+    from vox.database import VOCAL_DATA_COLUMNS, vocal_data_record
+    from vox.repository import create_user_with_session
+    from vox.rollups import apply_rollups
+
+    _, headers, _ = await asgi_request(app, "GET", "/user/trends")  # any route that assigns a session
+    cookie = session_cookie(headers)
+    sid, user_id = cookie_session_id(cookie), str(uuid.uuid4())
+    now = datetime.utcnow()
+    records = [
+        vocal_data_record(
+            sid, user_id, now - timedelta(minutes=i), 180.0 + i % 40, 15.0 + i % 5,
+            [{"freq": 200.0 * (h + 1), "amp": 1.0 / (h + 1)} for h in range(5)],
+            [{"freq": 700.0, "bw": 80.0}, {"freq": 1200.0, "bw": 90.0}, {"freq": 2600.0, "bw": 120.0}],
+            {"jitter_local": 0.01, "shimmer_local": 0.03}, None,
+        )
+        for i in range(history)
+    ]
+    async with app.state.db_pool.acquire() as conn:
+        await create_user_with_session(conn, sid, user_id, "bench", "they/them", now + timedelta(days=1))
+        await conn.copy_records_to_table("vocal_data", records=records, columns=VOCAL_DATA_COLUMNS)
+        await apply_rollups(conn, [dict(zip(VOCAL_DATA_COLUMNS, record)) for record in records])
+    return cookie
+
+
+# name -> (method, path, body)
+CALLS = {
+    "set_user_info": ("POST", "/user/set_user_info", {"name": "bench", "pronouns": "they/them"}),
+    "performances_page": ("GET", "/user/get_performances?limit=50", None),
+    "performances_ndjson": ("GET", "/user/get_performances?format=ndjson&limit=200", None),
+    "performances_points": ("GET", "/user/get_performances?points=100", None),
+    "trends": ("GET", "/user/trends?granularity=hour", None),
+    "chat_history": ("GET", "/chat/history", None),
+}
+
+
+async def bench_call(app, name, cookies, repeats):
+    method, path, body = CALLS[name]
+    times = []
+    errors = 0
+
+    async def worker(cookie):
+        nonlocal errors
+        await asgi_request(app, method, path, body, cookie)  # warm-up
+        for _ in range(repeats):
+            start = time.perf_counter()
+            status, _, _ = await asgi_request(app, method, path, body, cookie)
+            times.append(time.perf_counter() - start)
+            errors += status >= 400
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(cookie) for cookie in cookies))
+    return times, len(times) / (time.perf_counter() - start), errors
+
+
+async def bench_writer(app, rows, concurrency):
+    """VocalDataWriter.add from ``concurrency`` streams until ``rows`` rows are flushed."""
+    writer = app.state.vocal_writer
+    sid = str(uuid.uuid4())
+    times = []
+    now = datetime.utcnow()
+
+    async def stream(n):
+        for i in range(n):
+            start = time.perf_counter()
+            await writer.add(sid, None, now + timedelta(milliseconds=i), 200.0, 15.0, None, None, None, None)
+            times.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(stream(rows // concurrency) for _ in range(concurrency)))
+    await writer.flush()
+    return times, len(times) / (time.perf_counter() - start), 0
+
+
+def result_row(name, times, rate, errors, latency):
+    times_ms = np.array(times) * 1000
+    return {
+        "call": name,
+        "latency_ms": latency,
+        "p50_ms": float(np.percentile(times_ms, 50)),
+        "p99_ms": float(np.percentile(times_ms, 99)),
+        "rps": rate,
+        "errors": errors,
+    }
+
+
+def print_header():
+    print(f"{'call':<22} {'p50 ms':>9} {'p99 ms':>9} {'rps':>9} {'errors':>7}")
+
+
+def print_row(row):
+    print(f"{row['call']:<22} {row['p50_ms']:>9.3f} {row['p99_ms']:>9.3f} {row['rps']:>9.0f} {row['errors']:>7}")
+
+
+async def run(args):
+    from vox.fastapi_app import app, shutdown_event, startup_event
+    from vox.memory_store import Latency
+
+    await startup_event()
+    app.state.limiter.enabled = False
+    pool = app.state.db_pool
+    results = []
+    try:
+        cookies = [await seed_user(app, args.history) for _ in range(args.concurrency)]
+        # Seeding ran without latency; the timed calls pay it
+        pool.raw_pool.latency = Latency(args.latency_ms, args.jitter_ms, args.row_us)
+        for name in args.only or list(CALLS) + ["writer"]:
+            if name == "writer":
+                times, rate, errors = await bench_writer(app, args.writer_rows, args.concurrency)
+            else:
+                times, rate, errors = await bench_call(app, name, cookies, args.repeats)
+            results.append(result_row(name, times, rate, errors, args.latency_ms))
+            print_row(results[-1])
+    finally:
+        await shutdown_event()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the app's routes over in-memory storage.")
+    parser.add_argument("--only", nargs="+", choices=list(CALLS) + ["writer"], help="calls to run")
+    parser.add_argument("--repeats", type=int, default=REPEATS, help="timed calls per simulated user")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="simulated users")
+    parser.add_argument("--history", type=int, default=HISTORY, help="vocal_data rows per user")
+    parser.add_argument("--writer-rows", type=int, default=WRITER_ROWS, help="rows through VocalDataWriter")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="mean storage round trip")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="round trip standard deviation")
+    parser.add_argument("--row-us", type=float, default=0.0, help="extra time per row returned or written")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    print_header()
+    results = asyncio.run(run(args))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Query benchmark for vox/repository.py: prepared vs pgbouncer statement modes.
+
+Seeds a throwaway user with a session and vocal_data rows, then runs each
+repository read from ``concurrency`` tasks over a pool in each
+VOX_DB_STATEMENT_MODE and reports per-call p50/p99 latency and throughput. The seeded rows are deleted afterwards. ``profile_two_step`` is
+the session lookup followed by a users lookup that the JOIN replaced.
+
+    python -m benchmarks.bench_queries
+    python -m benchmarks.bench_queries --modes prepared --concurrency 1
+    python -m benchmarks.bench_queries --json queries.json
+
+Needs SUPABASE_DB_URL (environment or .env). Run "prepared" against a direct
+connection or a session-mode pooler only; a transaction-mode pooler rejects
+named prepared statements.
+"""
+import argparse
+import asyncio
+import json
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from init_db import get_db_url
+from vox import repository
+
+REPEATS = 500
+CONCURRENCY = 8
+VOCAL_ROWS = 200
+
+
+async def seed(pool):
+    sid, user_id = str(uuid.uuid4()), str(uuid.uuid4())
+    now = datetime.utcnow()
+    async with pool.acquire() as conn:
+        await repository.create_user_with_session(conn, sid, user_id, "bench", "they/them", now + timedelta(hours=1))
+        await conn.executemany(
+            "INSERT INTO vocal_data (user_id, session_id, timestamp, pitch, hnr, f1, f2, f3, harmonic_amps, jitter, shimmer) "
+            "VALUES ($1, $2, $3, $4, $5, 700, 1200, 2600, '{1,0.5,0.3,0.2,0.1}', 0.01, 0.03)",
+            [(user_id, sid, now - timedelta(seconds=i), 180.0 + i % 20, 15.0) for i in range(VOCAL_ROWS)]
+        )
+    return {"sid": sid, "user_id": user_id, "start": now - timedelta(seconds=VOCAL_ROWS), "end": now + timedelta(seconds=1)}
+
+
+async def unseed(pool, fixture):
+    async with pool.acquire() as conn:
+        # Cascades to the session and the vocal_data rows
+        await conn.execute("DELETE FROM users WHERE user_id = $1", fixture["user_id"])
+
+
+async def profile_two_step(conn, fixture):
+    session = await conn.fetchrow("SELECT * FROM sessions WHERE session_id = $1", fixture["sid"])
+    return await conn.fetchrow(
+        "SELECT user_id, user_name, user_pronouns, target_gender FROM users WHERE user_id = $1", session["user_id"]
+    )
+
+
+# name -> call(conn, fixture)
+QUERIES = {
+    "profile": lambda conn, f: repository.fetch_user_profile(conn, f["sid"]),
+    "profile_two_step": profile_two_step,
+    "account": lambda conn, f: repository.fetch_user_account(conn, f["sid"]),
+    "latest_metrics": lambda conn, f: repository.fetch_latest_full_metrics(conn, f["sid"]),
+    "performances_page": lambda conn, f: repository.fetch_performances_page(conn, f["user_id"], limit=50),
+    "performance_buckets": lambda conn, f: repository.fetch_performance_buckets(
+        conn, f["user_id"], f["start"], f["end"], 50
+    ),
+}
+
+
+async def bench_query(pool, name, fixture, repeats, concurrency):
+    call = QUERIES[name]
+    times = []
+
+    async def worker(n):
+        async with pool.acquire() as conn:
+            await call(conn, fixture)  # warm-up: prepares the statements on this connection
+            for _ in range(n):
+                start = time.perf_counter()
+                await call(conn, fixture)
+                times.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(repeats // concurrency) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return times, len(times) / elapsed
+
+
+async def run(db_url, modes, names, repeats, concurrency):
+    results = []
+    for mode in modes:
+        pool = await repository.create_pool(db_url, mode=mode, min_size=concurrency, max_size=concurrency)
+        try:
+            fixture = await seed(pool)
+            try:
+                for name in names:
+                    times, rate = await bench_query(pool, name, fixture, repeats, concurrency)
+                    times_ms = np.array(times) * 1000
+                    results.append({
+                        "query": name,
+                        "mode": mode,
+                        "p50_ms": float(np.percentile(times_ms, 50)),
+                        "p99_ms": float(np.percentile(times_ms, 99)),
+                        "qps": rate,
+                    })
+                    print_row(results[-1])
+            finally:
+                await unseed(pool, fixture)
+        finally:
+            await pool.close()
+    return results
+
+
+def print_header():
+    print(f"{'query':<20} {'mode':<10} {'p50 ms':>9} {'p99 ms':>9} {'qps':>9}")
+
+
+def print_row(row):
+    print(f"{row['query']:<20} {row['mode']:<10} {row['p50_ms']:>9.3f} {row['p99_ms']:>9.3f} {row['qps']:>9.0f}")
+
+
+def print_speedups(results):
+    by_key = {(r["query"], r["mode"]): r for r in results}
+    print("\nprepared vs pgbouncer (p50):")
+    for name in dict.fromkeys(r["query"] for r in results):
+        prepared, pgbouncer = by_key.get((name, "prepared")), by_key.get((name, "pgbouncer"))
+        if prepared and pgbouncer and prepared["p50_ms"]:
+            print(f"{name:<20} {pgbouncer['p50_ms'] / prepared['p50_ms']:>5.2f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark repository queries in each statement mode.")
+    parser.add_argument("--modes", nargs="+", choices=repository.STATEMENT_MODES, default=list(repository.STATEMENT_MODES))
+    parser.add_argument("--only", nargs="+", choices=list(QUERIES), help="queries to run")
+    parser.add_argument("--repeats", type=int, default=REPEATS, help="timed calls per query and mode")
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY, help="concurrent connections")
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    db_url = get_db_url()
+    if not db_url:
+        print("SUPABASE_DB_URL not set in environment or .env")
+        return
+    print_header()
+    results = asyncio.run(run(db_url, args.modes, args.only or list(QUERIES), args.repeats, args.concurrency))
+    if len(args.modes) > 1:
+        print_speedups(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -17,31 +17,96 @@ CREATE TABLE IF NOT EXISTS users (
     verification_token_expires TIMESTAMP
 );
 
+-- Range-partitioned by month (vox/retention.py creates the partitions and
+-- expires old ones). Databases created before partitioning keep a plain
+-- table until partition_vocal_data.py converts it.
 CREATE TABLE IF NOT EXISTS vocal_data (
-    id SERIAL PRIMARY KEY,
+    id SERIAL,
     user_id UUID REFERENCES users(user_id) ON DELETE CASCADE,
     session_id UUID, -- legacy support
-    timestamp TIMESTAMP,
+    timestamp TIMESTAMP NOT NULL,
     pitch DOUBLE PRECISION,
     hnr DOUBLE PRECISION,
+    -- Full-tier metrics in typed columns (vox/compact_metrics.py)
+    f1 REAL,
+    f2 REAL,
+    f3 REAL,
+    f1_bw REAL,
+    f2_bw REAL,
+    f3_bw REAL,
+    harmonic_amps REAL[], -- H1..H5
+    jitter REAL,
+    shimmer REAL,
+    voice_report REAL[], -- Praat voice report, VOICE_REPORT_FIELDS order
+    -- Legacy blobs, NULL once migrate_compact_vocal_data.py has run
     harmonics JSONB,
     formants JSONB,
     jitter_shimmer JSONB,
     praat_report TEXT,
-    recording_path TEXT
-);
+    recording_path TEXT,
+    PRIMARY KEY (id, timestamp) -- unique keys of a partitioned table include the partition key
+) PARTITION BY RANGE (timestamp);
+
+-- Databases created before the compact columns existed
+ALTER TABLE vocal_data
+    ADD COLUMN IF NOT EXISTS f1 REAL,
+    ADD COLUMN IF NOT EXISTS f2 REAL,
+    ADD COLUMN IF NOT EXISTS f3 REAL,
+    ADD COLUMN IF NOT EXISTS f1_bw REAL,
+    ADD COLUMN IF NOT EXISTS f2_bw REAL,
+    ADD COLUMN IF NOT EXISTS f3_bw REAL,
+    ADD COLUMN IF NOT EXISTS harmonic_amps REAL[],
+    ADD COLUMN IF NOT EXISTS jitter REAL,
+    ADD COLUMN IF NOT EXISTS shimmer REAL,
+    ADD COLUMN IF NOT EXISTS voice_report REAL[];
 
 -- Indexes for faster lookups
 CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
 CREATE INDEX IF NOT EXISTS idx_users_discord_id ON users(discord_id);
+-- Anonymous users, for the orphan sweep in vox/maintenance.py
+CREATE INDEX IF NOT EXISTS idx_users_anonymous_created_at ON users(created_at) WHERE email IS NULL AND discord_id IS NULL;
 CREATE INDEX IF NOT EXISTS idx_vocal_data_user_id ON vocal_data(user_id);
 CREATE INDEX IF NOT EXISTS idx_vocal_data_session_id ON vocal_data(session_id);
+CREATE INDEX IF NOT EXISTS idx_vocal_data_recording_path ON vocal_data(recording_path);
+-- Keyset pagination of a user's history, newest first
+CREATE INDEX IF NOT EXISTS idx_vocal_data_user_timestamp ON vocal_data(user_id, timestamp DESC, id DESC);
+
+-- Per-user progress rollups of vocal_data, maintained by the write path
+-- (vox/rollups.py) and recomputed by rebuild_rollups.py
+CREATE TABLE IF NOT EXISTS vocal_rollups (
+    user_id UUID NOT NULL REFERENCES users(user_id) ON DELETE CASCADE,
+    granularity TEXT NOT NULL, -- 'hour' or 'day'
+    metric TEXT NOT NULL, -- pitch, hnr, f1-f3, jitter, shimmer
+    bucket TIMESTAMP NOT NULL,
+    count BIGINT NOT NULL,
+    sum DOUBLE PRECISION NOT NULL,
+    sum_sq DOUBLE PRECISION NOT NULL,
+    min DOUBLE PRECISION NOT NULL,
+    max DOUBLE PRECISION NOT NULL,
+    histogram BIGINT[] NOT NULL, -- bins from ROLLUP_METRICS, for percentiles
+    PRIMARY KEY (user_id, granularity, metric, bucket)
+);
+
+-- One row per background maintenance job (vox/maintenance.py): the lease
+-- that lets a single worker run it, and the outcome of its last run
+CREATE TABLE IF NOT EXISTS maintenance_runs (
+    job TEXT PRIMARY KEY,
+    holder TEXT, -- host:pid of the worker holding the lease
+    lease_until TIMESTAMP NOT NULL,
+    last_started_at TIMESTAMP NOT NULL,
+    last_finished_at TIMESTAMP,
+    last_duration_ms DOUBLE PRECISION,
+    last_deleted BIGINT,
+    last_error TEXT,
+    runs BIGINT NOT NULL DEFAULT 0
+);
 
 CREATE TABLE IF NOT EXISTS password_resets (
     email VARCHAR NOT NULL,
     token VARCHAR PRIMARY KEY,
     expires_at TIMESTAMP NOT NULL
 );
+CREATE INDEX IF NOT EXISTS idx_password_resets_expires_at ON password_resets(expires_at);
 
 -- Persistent session management
 CREATE TABLE IF NOT EXISTS sessions (
@@ -25,7 +25,7 @@ def transform_audio_to_gender(input_path, output_path, target_gender):
         formant_scale = 1.0
 
     # Pitch shifting
-    y_shifted = librosa.effects.pitch_shift(y, sr, n_steps=pitch_shift)
+    y_shifted = librosa.effects.pitch_shift(y, sr=sr, n_steps=pitch_shift)
 
     # Formant shifting (approximate via resampling)
     if formant_scale != 1.0:
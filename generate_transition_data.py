@@ -2,7 +2,6 @@ import os
 import uuid
 import psycopg2
 from datetime import datetime, timedelta
-import json
 from dotenv import load_dotenv
 
 # Load environment variables from .env if present
@@ -88,21 +87,14 @@ def main():
         jitter = interpolate(jitter_start, jitter_end, i, num_samples)
         shimmer = interpolate(shimmer_start, shimmer_end, i, num_samples)
 
-        harmonics = {"H1-H2": h1h2}
-        formants = {"F1": f1, "F2": f2, "F3": f3}
-        jitter_shimmer = {"jitter": jitter, "shimmer": shimmer}
-        praat_report = (
-            f"Sample {i+1}: pitch={pitch:.1f}Hz, HNR={hnr:.1f}dB, "
-            f"F1={f1:.1f}Hz, F2={f2:.1f}Hz, F3={f3:.1f}Hz, "
-            f"jitter={jitter:.2f}%, shimmer={shimmer:.2f}%"
-        )
         recording_path = f"/recordings/sample_{i+1}.wav"
 
+        # Compact metric columns (see vox/compact_metrics.py); jitter and shimmer as fractions
         cur.execute(
             """
             INSERT INTO vocal_data (
-                user_id, session_id, timestamp, pitch, hnr, harmonics, formants, jitter_shimmer, praat_report, recording_path
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                user_id, session_id, timestamp, pitch, hnr, f1, f2, f3, harmonic_amps, jitter, shimmer, recording_path
+            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
             """,
             (
                 user_id,
@@ -110,10 +102,12 @@ def main():
                 timestamp,
                 pitch,
                 hnr,
-                json.dumps(harmonics),
-                json.dumps(formants),
-                json.dumps(jitter_shimmer),
-                praat_report,
+                f1,
+                f2,
+                f3,
+                [1.0, 10 ** (-h1h2 / 20)],  # H1 and H2, h1h2 dB apart
+                jitter / 100,
+                shimmer / 100,
                 recording_path
             )
         )
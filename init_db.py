@@ -2,6 +2,10 @@ import os
 import asyncio
 import asyncpg
 
+from vox.retention import ensure_partitions
+
+SCHEMA_PATH = "docs/supabase_schema.sql"
+
 def get_db_url():
     # Try .env first, then environment
     if os.path.exists('.env'):
@@ -9,24 +13,34 @@ def get_db_url():
         load_dotenv('.env')
     return os.environ.get("SUPABASE_DB_URL")
 
+def schema_statements(schema_path=SCHEMA_PATH):
+    with open(schema_path, "r") as f:
+        sql = f.read()
+    # Split on semicolons, ignore empty statements
+    return [s.strip() for s in sql.split(";") if s.strip()]
+
+async def apply_schema(conn, schema_path=SCHEMA_PATH):
+    for stmt in schema_statements(schema_path):
+        await conn.execute(stmt)
+    # A partitioned vocal_data takes no rows until its partitions exist
+    return await ensure_partitions(conn)
+
 async def run_schema():
     db_url = get_db_url()
     if not db_url:
         print("SUPABASE_DB_URL not set in environment or .env")
         return
-    schema_path = "docs/supabase_schema.sql"
-    if not os.path.exists(schema_path):
-        print(f"Schema file not found: {schema_path}")
+    if not os.path.exists(SCHEMA_PATH):
+        print(f"Schema file not found: {SCHEMA_PATH}")
         return
-    with open(schema_path, "r") as f:
-        sql = f.read()
-    # Split on semicolons, ignore empty statements
-    statements = [s.strip() for s in sql.split(";") if s.strip()]
     conn = await asyncpg.connect(db_url)
     try:
-        for stmt in statements:
-            await conn.execute(stmt)
+        created = await apply_schema(conn)
         print("Schema applied successfully.")
+        if created is None:
+            print("vocal_data is not partitioned; run partition_vocal_data.py to convert it.")
+        elif created:
+            print(f"Created vocal_data partitions: {', '.join(created)}")
     finally:
         await conn.close()
 
@@ -0,0 +1,105 @@
+"""
+Move vocal_data metrics from the legacy JSONB/text columns (harmonics,
+formants, jitter_shimmer, praat_report) to the compact typed columns of
+vox/compact_metrics.py, then clear the legacy columns.
+
+Apply docs/supabase_schema.sql first (python init_db.py) so the new columns
+exist. Rows are converted in id order, one committed batch at a time, so an
+interrupted run simply continues on the next start. Reads handle both
+layouts meanwhile. Postgres only returns the freed space to the OS after a
+table rewrite: pass --vacuum (VACUUM FULL, which locks the table) or
+schedule one.
+
+    python migrate_compact_vocal_data.py
+    python migrate_compact_vocal_data.py --batch-size 5000 --vacuum
+"""
+import time
+import asyncio
+import argparse
+
+import asyncpg
+
+from init_db import get_db_url
+from vox.compact_metrics import compact_metrics, real_array_literal
+from vox.repository import connect_options
+
+SELECT_BATCH_SQL = """
+SELECT id, harmonics, formants, jitter_shimmer, praat_report FROM vocal_data
+WHERE id > $1
+  AND (harmonics IS NOT NULL OR formants IS NOT NULL OR jitter_shimmer IS NOT NULL OR praat_report IS NOT NULL)
+ORDER BY id LIMIT $2
+"""
+
+# Values already in the compact columns win over converted ones
+UPDATE_BATCH_SQL = """
+UPDATE vocal_data AS v
+SET f1 = COALESCE(v.f1, u.f1), f2 = COALESCE(v.f2, u.f2), f3 = COALESCE(v.f3, u.f3),
+    f1_bw = COALESCE(v.f1_bw, u.f1_bw), f2_bw = COALESCE(v.f2_bw, u.f2_bw), f3_bw = COALESCE(v.f3_bw, u.f3_bw),
+    harmonic_amps = COALESCE(v.harmonic_amps, u.harmonic_amps::real[]),
+    jitter = COALESCE(v.jitter, u.jitter),
+    shimmer = COALESCE(v.shimmer, u.shimmer),
+    voice_report = COALESCE(v.voice_report, u.voice_report::real[]),
+    harmonics = NULL,
+    formants = NULL,
+    jitter_shimmer = NULL,
+    praat_report = NULL
+FROM unnest($1::int[], $2::real[], $3::real[], $4::real[], $5::real[], $6::real[], $7::real[],
+            $8::text[], $9::real[], $10::real[], $11::text[])
+    AS u(id, f1, f2, f3, f1_bw, f2_bw, f3_bw, harmonic_amps, jitter, shimmer, voice_report)
+WHERE v.id = u.id
+"""
+
+SIZE_SQL = "SELECT pg_table_size('vocal_data') AS table_bytes, pg_indexes_size('vocal_data') AS index_bytes"
+
+
+async def print_size(conn, label):
+    size = await conn.fetchrow(SIZE_SQL)
+    print(f"{label}: table {size['table_bytes'] / 2**20:.1f} MiB, indexes {size['index_bytes'] / 2**20:.1f} MiB")
+
+
+async def migrate_batch(conn, rows):
+    converted = []
+    for row in rows:
+        *scalars, harmonic_amps, jitter, shimmer, voice_report = compact_metrics(
+            row["harmonics"], row["formants"], row["jitter_shimmer"], row["praat_report"]
+        )
+        converted.append((row["id"], *scalars, real_array_literal(harmonic_amps), jitter, shimmer, real_array_literal(voice_report)))
+    await conn.execute(UPDATE_BATCH_SQL, *[list(c) for c in zip(*converted)])
+
+
+async def run(args):
+    db_url = get_db_url()
+    if not db_url:
+        print("SUPABASE_DB_URL not set in environment or .env")
+        return
+    conn = await asyncpg.connect(db_url, **connect_options())
+    try:
+        await print_size(conn, "Before")
+        last_id = migrated = 0
+        start = time.perf_counter()
+        while True:
+            rows = await conn.fetch(SELECT_BATCH_SQL, last_id, args.batch_size)
+            if not rows:
+                break
+            await migrate_batch(conn, rows)
+            last_id = rows[-1]["id"]
+            migrated += len(rows)
+            print(f"{migrated} rows migrated ({migrated / (time.perf_counter() - start):.0f} rows/s)")
+        print(f"Done: {migrated} rows migrated")
+        if args.vacuum:
+            print("VACUUM FULL vocal_data (the table is locked until it finishes)")
+            await conn.execute("VACUUM (FULL, ANALYZE) vocal_data")
+        await print_size(conn, "After")
+    finally:
+        await conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Migrate vocal_data metrics to the compact typed columns.")
+    parser.add_argument("--batch-size", type=int, default=1000, help="rows converted per UPDATE")
+    parser.add_argument("--vacuum", action="store_true", help="rewrite the table afterwards to release the space")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
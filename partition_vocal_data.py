@@ -0,0 +1,123 @@
+"""
+Convert an existing plain vocal_data table to the monthly range-partitioned
+layout of docs/supabase_schema.sql (see vox/retention.py).
+
+The old table is renamed to vocal_data_unpartitioned (with its indexes and
+id sequence), the schema is applied to create the partitioned table and a
+partition for every month since the oldest row, and the rows are copied
+over in id order, one committed batch at a time. An interrupted run picks
+up where it stopped. New rows go to the partitioned table from the first
+commit on, but history reads miss the rows not copied yet, so stop the app
+or run it when idle. Rows without a timestamp get the time of the copy.
+
+    python partition_vocal_data.py
+    python partition_vocal_data.py --batch-size 20000 --drop-old
+"""
+import time
+import asyncio
+import argparse
+
+import asyncpg
+
+from init_db import apply_schema, get_db_url
+from vox.repository import connect_options
+from vox.retention import ensure_partitions, is_partitioned
+
+OLD_TABLE = "vocal_data_unpartitioned"
+
+OLD_INDEXES_SQL = "SELECT indexname FROM pg_indexes WHERE schemaname = current_schema() AND tablename = $1"
+
+COMMON_COLUMNS_SQL = """
+SELECT column_name FROM information_schema.columns
+WHERE table_schema = current_schema() AND table_name = $1
+  AND column_name IN (
+      SELECT column_name FROM information_schema.columns
+      WHERE table_schema = current_schema() AND table_name = 'vocal_data'
+  )
+ORDER BY ordinal_position
+"""
+
+
+async def table_exists(conn, name):
+    return await conn.fetchval("SELECT to_regclass($1) IS NOT NULL", name)
+
+
+async def convert(conn):
+    """Rename the plain table out of the way and create the partitioned one."""
+    async with conn.transaction():
+        await conn.execute(f"ALTER TABLE vocal_data RENAME TO {OLD_TABLE}")
+        # Index and sequence names are schema-wide; free them for the new table
+        for row in await conn.fetch(OLD_INDEXES_SQL, OLD_TABLE):
+            await conn.execute(f'ALTER INDEX "{row["indexname"]}" RENAME TO "{row["indexname"]}_unpartitioned"')
+        sequence = await conn.fetchval("SELECT pg_get_serial_sequence($1, 'id')", OLD_TABLE)
+        if sequence:
+            await conn.execute(f"ALTER SEQUENCE {sequence} RENAME TO {OLD_TABLE}_id_seq")
+        await apply_schema(conn)
+        oldest, max_id = await conn.fetchrow(f"SELECT min(timestamp), max(id) FROM {OLD_TABLE}")
+        created = await ensure_partitions(conn, since=oldest)
+        # New rows must not reuse the ids being copied over
+        if max_id:
+            await conn.execute("SELECT setval(pg_get_serial_sequence('vocal_data', 'id'), $1)", max_id)
+    print(f"Created partitioned vocal_data ({len(created)} monthly partitions)")
+
+
+async def copy_rows(conn, batch_size):
+    columns = [row["column_name"] for row in await conn.fetch(COMMON_COLUMNS_SQL, OLD_TABLE)]
+    select = ", ".join(
+        "COALESCE(timestamp, now() AT TIME ZONE 'utc')" if c == "timestamp" else c for c in columns
+    )
+    copy_sql = f"""
+    WITH copied AS (
+        INSERT INTO vocal_data ({", ".join(columns)})
+        SELECT {select} FROM {OLD_TABLE} WHERE id > $1 ORDER BY id LIMIT $2
+        RETURNING id
+    )
+    SELECT count(*) AS n, max(id) AS last_id FROM copied
+    """
+    old_max = await conn.fetchval(f"SELECT max(id) FROM {OLD_TABLE}") or 0
+    # Rows above old_max were written by the app after the conversion
+    last_id = await conn.fetchval("SELECT max(id) FROM vocal_data WHERE id <= $1", old_max) or 0
+    copied = 0
+    start = time.perf_counter()
+    while last_id < old_max:
+        result = await conn.fetchrow(copy_sql, last_id, batch_size)
+        if not result["n"]:
+            break
+        last_id = result["last_id"]
+        copied += result["n"]
+        print(f"{copied} rows copied ({copied / (time.perf_counter() - start):.0f} rows/s)")
+    print(f"Done: {copied} rows copied")
+
+
+async def run(args):
+    db_url = get_db_url()
+    if not db_url:
+        print("SUPABASE_DB_URL not set in environment or .env")
+        return
+    conn = await asyncpg.connect(db_url, **connect_options())
+    try:
+        if not await is_partitioned(conn):
+            await convert(conn)
+        elif not await table_exists(conn, OLD_TABLE):
+            print("vocal_data is already partitioned")
+            return
+        await copy_rows(conn, args.batch_size)
+        await conn.execute("ANALYZE vocal_data")
+        if args.drop_old:
+            await conn.execute(f"DROP TABLE {OLD_TABLE}")
+            print(f"Dropped {OLD_TABLE}")
+        else:
+            print(f"Check the copy, then drop {OLD_TABLE} (or rerun with --drop-old)")
+    finally:
+        await conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert vocal_data to monthly range partitions.")
+    parser.add_argument("--batch-size", type=int, default=10000, help="rows copied per INSERT")
+    parser.add_argument("--drop-old", action="store_true", help="drop the old table once every row is copied")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
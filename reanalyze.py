@@ -0,0 +1,227 @@
+"""
+Offline batch re-analysis of saved recordings.
+
+Walks recordings/<sid>/*.wav, runs the full-tier analysis chain on each file
+across a process pool and bulk-updates the matching vocal_data rows. Files
+already analyzed are listed in a manifest next to the recordings and skipped
+on the next run, so an interrupted run resumes where it stopped; --force
+rewrites every row. Analysis results also go through the content cache
+(VOX_CACHE_DIR): bump ANALYSIS_VERSION in vox/content_cache.py after an
+algorithm change so --force recomputes instead of reusing them.
+
+    python reanalyze.py
+    python reanalyze.py --workers 8 --batch-size 1000
+    python reanalyze.py --force
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+import itertools
+import multiprocessing
+
+import asyncpg
+
+from init_db import get_db_url
+from vox.compact_metrics import compact_metrics, real_array_literal
+from vox.repository import connect_options
+
+MANIFEST_NAME = ".reanalyze_manifest.jsonl"
+# save_recording stores paths relative to the app's working directory
+STORED_RECORDINGS_DIR = "recordings"
+
+# One round trip per batch: the analyzed values arrive as parallel arrays.
+# recording_path is stored either as the file path or as its /recordings URL.
+# Returns the path of every row updated, so unmatched files can be reported.
+BULK_UPDATE_SQL = """
+UPDATE vocal_data AS v
+SET pitch = u.pitch,
+    hnr = u.hnr,
+    f1 = u.f1, f2 = u.f2, f3 = u.f3,
+    f1_bw = u.f1_bw, f2_bw = u.f2_bw, f3_bw = u.f3_bw,
+    harmonic_amps = u.harmonic_amps::real[],
+    jitter = u.jitter,
+    shimmer = u.shimmer,
+    voice_report = u.voice_report::real[],
+    harmonics = NULL,
+    formants = NULL,
+    jitter_shimmer = NULL,
+    praat_report = NULL
+FROM unnest($1::text[], $2::float8[], $3::float8[], $4::real[], $5::real[], $6::real[], $7::real[], $8::real[],
+            $9::real[], $10::text[], $11::real[], $12::real[], $13::text[])
+    AS u(path, pitch, hnr, f1, f2, f3, f1_bw, f2_bw, f3_bw, harmonic_amps, jitter, shimmer, voice_report)
+WHERE v.recording_path = u.path OR v.recording_path = '/' || u.path
+RETURNING u.path
+"""
+
+
+def find_recordings(root):
+    """
+    Yield the path of every original recording under root (not the
+    _gendered.wav transforms).
+    """
+    for session in sorted(os.scandir(root), key=lambda e: e.name):
+        if not session.is_dir():
+            continue
+        for entry in sorted(os.scandir(session.path), key=lambda e: e.name):
+            if entry.is_file() and entry.name.endswith(".wav") and not entry.name.endswith("_gendered.wav"):
+                yield entry.path
+
+
+def stored_path(path, root):
+    """The recording_path save_recording stored for ``path``, wherever ``root`` is."""
+    return os.path.join(STORED_RECORDINGS_DIR, os.path.relpath(path, root))
+
+
+def file_key(path):
+    stat = os.stat(path)
+    return {"path": path, "mtime": stat.st_mtime, "size": stat.st_size}
+
+
+def load_manifest(path):
+    done = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # torn last line from an interrupted run
+                done[entry["path"]] = entry
+    return done
+
+
+def append_manifest(path, entries):
+    with open(path, "a") as f:
+        for entry in entries:
+            f.write(json.dumps(entry) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+_cache = None
+
+
+def analyze_file(key):
+    """
+    Pool worker: decode one recording and run the full-tier analysis on it.
+    Results are cached by file content, so re-runs skip unchanged files
+    unless ANALYSIS_VERSION was bumped.
+    """
+    import librosa
+    from vox.audio_processing import analyze_segment, resample
+    from vox.audio_stream import ANALYSIS_SAMPLE_RATE
+    from vox.content_cache import ANALYSIS_VERSION, ContentCache, cache_key, file_hash
+
+    global _cache
+    if _cache is None:
+        _cache = ContentCache.from_env()
+    try:
+        cached = cache_key(file_hash(key["path"]), fn="analyze_segment", sr=ANALYSIS_SAMPLE_RATE, version=ANALYSIS_VERSION)
+        result = _cache.get(cached)
+        if result is not None:
+            return key, result, None
+        audio, sr = librosa.load(key["path"], sr=None, mono=True)
+        if len(audio) == 0:
+            return key, None, "empty recording"
+        # Same decimation as the streaming path, so results are comparable
+        if sr > ANALYSIS_SAMPLE_RATE:
+            audio, sr = resample(audio, sr, ANALYSIS_SAMPLE_RATE), ANALYSIS_SAMPLE_RATE
+        result = analyze_segment(audio, sr)
+        _cache.put(cached, result)
+        return key, result, None
+    except Exception as e:
+        return key, None, f"{type(e).__name__}: {e}"
+
+
+async def bulk_update(conn, batch, root):
+    """Update the rows of every recording in ``batch``; returns (rows updated, stored paths matched)."""
+    rows = []
+    for key, result in batch:
+        *scalars, harmonic_amps, jitter, shimmer, voice_report = compact_metrics(
+            result["harmonics"], result["formants"], result["jitter_shimmer"], result["praat_report"]
+        )
+        rows.append((
+            stored_path(key["path"], root), float(result["pitch"]), float(result["hnr"]), *scalars,
+            real_array_literal(harmonic_amps), jitter, shimmer, real_array_literal(voice_report)
+        ))
+    updated = await conn.fetch(BULK_UPDATE_SQL, *[list(c) for c in zip(*rows)])
+    return len(updated), {row["path"] for row in updated}
+
+
+async def run(args):
+    db_url = get_db_url()
+    if not db_url:
+        print("SUPABASE_DB_URL not set in environment or .env")
+        return
+    if not os.path.isdir(args.root):
+        print(f"Recordings directory not found: {args.root}")
+        return
+
+    manifest_path = os.path.join(args.root, MANIFEST_NAME)
+    done = {} if args.force else load_manifest(manifest_path)
+    pending = []
+    for path in find_recordings(args.root):
+        key = file_key(path)
+        previous = done.get(path)
+        if previous and previous["mtime"] == key["mtime"] and previous["size"] == key["size"]:
+            continue
+        pending.append(key)
+    print(f"{len(pending)} recordings to analyze ({len(done)} already done)")
+    if not pending:
+        return
+
+    conn = await asyncpg.connect(db_url, **connect_options())
+    ctx = multiprocessing.get_context("spawn")
+    analyzed = updated = failed = unmatched = 0
+    start = time.perf_counter()
+    try:
+        with ctx.Pool(args.workers) as pool:
+            results = pool.imap_unordered(analyze_file, pending, chunksize=args.chunksize)
+            while True:
+                # Pull the next batch off the pool without blocking the event loop
+                chunk = await asyncio.to_thread(lambda: list(itertools.islice(results, args.batch_size)))
+                if not chunk:
+                    break
+                batch = []
+                for key, result, error in chunk:
+                    if result is None:
+                        failed += 1
+                        print(f"Failed: {key['path']}: {error}")
+                    else:
+                        batch.append((key, result))
+                if batch:
+                    rows, matched = await bulk_update(conn, batch, args.root)
+                    updated += rows
+                    for key, _ in batch:
+                        if stored_path(key["path"], args.root) not in matched:
+                            unmatched += 1
+                            print(f"No vocal_data row for {key['path']} (stored as {stored_path(key['path'], args.root)})")
+                    # Only recorded once the rows are committed, so a crash re-analyzes the batch;
+                    # unmatched files stay out so a later run can still find their rows
+                    append_manifest(manifest_path, [
+                        key for key, _ in batch if stored_path(key["path"], args.root) in matched
+                    ])
+                analyzed += len(batch)
+                rate = analyzed / (time.perf_counter() - start)
+                print(f"{analyzed + failed}/{len(pending)} files, {updated} rows updated, {failed} failed ({rate:.1f} files/s)")
+    finally:
+        await conn.close()
+    print(f"Done: {analyzed} analyzed, {updated} rows updated, {unmatched} without a row, {failed} failed")
+    if updated:
+        print("Progress rollups still hold the old values: run rebuild_rollups.py")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-analyze saved recordings and update vocal_data.")
+    parser.add_argument("--root", default="recordings", help="recordings directory (default: recordings)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="analysis processes")
+    parser.add_argument("--chunksize", type=int, default=8, help="files handed to a worker at a time")
+    parser.add_argument("--batch-size", type=int, default=500, help="rows per bulk UPDATE")
+    parser.add_argument("--force", action="store_true", help="ignore the manifest and re-analyze every file")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
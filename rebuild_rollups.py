@@ -0,0 +1,48 @@
+"""
+Recompute the vocal_rollups progress aggregates from vocal_data.
+
+The app keeps rollups up to date as it writes; run this after creating the
+table on an existing database, after reanalyze.py rewrites metrics, or after
+changing ROLLUP_METRICS in vox/rollups.py. Rows written while it runs may be
+counted twice, so run it while the app is idle.
+
+    python rebuild_rollups.py
+    python rebuild_rollups.py --user <user_id>
+"""
+import time
+import asyncio
+import argparse
+
+import asyncpg
+
+from init_db import get_db_url
+from vox.repository import connect_options
+from vox.rollups import rebuild_rollups
+
+
+async def run(args):
+    db_url = get_db_url()
+    if not db_url:
+        print("SUPABASE_DB_URL not set in environment or .env")
+        return
+    conn = await asyncpg.connect(db_url, **connect_options())
+    start = time.perf_counter()
+    try:
+        rows = await rebuild_rollups(
+            conn, args.user, batch_rows=args.batch_size,
+            progress=lambda n: print(f"{n} rows ({n / (time.perf_counter() - start):.0f} rows/s)")
+        )
+    finally:
+        await conn.close()
+    print(f"Done: rolled up {rows} vocal_data rows in {time.perf_counter() - start:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild vocal_rollups from vocal_data.")
+    parser.add_argument("--user", help="only rebuild this user's rollups")
+    parser.add_argument("--batch-size", type=int, default=5000, help="rows aggregated per upsert batch")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+// Vox audio capture worklet
+// Forwards every microphone sample to the main thread, in order and without gaps,
+// so the server can stitch the stream back together from sequenced frames.
+
+const BATCH_SIZE = 1024;  // Samples per message (8 render quanta)
+
+class VoxCaptureProcessor extends AudioWorkletProcessor {
+    constructor() {
+        super();
+        this.batch = new Float32Array(BATCH_SIZE);
+        this.filled = 0;
+    }
+
+    process(inputs) {
+        const channel = inputs[0] && inputs[0][0];
+        if (channel) {
+            let offset = 0;
+            while (offset < channel.length) {
+                const count = Math.min(channel.length - offset, BATCH_SIZE - this.filled);
+                this.batch.set(channel.subarray(offset, offset + count), this.filled);
+                this.filled += count;
+                offset += count;
+                if (this.filled === BATCH_SIZE) {
+                    this.port.postMessage(this.batch);
+                    this.batch = new Float32Array(BATCH_SIZE);
+                    this.filled = 0;
+                }
+            }
+        }
+        return true;
+    }
+}
+
+registerProcessor('vox-capture', VoxCaptureProcessor);
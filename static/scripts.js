@@ -57,11 +57,17 @@ let fft;                  // For frequency analysis (Fourier Transform)
 let targetOscillator = null;  // For playing a target pitch tone
 let recorder = null;          // For recording your voice
 let recordingBlob = null;     // The saved recording blob
+let captureNode = null;       // AudioWorklet that captures every mic sample
+let pendingSamples = [];      // Captured sample batches waiting to be sent
 
 // --- Constants ---
 const MAX_RECORDING_TIME = 5 * 60 * 1000;  // Max 5 minutes per recording, to keep things manageable
 const CHUNK = 2048;                        // Size of audio chunks for analysis
 const AUDIO_BUFFER_INTERVAL = 100;         // How often (ms) to send audio chunks to server
+const AUDIO_FRAME_HEADER_BYTES = 12;       // version, format, reserved, sample rate, sequence number
+const AUDIO_FRAME_VERSION = 1;
+const AUDIO_FORMAT_INT16 = 2;              // 16-bit PCM: plenty for voice, half the bytes of Float32
+let audioSeq = 0;                          // Sequence number of the next audio chunk
 const PITCH_STABILITY_WINDOW = 5;          // Seconds to calculate pitch stability over
 let pitchHistory = [];                     // History of recent pitch values for stability calc
 
@@ -227,6 +233,13 @@ async function startRecording() {
             analyser.fftSize = CHUNK;
             source.connect(analyser);
 
+            // Capture the mic stream gap-free so every frame we send is contiguous
+            await audioContext.audioWorklet.addModule('/static/capture-worklet.js');
+            captureNode = new AudioWorkletNode(audioContext, 'vox-capture', { numberOfOutputs: 0 });
+            captureNode.port.onmessage = (event) => pendingSamples.push(event.data);
+            pendingSamples = [];
+            source.connect(captureNode);
+
             // Remove invalid Tone.PitchDetect usage and browser pitch detection.
             pitchSmoother = new Tone.Meter({ smoothing: 0.05 });
             volumeMeter = new Tone.Meter();
@@ -251,7 +264,8 @@ async function startRecording() {
             }, 100);
 
             isRecording = true;
-            socket.emit("start_recording");
+            audioSeq = 0;
+            socket.emit("start_recording", { sample_rate: audioContext.sampleRate });
             sendAudioChunks();
 
             setTimeout(() => {
@@ -270,6 +284,12 @@ function stopRecording() {
     if (isRecording) {
         isRecording = false;
         stream.getTracks().forEach(track => track.stop());
+        if (captureNode) {
+            captureNode.port.onmessage = null;
+            captureNode.disconnect();
+            captureNode = null;
+        }
+        pendingSamples = [];
         audioContext.close();
         // Remove pitchDetector.dispose();
         pitchSmoother.dispose();
@@ -281,15 +301,39 @@ function stopRecording() {
     }
 }
 
-// Send audio chunks
+// Pack a chunk into a binary frame: a small header plus Int16 PCM samples
+function encodeAudioFrame(samples, sampleRate, seq) {
+    const buffer = new ArrayBuffer(AUDIO_FRAME_HEADER_BYTES + samples.length * 2);
+    const view = new DataView(buffer);
+    view.setUint8(0, AUDIO_FRAME_VERSION);
+    view.setUint8(1, AUDIO_FORMAT_INT16);
+    view.setUint32(4, sampleRate, true);
+    view.setUint32(8, seq, true);
+    for (let i = 0; i < samples.length; i++) {
+        const s = Math.max(-1, Math.min(1, samples[i]));
+        view.setInt16(AUDIO_FRAME_HEADER_BYTES + i * 2, s < 0 ? s * 0x8000 : s * 0x7FFF, true);
+    }
+    return buffer;
+}
+
+// Send everything captured since the last call as one binary frame
+// (no JSON float lists on the wire, and no gaps or overlaps between frames)
 function sendAudioChunks() {
     if (!isRecording) return;
-    const dataArray = new Float32Array(CHUNK);
-    analyser.getFloatTimeDomainData(dataArray);
-    socket.emit('raw_audio', {
-        audio: Array.from(dataArray),
-        timestamp: new Date().toISOString()
-    });
+    const length = pendingSamples.reduce((total, batch) => total + batch.length, 0);
+    if (length > 0) {
+        const dataArray = new Float32Array(length);
+        let offset = 0;
+        pendingSamples.forEach(batch => {
+            dataArray.set(batch, offset);
+            offset += batch.length;
+        });
+        pendingSamples = [];
+        socket.emit('raw_audio', {
+            audio: encodeAudioFrame(dataArray, audioContext.sampleRate, audioSeq++),
+            timestamp: new Date().toISOString()
+        });
+    }
     setTimeout(sendAudioChunks, AUDIO_BUFFER_INTERVAL);
 }
 
@@ -403,6 +447,26 @@ socket.on("audio_analysis", (data) => {
     formantsChart.update('active');
 });
 
+// The server skips analysis while you're quiet and just lets us know it's listening
+socket.on("voice_activity", (data) => {
+    if (!data.active) {
+        const display = document.getElementById("pitchDisplay");
+        display.className = "pitch-display out-of-range";
+        display.setAttribute('aria-label', 'Listening for your voice');
+    }
+});
+
+let analysisStatusTimer = null;
+
+socket.on("analysis_status", (data) => {
+    // The server is behind on this session and skipped some windows
+    const status = document.getElementById("analysisStatus");
+    status.textContent = `Live analysis is catching up: ${data.total_dropped} update(s) skipped so far`;
+    status.style.display = "block";
+    clearTimeout(analysisStatusTimer);
+    analysisStatusTimer = setTimeout(() => { status.style.display = "none"; }, 3000);
+});
+
 socket.on("history_update", (data) => {
     const listItem = document.createElement("li");
     const timestamp = new Date(data.timestamp).toLocaleString();
@@ -412,7 +476,7 @@ socket.on("history_update", (data) => {
     listItem.innerHTML = `
         <input type="checkbox" class="convert-checkbox" data-path="${audioPath}">
         <span class="material-icons">history</span> 
-        ${timestamp}: Pitch=${data.pitch.toFixed(2)} Hz, HNR=${data.hnr.toFixed(2)} dB, Harmonics=${data.harmonics.length}, Formants=${data.formants.map(f => `${f.freq.toFixed(0)} Hz`).join(', ')}
+        ${timestamp}: Pitch=${data.pitch.toFixed(2)} Hz, HNR=${data.hnr.toFixed(2)} dB, Harmonics=${data.harmonics.length}, Formants=${data.formants.map(f => f.freq != null ? `${f.freq.toFixed(0)} Hz` : '-').join(', ')}
         ${audioPath ? `<button class="media-button" onclick="playRecording('${audioPath}')" aria-label="Play Recording"><span class="material-icons">play_arrow</span></button>` : ''}
         ${transformedPath ? `<button class="media-button" onclick="playRecording('${transformedPath}')" aria-label="Play Transformed"><span class="material-icons">auto_fix_high</span></button>` : ''}
         ${transformedPath ? `<div style="font-size: 0.9em; color: #ccc; margin-top: 4px;">This modified recording is just an example of how certain voice features might align with your gender goals. Every trans person's voice is unique, valid, and beautiful in its own way. Your authentic voice is yours alone, and no example defines your worth or progress.</div>` : ''}
@@ -473,29 +537,45 @@ socket.on("recording_status", (data) => {
         recordButton.style.display = "inline-flex";
         stopButton.style.display = "none";
         hideError();
+    } else if (data.status === "error") {
+        showError(data.message);
     }
 });
 
-fetch('/user/get_performances')
-    .then(response => response.json())
-    .then(data => {
-        data.forEach(performance => {
-            const listItem = document.createElement("li");
-            const timestamp = new Date(performance.timestamp).toLocaleString();
-            listItem.innerHTML = `
-                <span class="material-icons">history</span> 
-                ${timestamp}: Pitch=${performance.pitch.toFixed(2)} Hz, HNR=${performance.hnr.toFixed(2)} dB, Harmonics=${performance.harmonics.length}, Formants=${performance.formants.map(f => `${f.freq.toFixed(0)} Hz`).join(', ')}
-                ${performance.recording_path ? `<button class="media-button" onclick="playRecording('${performance.recording_path}')" aria-label="Play Recording"><span class="material-icons">play_arrow</span></button>` : ''}
-            `;
-            listItem.dataset.harmonics = JSON.stringify(performance.harmonics);
-            listItem.dataset.formants = JSON.stringify(performance.formants);
-            document.getElementById("historyList").appendChild(listItem);
+// Cursor of the next history page (X-Next-Cursor), null once everything is shown
+let performancesCursor = null;
+
+function loadPerformances() {
+    const url = performancesCursor
+        ? `/user/get_performances?cursor=${encodeURIComponent(performancesCursor)}`
+        : '/user/get_performances';
+    fetch(url)
+        .then(response => {
+            performancesCursor = response.headers.get('X-Next-Cursor');
+            document.getElementById("loadMoreHistory").style.display = performancesCursor ? "block" : "none";
+            return response.json();
+        })
+        .then(data => {
+            data.forEach(performance => {
+                const listItem = document.createElement("li");
+                const timestamp = new Date(performance.timestamp).toLocaleString();
+                listItem.innerHTML = `
+                    <span class="material-icons">history</span> 
+                    ${timestamp}: Pitch=${performance.pitch != null ? performance.pitch.toFixed(2) : '-'} Hz, HNR=${performance.hnr != null ? performance.hnr.toFixed(2) : '-'} dB, Harmonics=${(performance.harmonics || []).length}, Formants=${(performance.formants || []).map(f => f.freq != null ? `${f.freq.toFixed(0)} Hz` : '-').join(', ')}
+                    ${performance.recording_path ? `<button class="media-button" onclick="playRecording('${performance.recording_path}')" aria-label="Play Recording"><span class="material-icons">play_arrow</span></button>` : ''}
+                `;
+                listItem.dataset.harmonics = JSON.stringify(performance.harmonics);
+                listItem.dataset.formants = JSON.stringify(performance.formants);
+                document.getElementById("historyList").appendChild(listItem);
+            });
+        })
+        .catch(error => {
+            console.error('Error fetching performances:', error);
+            showError('Failed to load history.');
         });
-    })
-    .catch(error => {
-        console.error('Error fetching performances:', error);
-        showError('Failed to load history.');
-    });
+}
+
+loadPerformances();
 
 function clearHistory() {
     fetch('/recordings/clear_history', { method: 'POST' })
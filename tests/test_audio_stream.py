@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+from vox.audio_stream import AudioRingBuffer, SessionInbox
+
+
+def window(end, n=4, pitch=100.0, confidence=0.5):
+    return {"audio": np.arange(end - n, end, dtype=np.float32), "end": end, "pitch": pitch, "confidence": confidence}
+
+
+def test_ring_buffer_reads_back_across_the_wrap():
+    ring = AudioRingBuffer(8)
+    ring.append(np.arange(6))
+    ring.append(np.arange(6, 11))
+    assert ring.total_written == 11
+    assert ring.oldest == 3
+    assert ring.read(3, 11).tolist() == list(range(3, 11))
+    assert ring.read(7, 9).tolist() == [7, 8]
+
+
+def test_ring_buffer_keeps_the_tail_of_an_oversized_append():
+    ring = AudioRingBuffer(4)
+    ring.append(np.arange(10))
+    assert ring.total_written == 10
+    assert ring.read(6, 10).tolist() == [6, 7, 8, 9]
+
+
+@pytest.mark.parametrize("start, end", [(0, 4), (8, 12), (9, 8)])
+def test_ring_buffer_rejects_samples_it_does_not_hold(start, end):
+    ring = AudioRingBuffer(4)
+    ring.append(np.arange(10))
+    with pytest.raises(IndexError):
+        ring.read(start, end)
+
+
+def test_inbox_drop_oldest():
+    inbox = SessionInbox(max_size=2, policy="drop_oldest")
+    assert [inbox.put(window(end)) for end in (4, 8, 12)] == [0, 0, 1]
+    assert [inbox.get()["end"] for _ in range(len(inbox))] == [8, 12]
+    assert inbox.dropped == 1
+
+
+def test_inbox_latest_wins():
+    inbox = SessionInbox(max_size=5, policy="latest_wins")
+    inbox.put(window(4))
+    assert inbox.put(window(8)) == 1
+    assert len(inbox) == 1
+    assert inbox.get()["end"] == 8
+
+
+def test_inbox_coalesce_merges_contiguous_windows():
+    inbox = SessionInbox(max_size=1, policy="coalesce")
+    inbox.put(window(4, confidence=0.9, pitch=110.0))
+    assert inbox.put(window(6, confidence=0.2, pitch=300.0)) == 0
+    merged = inbox.get()
+    assert merged["end"] == 6
+    assert merged["audio"].tolist() == [0, 1, 2, 3, 4, 5]
+    assert merged["pitch"] == 110.0  # the more confident estimate
+    assert inbox.coalesced == 1
+
+
+def test_inbox_coalesce_keeps_the_newest_samples():
+    inbox = SessionInbox(max_size=1, policy="coalesce", max_coalesced=5)
+    inbox.put(window(4))
+    inbox.put(window(8))
+    assert inbox.get()["audio"].tolist() == [3, 4, 5, 6, 7]
+
+
+def test_inbox_coalesce_does_not_bridge_a_gap():
+    inbox = SessionInbox(max_size=1, policy="coalesce")
+    inbox.put(window(4))
+    inbox.put(window(20))
+    assert inbox.get()["audio"].tolist() == [16, 17, 18, 19]
+    assert inbox.dropped == 1
+
+
+def test_inbox_rejects_unknown_policy():
+    with pytest.raises(ValueError):
+        SessionInbox(policy="newest")
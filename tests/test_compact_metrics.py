@@ -0,0 +1,58 @@
+from vox.compact_metrics import COMPACT_COLUMNS, compact_metrics, decode_metrics, format_voice_report, parse_voice_report
+
+REPORT = """Pitch:
+   Median pitch: 182.301 Hz
+   Mean pitch: 180.5 Hz
+Jitter:
+   Jitter (local): 1.234%
+   Jitter (local, absolute): 6.712E-05 seconds
+Harmonicity of the voiced parts only:
+   Mean harmonics-to-noise ratio: --undefined--
+"""
+
+
+def test_pack_and_unpack_round_trip():
+    harmonics = [{"freq": 200.0 * (i + 1), "amp": 1.0 / (i + 1), "ratio": i + 1} for i in range(5)]
+    formants = [{"freq": 700.0, "bw": 80.0}, {"freq": 1220.0, "bw": 90.0}, {"freq": 2600.0, "bw": 120.0}]
+    jitter_shimmer = {"jitter_local": 0.012, "shimmer_local": 0.034}
+    values = compact_metrics(harmonics, formants, jitter_shimmer, REPORT)
+    assert len(values) == len(COMPACT_COLUMNS)
+
+    decoded = decode_metrics(dict(zip(COMPACT_COLUMNS, values), pitch=200.0))
+    assert decoded["formants"] == formants
+    assert decoded["harmonics"] == harmonics
+    assert decoded["jitter_shimmer"] == jitter_shimmer
+    assert decoded["voice_report"]["median_pitch"] == 182.301
+    assert decoded["voice_report"]["jitter_local"] == 0.01234
+    assert decoded["voice_report"]["mean_hnr"] is None
+    assert "Jitter (local): 1.234%" in decoded["praat_report"]
+
+
+def test_missing_formants_stay_missing():
+    formants = [{"freq": 500.0, "bw": 60.0}, {"freq": 900.0, "bw": 80.0}, {"freq": None, "bw": None}]
+    values = dict(zip(COMPACT_COLUMNS, compact_metrics(None, formants, None, None)))
+    assert values["f3"] is None and values["f3_bw"] is None
+    assert decode_metrics(values)["formants"][2] == {"freq": None, "bw": None}
+
+
+def test_legacy_json_is_read():
+    values = compact_metrics(
+        '[{"freq": 200, "amp": 1.0}]', '{"F1": 650, "F2": 1100, "F3": 2500}', '{"jitter": 1.5, "shimmer": 3}', None
+    )
+    row = dict(zip(COMPACT_COLUMNS, values))
+    assert (row["f1"], row["f2"], row["f3"]) == (650.0, 1100.0, 2500.0)
+    assert row["jitter"] == 0.015 and row["shimmer"] == 0.03
+    assert row["harmonic_amps"] == [1.0]
+
+
+def test_rows_without_compact_columns_decode_from_legacy_columns():
+    decoded = decode_metrics({"formants": '[{"freq": 600, "bw": 70}]', "praat_report": REPORT})
+    assert decoded["formants"] == [{"freq": 600, "bw": 70}]
+    assert decoded["voice_report"]["mean_pitch"] == 180.5
+
+
+def test_voice_report_text_round_trip():
+    values = parse_voice_report(REPORT)
+    assert parse_voice_report(format_voice_report(values)) == values
+    assert parse_voice_report("") is None
+    assert parse_voice_report("nothing to see") is None
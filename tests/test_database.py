@@ -0,0 +1,98 @@
+import asyncio
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+
+from vox.database import VocalDataWriter
+from vox.memory_store import MemoryPool
+
+START = datetime(2026, 5, 4, 10)
+
+
+class FlakyPool:
+    """A MemoryPool whose first ``failures`` acquires fail and whose COPY can be made to fail."""
+
+    def __init__(self, failures=0, copy_fails=False):
+        self.pool = MemoryPool()
+        self.failures = failures
+        self.copy_fails = copy_fails
+
+    @asynccontextmanager
+    async def acquire(self):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("database unavailable")
+        async with self.pool.acquire() as conn:
+            if self.copy_fails:
+                async def copy_records_to_table(*args, **kwargs):
+                    raise ValueError("COPY rejected the batch")
+                conn.copy_records_to_table = copy_records_to_table
+            yield conn
+
+    @property
+    def rows(self):
+        return sorted(self.pool.store.vocal_data.values(), key=lambda row: row["id"])
+
+
+async def add_rows(writer, n, session_id=None):
+    session_id = session_id or str(uuid.uuid4())
+    for i in range(n):
+        await writer.add(session_id, None, START + timedelta(seconds=i), 100.0 + i, None, None, None, None, None)
+
+
+def test_failed_flush_keeps_the_batch_for_the_next_one():
+    async def run():
+        pool = FlakyPool(failures=2)
+        writer = VocalDataWriter(pool, max_retries=3)
+        await add_rows(writer, 3)
+        await writer.flush()
+        await writer.flush()
+        assert len(writer) == 3 and writer.rows_written == 0
+        await add_rows(writer, 1)
+        await writer.flush()
+        return pool, writer
+
+    pool, writer = asyncio.run(run())
+    assert [row["pitch"] for row in pool.rows] == [100.0, 101.0, 102.0, 100.0]
+    assert writer.rows_written == 4 and writer.rows_dropped == 0 and len(writer) == 0
+
+
+def test_batch_is_dropped_after_max_retries():
+    async def run():
+        writer = VocalDataWriter(FlakyPool(failures=10), max_retries=2)
+        await add_rows(writer, 2)
+        for _ in range(3):
+            await writer.flush()
+        return writer
+
+    writer = asyncio.run(run())
+    assert writer.rows_written == 0 and writer.rows_dropped == 2 and len(writer) == 0
+
+
+def test_rejected_copy_falls_back_to_rows_and_counts_only_those_written():
+    async def run():
+        pool = FlakyPool(copy_fails=True)
+        writer = VocalDataWriter(pool)
+        await add_rows(writer, 2)
+        await writer.add("not-a-session-id", None, START, 90.0, None, None, None, None, None)
+        await writer.flush()
+        return pool, writer
+
+    pool, writer = asyncio.run(run())
+    assert len(pool.rows) == 2
+    assert writer.rows_written == 2 and writer.rows_dropped == 1
+
+
+def test_close_flushes_and_later_rows_are_written_directly():
+    async def run():
+        pool = FlakyPool()
+        writer = VocalDataWriter(pool, batch_size=100, flush_interval=60)
+        writer.start()
+        await add_rows(writer, 2)
+        await writer.close()
+        assert len(pool.rows) == 2
+        await add_rows(writer, 1)
+        return pool, writer
+
+    pool, writer = asyncio.run(run())
+    assert len(pool.rows) == 3 and len(writer) == 0 and writer.rows_written == 3
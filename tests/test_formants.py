@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+from benchmarks.bench_analysis import SR, make_case
+from benchmarks.synthetic import DEFAULT_FORMANTS, synth_voice
+from vox.audio_processing import (
+    analyze_batch,
+    extract_formants_parselmouth,
+    formant_summary,
+    formants_to_dicts,
+    track_formants,
+)
+
+TRUTH = [freq for freq, _ in DEFAULT_FORMANTS]
+
+
+def mean_error(formants):
+    return np.mean([abs((f["freq"] or 0.0) - truth) for f, truth in zip(formants, TRUTH)])
+
+
+def tracked(audio, sr=SR):
+    return formant_summary(track_formants(audio, sr))
+
+
+@pytest.mark.parametrize("chunk", [2048, 8192])
+@pytest.mark.parametrize("f0", [110, 180, 250])
+def test_tracker_finds_every_formant_of_the_bench_vowel(chunk, f0):
+    formants = tracked(make_case(f0, chunk)["audio"])
+    assert abs(formants[0]["freq"] - TRUTH[0]) < 0.1 * TRUTH[0]
+    assert abs(formants[1]["freq"] - TRUTH[1]) < 0.1 * TRUTH[1]
+    assert abs(formants[2]["freq"] - TRUTH[2]) < 400
+
+
+@pytest.mark.parametrize("chunk", [1024, 2048, 4096, 8192])
+def test_tracker_is_no_worse_than_praat(chunk):
+    cases = [make_case(f0, chunk)["audio"] for f0 in (110, 180, 250)]
+    tracker = np.mean([mean_error(tracked(audio)) for audio in cases])
+    praat = np.mean([mean_error(extract_formants_parselmouth(audio, SR)) for audio in cases])
+    assert tracker <= praat
+
+
+def test_short_window_falls_back_to_one_frame():
+    # 1024 samples at 44.1 kHz is under one 25 ms frame after resampling
+    tracks = track_formants(make_case(180, 1024)["audio"], SR)
+    assert len(tracks["times"]) == 1
+    assert all(f["freq"] for f in formant_summary(tracks))
+
+
+def test_tracker_keeps_f3_of_a_clean_16k_vowel():
+    formants = tracked(synth_voice(110, 16000, 0.5), 16000)
+    assert formants[2]["freq"] == pytest.approx(TRUTH[2], rel=0.1)
+
+
+def test_live_lpc_keeps_f3_on_noisy_input():
+    for f0 in (110, 180, 250):
+        formants = analyze_batch(make_case(f0, 2048)["audio"][np.newaxis, :], SR)[0]["formants"]
+        assert formants[2]["freq"] is not None
+        assert mean_error(formants) < 250
+
+
+def test_missing_formants_are_none_not_typical_values():
+    assert formants_to_dicts(np.array([650.0, 1200.0, np.nan]), np.array([80.0, 90.0, np.nan])) == [
+        {"freq": 650.0, "bw": 80.0}, {"freq": 1200.0, "bw": 90.0}, {"freq": None, "bw": None},
+    ]
+    silence = np.zeros(SR // 4, dtype=np.float32)
+    assert tracked(silence) == [{"freq": None, "bw": None, "iqr": None}] * 3
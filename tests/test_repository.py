@@ -0,0 +1,37 @@
+import base64
+from datetime import datetime
+
+import pytest
+
+from vox.repository import decode_cursor, encode_cursor, performance_columns, performances_sql
+
+
+def test_cursor_round_trip():
+    row = {"timestamp": datetime(2026, 3, 1, 12, 30, 5, 123456), "id": 42}
+    cursor = encode_cursor(row)
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == (row["timestamp"], 42)
+
+
+@pytest.mark.parametrize("cursor", [
+    "",
+    "not a cursor!",
+    base64.urlsafe_b64encode(b"2026-03-01T12:00:00").decode(),
+    base64.urlsafe_b64encode(b"2026-03-01T12:00:00|x").decode(),
+    base64.urlsafe_b64encode(b"yesterday|3").decode(),
+    base64.urlsafe_b64encode(b"\xff\xfe|1").decode(),
+])
+def test_bad_cursors_are_rejected(cursor):
+    with pytest.raises(ValueError):
+        decode_cursor(cursor)
+
+
+def test_performances_sql_projects_each_column_once():
+    columns = performance_columns(("voice_report", "praat_report", "pitch"))
+    assert columns == ("id", "timestamp", "voice_report", "praat_report", "pitch")
+    assert performances_sql(("pitch",), True, True).endswith("AND (timestamp, id) < ($2, $3) ORDER BY timestamp DESC, id DESC LIMIT $4")
+
+
+def test_performances_sql_rejects_unknown_fields():
+    with pytest.raises(ValueError):
+        performances_sql(("pitch", "password_hash"), False, True)
@@ -0,0 +1,75 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from vox.memory_store import MemoryPool
+from vox.repository import fetch_rollups
+from vox.rollups import ROLLUP_METRICS, RollupAccumulator, _unscale, apply_rollups, bin_index, histogram_percentile
+
+START = datetime(2026, 5, 4, 10)
+
+
+def bin_width(metric, value):
+    i = bin_index(metric, value)
+    return _unscale(metric, i + 1) - _unscale(metric, i)
+
+
+def histogram(metric, values):
+    counts = [0] * ROLLUP_METRICS[metric][2]
+    for value in values:
+        counts[bin_index(metric, value)] += 1
+    return counts
+
+
+@pytest.mark.parametrize("metric, low, high", [("pitch", 90.0, 260.0), ("hnr", -5.0, 30.0), ("jitter", 0.001, 0.05)])
+@pytest.mark.parametrize("q", [10, 50, 90])
+def test_percentile_is_within_a_bin_of_the_exact_value(metric, low, high, q):
+    values = np.random.default_rng(q).uniform(low, high, 2000)
+    exact = np.percentile(values, q)
+    estimate = histogram_percentile(metric, histogram(metric, values), q, values.min(), values.max())
+    assert abs(estimate - exact) <= bin_width(metric, exact)
+
+
+def test_percentile_is_clamped_to_the_observed_range():
+    counts = histogram("pitch", [200.0] * 10)
+    assert histogram_percentile("pitch", counts, 0, 200.0, 200.0) == 200.0
+    assert histogram_percentile("pitch", counts, 100, 200.0, 200.0) == 200.0
+    assert histogram_percentile("pitch", [0] * len(counts), 50) is None
+
+
+def test_accumulator_buckets_by_hour_and_day():
+    accumulator = RollupAccumulator()
+    accumulator.add_row("u", {"timestamp": START + timedelta(minutes=5), "pitch": 180.0, "f1": 0.0})
+    accumulator.add_row("u", {"timestamp": START + timedelta(minutes=75), "pitch": 200.0})
+    records = {(granularity, bucket): (count, total) for _, granularity, bucket, _, count, total, *_ in accumulator.records()}
+    assert records == {
+        ("hour", START): (1, 180.0),
+        ("hour", START + timedelta(hours=1)): (1, 200.0),
+        ("day", START.replace(hour=0)): (2, 380.0),
+    }
+
+
+def test_batches_merge_into_the_same_rollup():
+    user_id = str(uuid.uuid4())
+    rows = [
+        {"session_id": None, "user_id": user_id, "timestamp": START + timedelta(seconds=i), "pitch": 150.0 + i % 60}
+        for i in range(600)
+    ]
+
+    async def rollups(batches):
+        pool = MemoryPool()
+        for batch in batches:
+            await apply_rollups(pool, batch)
+        return await fetch_rollups(pool, user_id, "hour", ["pitch"], START, START + timedelta(hours=1))
+
+    whole = asyncio.run(rollups([rows]))
+    split = asyncio.run(rollups([rows[:250], rows[250:]]))
+    assert len(whole) == len(split) == 1
+    for column in ("count", "sum", "min", "max", "histogram"):
+        assert split[0][column] == whole[0][column]
+    assert split[0]["sum_sq"] == pytest.approx(whole[0]["sum_sq"])
+    median = histogram_percentile("pitch", split[0]["histogram"], 50, split[0]["min"], split[0]["max"])
+    assert abs(median - np.median([row["pitch"] for row in rows])) <= bin_width("pitch", median)
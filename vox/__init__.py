@@ -13,12 +13,13 @@ logger = logging.getLogger(__name__)
 db_pool = None
 
 async def init_pg_pool():
-    import asyncpg
+    from vox.repository import create_storage
     global db_pool
     if db_pool is not None:
         return db_pool
     SUPABASE_DB_URL = os.environ.get("SUPABASE_DB_URL")
-    db_pool = await asyncpg.create_pool(SUPABASE_DB_URL, max_size=10, statement_cache_size=0)
+    # Sized by VOX_DB_POOL_MIN_SIZE/VOX_DB_POOL_MAX_SIZE, instrumented like the app's
+    db_pool = await create_storage(SUPABASE_DB_URL, "postgres")
     return db_pool
 
 # NOTE: All Flask app, SocketIO, CSRF, Limiter, and Blueprint logic has been removed.
@@ -0,0 +1,198 @@
+import os
+import asyncio
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+from vox.audio_processing import analyze_chunk, analyze_batch, analyze_segment
+
+logger = logging.getLogger(__name__)
+
+
+class AnalysisOverloaded(Exception):
+    """Raised when the analysis queue is full and a task is rejected."""
+
+
+def _warm_up():
+    # Import the DSP libraries and run one tiny analysis so the first real
+    # chunk a worker sees doesn't pay for module loading and Praat setup.
+    analyze_chunk(np.zeros(2048, dtype=np.float32), 44100)
+    return os.getpid()
+
+
+class AnalysisEngine:
+    """
+    Runs audio DSP off the event loop on a process (or thread) pool.
+
+    In-flight tasks are bounded by ``queue_size``: when every slot is taken,
+    ``run`` rejects the task with ``AnalysisOverloaded`` instead of letting
+    work pile up behind the executor. Each task also gets its own timeout.
+    """
+
+    def __init__(self, mode="process", workers=None, queue_size=None, timeout=5.0):
+        if mode not in ("process", "thread"):
+            raise ValueError(f"Unknown analysis engine mode: {mode}")
+        self.mode = mode
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size or self.workers * 4
+        self.timeout = timeout
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(self.queue_size)
+
+    @classmethod
+    def from_env(cls):
+        """
+        Build an engine from VOX_ANALYSIS_* environment variables.
+        """
+        workers = os.environ.get("VOX_ANALYSIS_WORKERS")
+        queue_size = os.environ.get("VOX_ANALYSIS_QUEUE_SIZE")
+        return cls(
+            mode=os.environ.get("VOX_ANALYSIS_MODE", "process"),
+            workers=int(workers) if workers else None,
+            queue_size=int(queue_size) if queue_size else None,
+            timeout=float(os.environ.get("VOX_ANALYSIS_TIMEOUT", "5.0"))
+        )
+
+    def start(self):
+        if self._executor is not None:
+            return
+        if self.mode == "process":
+            # spawn, not fork: the parent runs an event loop and other threads
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        else:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="vox-analysis")
+        logger.info(f"Analysis engine started: {self.workers} {self.mode} workers, queue size {self.queue_size}")
+
+    async def warm_up(self):
+        """
+        Start every worker and load the DSP stack in it.
+        """
+        self.start()
+        loop = asyncio.get_running_loop()
+        try:
+            await asyncio.gather(*[
+                loop.run_in_executor(self._executor, _warm_up) for _ in range(self.workers)
+            ])
+            logger.info("Analysis engine workers warmed up")
+        except Exception as e:
+            logger.error(f"Analysis engine warm-up failed: {e}")
+
+    async def run(self, fn, *args):
+        """
+        Run ``fn(*args)`` on the pool and await its result.
+
+        Raises ``AnalysisOverloaded`` when the queue is full and
+        ``asyncio.TimeoutError`` when the task exceeds the timeout.
+        """
+        self.start()
+        if not self._slots.acquire(blocking=False):
+            raise AnalysisOverloaded("Analysis queue is full")
+        try:
+            future = self._executor.submit(fn, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        # Free the slot when the worker is actually done, not when we stop
+        # waiting, so timed-out tasks still count against the bound.
+        future.add_done_callback(lambda _: self._slots.release())
+        return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+
+    async def analyze(self, audio, sr, pitch=None, confidence=0.0, formants=None):
+        return await self.run(analyze_chunk, audio, sr, pitch, confidence, formants)
+
+    async def analyze_segment(self, audio, sr):
+        return await self.run(analyze_segment, audio, sr)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+class MicroBatcher:
+    """
+    Collects frames from many sessions and analyzes them as one batch.
+
+    Frames are grouped by (sample rate, length) so they can be stacked into a
+    2-D array for ``analyze_batch``. A group is flushed to the engine as soon
+    as it holds ``max_batch`` frames or its oldest frame has waited
+    ``max_latency`` seconds, whichever comes first.
+    """
+
+    def __init__(self, engine, max_batch=32, max_latency=0.02):
+        self.engine = engine
+        self.max_batch = max_batch
+        self.max_latency = max_latency
+        self._pending = {}
+        self._timers = {}
+        self._tasks = set()
+
+    @classmethod
+    def from_env(cls, engine):
+        """
+        Build a batcher from VOX_BATCH_* environment variables.
+        """
+        return cls(
+            engine,
+            max_batch=int(os.environ.get("VOX_BATCH_MAX_SIZE", "32")),
+            max_latency=float(os.environ.get("VOX_BATCH_MAX_LATENCY_MS", "20")) / 1000
+        )
+
+    async def submit(self, frame, sr):
+        """
+        Queue one frame and await its {pitch, confidence, formants} result.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        key = (sr, len(frame))
+        batch = self._pending.setdefault(key, [])
+        batch.append((frame, future))
+        if len(batch) >= self.max_batch:
+            self._flush(key)
+        elif len(batch) == 1:
+            self._timers[key] = loop.call_later(self.max_latency, self._flush, key)
+        return await future
+
+    def _flush(self, key):
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(key, None)
+        if batch:
+            # Hold a reference so the task isn't collected mid-run; close() reaps it
+            task = asyncio.ensure_future(self._run(key[0], batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def close(self):
+        """
+        Flush pending groups and wait for in-flight batches to finish.
+        """
+        for key in list(self._pending):
+            self._flush(key)
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _run(self, sr, batch):
+        frames = np.stack([frame for frame, _ in batch])
+        try:
+            results = await self.engine.run(analyze_batch, frames, sr)
+        except asyncio.CancelledError:
+            # Waiters see the cancellation; the task still finishes cancelling
+            for _, future in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
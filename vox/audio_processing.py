@@ -1,88 +1,533 @@
+from collections import deque
+from functools import cached_property, lru_cache
+from math import gcd
+
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 import librosa
 import parselmouth
+from parselmouth.praat import call
+from scipy.signal import firwin, resample_poly
+
+
+def missing_formants(n=3):
+    """Formants that couldn't be measured: None, never typical values."""
+    return [{"freq": None, "bw": None} for _ in range(n)]
+
+
+def default_harmonics(pitch):
+    return [{"freq": pitch * (i + 1), "amp": 1.0 / (i + 1), "ratio": i + 1} for i in range(5)]
+
+
+@lru_cache(maxsize=16)
+def polyphase_filter(up, down):
+    """
+    Anti-aliasing FIR for resampling by up/down (same design as
+    scipy's resample_poly), designed once per ratio.
+    """
+    max_rate = max(up, down)
+    half_len = 10 * max_rate
+    taps = firwin(2 * half_len + 1, 1.0 / max_rate, window=("kaiser", 5.0))
+    # Polyphase table: row p holds the (gain-corrected) taps for output phase p
+    n_phase_taps = -(-len(taps) // up)
+    table = np.zeros((up, n_phase_taps))
+    for phase in range(up):
+        phase_taps = taps[phase::up] * up
+        table[phase, :len(phase_taps)] = phase_taps
+    return taps, table, half_len
+
+
+def resampling_ratio(sr, target_sr):
+    divisor = gcd(int(target_sr), int(sr))
+    return int(target_sr) // divisor, int(sr) // divisor
+
+
+def resample(audio, sr, target_sr):
+    """
+    One-shot polyphase resampling with the cached filter design.
+    """
+    if sr == target_sr:
+        return np.asarray(audio, dtype=np.float32)
+    up, down = resampling_ratio(sr, target_sr)
+    taps, _, _ = polyphase_filter(up, down)
+    return resample_poly(audio, up, down, window=taps).astype(np.float32)
+
+
+class StreamingResampler:
+    """
+    Stateful polyphase resampler for a stream of frames.
+
+    Keeps just enough input history between calls that the concatenated
+    output equals resampling the whole stream at once (after the filter's
+    group delay, which is dropped from the start of the stream).
+    """
+
+    def __init__(self, sr, target_sr):
+        self.sr = sr
+        self.target_sr = target_sr
+        self.up, self.down = resampling_ratio(sr, target_sr)
+        _, self._table, half_len = polyphase_filter(self.up, self.down)
+        self._n_taps = self._table.shape[1]
+        self._history = np.zeros(self._n_taps - 1)
+        self._n_in = 0
+        self._n_out = 0
+        self._skip = half_len // self.down
+
+    def process(self, samples):
+        samples = np.asarray(samples, dtype=np.float64)
+        buffer = np.concatenate([self._history, samples])
+        buffer_start = self._n_in - len(self._history)
+        self._n_in += len(samples)
+        # Every output m whose newest input sample (m * down) // up has arrived
+        n_ready = (self._n_in * self.up - 1) // self.down + 1 - self._n_out
+        if n_ready > 0:
+            positions = (self._n_out + np.arange(n_ready)) * self.down
+            base = positions // self.up - buffer_start
+            offsets = base[:, None] - np.arange(self._n_taps)[None, :]
+            gathered = np.where(offsets >= 0, buffer[np.maximum(offsets, 0)], 0.0)
+            out = np.einsum("ij,ij->i", gathered, self._table[positions % self.up])
+            self._n_out += n_ready
+        else:
+            out = np.zeros(0)
+        self._history = buffer[len(buffer) - (self._n_taps - 1):] if self._n_taps > 1 else np.zeros(0)
+        if self._skip:
+            dropped = min(self._skip, len(out))
+            out = out[dropped:]
+            self._skip -= dropped
+        return out.astype(np.float32)
+
+
+def batch_yin_pitch(frames, sr, fmin=75.0, fmax=600.0, threshold=0.15):
+    """
+    YIN pitch for a whole batch of equal-length frames at once.
+
+    ``frames`` is a 2-D array (one frame per row). Returns ``(pitch,
+    confidence)`` arrays; pitch is 0 where no period is found. The difference
+    function is computed for every frame with one FFT cross-correlation.
+    """
+    frames = np.atleast_2d(np.asarray(frames, dtype=np.float64))
+    n_frames, n = frames.shape
+    tau_min = max(2, int(sr / fmax))
+    tau_max = min(int(sr / fmin), n // 2)
+    width = n - tau_max
+    pitch = np.zeros(n_frames)
+    confidence = np.zeros(n_frames)
+    if tau_max <= tau_min:
+        return pitch, confidence
+
+    # d(tau) = E(0) + E(tau) - 2 r(tau), with r from one batched FFT
+    nfft = 1 << int(np.ceil(np.log2(n + width)))
+    spec = np.fft.rfft(frames, nfft) * np.conj(np.fft.rfft(frames[:, :width], nfft))
+    r = np.fft.irfft(spec, nfft)[:, :tau_max + 1]
+    energy = np.concatenate([np.zeros((n_frames, 1)), np.cumsum(frames ** 2, axis=1)], axis=1)
+    taus = np.arange(tau_max + 1)
+    e_tau = energy[:, taus + width] - energy[:, taus]
+    diff = np.maximum(e_tau[:, :1] + e_tau - 2 * r, 0.0)
+
+    # Cumulative mean normalized difference
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cmndf = diff[:, 1:] * taus[1:] / np.cumsum(diff[:, 1:], axis=1)
+    cmndf = np.concatenate([np.ones((n_frames, 1)), np.nan_to_num(cmndf, nan=1.0, posinf=1.0)], axis=1)
+
+    # First local minimum under the threshold, else the global minimum
+    search = cmndf[:, tau_min:tau_max]
+    local_min = (search <= cmndf[:, tau_min - 1:tau_max - 1]) & (search <= cmndf[:, tau_min + 1:tau_max + 1])
+    candidates = local_min & (search < threshold)
+    has_candidate = candidates.any(axis=1)
+    tau = np.where(has_candidate, np.argmax(candidates, axis=1), np.argmin(search, axis=1)) + tau_min
+
+    # Parabolic interpolation around the chosen lag
+    rows = np.arange(n_frames)
+    left, mid, right = cmndf[rows, tau - 1], cmndf[rows, tau], cmndf[rows, tau + 1]
+    denom = left - 2 * mid + right
+    with np.errstate(divide="ignore", invalid="ignore"):
+        shift = np.where(np.abs(denom) > 1e-12, 0.5 * (left - right) / denom, 0.0)
+    refined = tau + np.clip(shift, -1, 1)
+
+    confidence = np.clip(1.0 - mid, 0.0, 1.0)
+    voiced = (e_tau[:, 0] > 1e-10) & (mid < 1.0)
+    pitch = np.where(voiced, sr / refined, 0.0)
+    confidence = np.where(voiced, confidence, 0.0)
+    return pitch, confidence
+
+
+def lpc_candidates(frames, sr, order=None, min_freq=90.0, max_bw=400.0):
+    """
+    Every plausible LPC resonance of a batch of equal-length frames.
+
+    Returns ``(freqs, bws)`` arrays of shape (n_frames, order), ascending in
+    frequency and NaN-padded. Levinson-Durbin runs vectorized across frames
+    and the LPC roots come from one batched eigenvalue call on the companion
+    matrices.
+    """
+    frames = np.atleast_2d(np.asarray(frames, dtype=np.float64))
+    n_frames, n = frames.shape
+    order = order or 2 + sr // 1000
+
+    # Pre-emphasis and Hamming window
+    emphasized = np.concatenate([frames[:, :1], frames[:, 1:] - 0.97 * frames[:, :-1]], axis=1)
+    emphasized *= np.hamming(n)
+
+    nfft = 1 << int(np.ceil(np.log2(2 * n)))
+    spec = np.fft.rfft(emphasized, nfft)
+    autocorr = np.fft.irfft(spec * np.conj(spec), nfft)[:, :order + 1]
+    autocorr[:, 0] *= 1.0 + 1e-9  # white-noise correction keeps silent frames stable
+
+    # Levinson-Durbin, vectorized over frames
+    a = np.zeros((n_frames, order + 1))
+    a[:, 0] = 1.0
+    err = autocorr[:, 0].copy()
+    for i in range(1, order + 1):
+        acc = np.einsum("ij,ij->i", a[:, :i], autocorr[:, i:0:-1])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            k = np.nan_to_num(-acc / err)
+        a[:, 1:i + 1] = a[:, 1:i + 1] + k[:, None] * a[:, i - 1::-1][:, :i]
+        err *= 1.0 - k ** 2
+
+    # Roots of every LPC polynomial via batched companion-matrix eigenvalues
+    companion = np.zeros((n_frames, order, order))
+    companion[:, 0, :] = -a[:, 1:]
+    companion[:, np.arange(1, order), np.arange(order - 1)] = 1.0
+    roots = np.linalg.eigvals(companion)
+
+    freqs = np.angle(roots) * (sr / (2 * np.pi))
+    with np.errstate(divide="ignore"):
+        bws = -(sr / np.pi) * np.log(np.abs(roots))
+    valid = (np.imag(roots) > 0) & (freqs > min_freq) & (bws < max_bw)
+    freqs = np.where(valid, freqs, np.inf)
+    idx = np.argsort(freqs, axis=1)
+    freqs = np.take_along_axis(freqs, idx, axis=1)
+    bws = np.take_along_axis(bws, idx, axis=1)
+    missing = ~np.isfinite(freqs)
+    freqs[missing] = np.nan
+    bws[missing] = np.nan
+    return freqs, bws
+
+
+def _pick_formants(freqs, bws, limits):
+    """
+    F1..Fn from ascending LPC candidates: each formant takes the lowest
+    candidate above the previous one whose bandwidth is within its limit.
+    """
+    rows = np.arange(len(freqs))
+    columns = np.arange(freqs.shape[1])
+    out_freqs = np.full((len(freqs), len(limits)), np.nan)
+    out_bws = np.full((len(freqs), len(limits)), np.nan)
+    start = np.zeros(len(freqs), dtype=int)
+    for i, limit in enumerate(limits):
+        with np.errstate(invalid="ignore"):
+            ok = (columns >= start[:, None]) & (bws < limit) & ~np.isnan(freqs)
+        found = ok.any(axis=1)
+        pick = np.argmax(ok, axis=1)
+        out_freqs[found, i] = freqs[rows, pick][found]
+        out_bws[found, i] = bws[rows, pick][found]
+        start = np.where(found, pick + 1, start)
+    return out_freqs, out_bws
+
+
+def batch_lpc_formants(frames, sr, order=None, n_formants=3, min_freq=90.0, max_bw=(400.0, 400.0, 1000.0)):
+    """
+    LPC formants for a whole batch of equal-length frames at once.
+
+    ``max_bw`` is the bandwidth limit of each formant in turn: F1 and F2 must
+    be sharp, while F3 sits where the source is weak and noise widens it, so
+    it gets a looser limit. Returns ``(freqs, bws)`` arrays of shape
+    (n_frames, n_formants), NaN where a formant has no plausible resonance.
+    """
+    limits = np.broadcast_to(np.asarray(max_bw, dtype=np.float64), (n_formants,))
+    freqs, bws = lpc_candidates(frames, sr, order, min_freq, limits.max())
+    return _pick_formants(freqs, bws, limits)
+
+
+def _nan_median_filter(tracks, width):
+    """Running median along axis 0 of an (n_frames, n_tracks) array, ignoring NaN."""
+    half = width // 2
+    padded = np.pad(tracks, ((half, half), (0, 0)), mode="edge")
+    # NaN sorts last, so the valid values of each window lead its sorted copy
+    windows = np.sort(sliding_window_view(padded, width, axis=0), axis=-1)
+    count = np.sum(~np.isnan(windows), axis=-1)
+    lo = np.take_along_axis(windows, np.maximum(count - 1, 0)[..., None] // 2, axis=-1)[..., 0]
+    hi = np.take_along_axis(windows, np.minimum(count // 2, width - 1)[..., None], axis=-1)[..., 0]
+    return np.where(count > 0, (lo + hi) / 2, np.nan)
+
+
+def track_formants(audio, sr, n_formants=3, frame_ms=25.0, hop_ms=10.0, max_jump=0.25, smooth_frames=7,
+                   silence_db=40.0, max_bw=(400.0, 1000.0, 1000.0), max_formant=5500.0, min_frames=3):
+    """
+    Frame-level F1..Fn tracks over a window or a whole recording.
+
+    LPC candidates for all frames come from one batched root-finding call.
+    Continuity comes from a reference track, the running median of each
+    frame's own F1..Fn (picked as in ``batch_lpc_formants``, with the
+    per-formant ``max_bw`` limits): every frame takes the candidate nearest
+    the reference, or NaN if none lies within ``max_jump`` (relative) of it.
+    Frames more than ``silence_db`` below the loudest one are NaN. Like
+    Praat, audio is first resampled to twice ``max_formant``. Audio too
+    short for ``min_frames`` frames is analyzed as a single frame.
+
+    Returns ``{"times", "freqs", "bws"}`` as float32 arrays of shape
+    (n_frames,) and (n_frames, n_formants).
+    """
+    audio = np.asarray(audio, dtype=np.float64)
+    if sr > 2 * max_formant:
+        audio, sr = resample(audio, sr, int(2 * max_formant)), int(2 * max_formant)
+    limits = np.broadcast_to(np.asarray(max_bw, dtype=np.float64), (n_formants,))
+    frame = int(sr * frame_ms / 1000)
+    hop = max(1, int(sr * hop_ms / 1000))
+    if len(audio) < frame + (min_frames - 1) * hop:
+        freqs, bws = batch_lpc_formants(audio, sr, n_formants=n_formants, max_bw=limits)
+        times = np.array([len(audio) / 2 / sr])
+        return {"times": times.astype(np.float32), "freqs": freqs.astype(np.float32), "bws": bws.astype(np.float32)}
+    frames = sliding_window_view(audio, frame)[::hop]
+    times = (np.arange(len(frames)) * hop + frame / 2) / sr
+
+    candidates, candidate_bws = lpc_candidates(frames, sr, max_bw=limits.max())
+    rms = np.sqrt(np.mean(frames ** 2, axis=1))
+    candidates[rms < rms.max() * 10 ** (-silence_db / 20)] = np.nan
+
+    reference = _nan_median_filter(_pick_formants(candidates, candidate_bws, limits)[0], smooth_frames)
+    distance = np.abs(candidates[:, None, :] - reference[:, :, None])
+    distance = np.where(np.isnan(distance), np.inf, distance)
+    pick = np.argmin(distance, axis=2)
+    nearest = np.take_along_axis(distance, pick[:, :, None], axis=2)[:, :, 0]
+    freqs = np.take_along_axis(candidates, pick, axis=1)
+    bws = np.take_along_axis(candidate_bws, pick, axis=1)
+    with np.errstate(invalid="ignore"):
+        lost = ~(nearest <= max_jump * reference) | ~(bws < limits)
+    # Two tracks on the same candidate: only the nearer one keeps it
+    for i in range(n_formants - 1):
+        shared = (pick[:, i] == pick[:, i + 1]) & ~lost[:, i] & ~lost[:, i + 1]
+        farther = nearest[:, i] > nearest[:, i + 1]
+        lost[shared & farther, i] = True
+        lost[shared & ~farther, i + 1] = True
+    freqs[lost] = np.nan
+    bws[lost] = np.nan
+    return {"times": times.astype(np.float32), "freqs": freqs.astype(np.float32), "bws": bws.astype(np.float32)}
+
+
+def formant_summary(tracks):
+    """
+    Median frequency and bandwidth, and frequency IQR, of each formant track
+    in the API's list-of-dicts form (None for a track with no valid frames).
+    """
+    summary = []
+    for freqs, bws in zip(tracks["freqs"].T, tracks["bws"].T):
+        valid = ~np.isnan(freqs)
+        if not valid.any():
+            summary.append({"freq": None, "bw": None, "iqr": None})
+            continue
+        q25, median, q75 = np.percentile(freqs[valid], [25, 50, 75])
+        summary.append({"freq": float(median), "bw": float(np.median(bws[valid])), "iqr": float(q75 - q25)})
+    return summary
+
+
+def formants_to_dicts(freqs, bws):
+    """
+    Convert one row of formant tracks into the API's list-of-dicts form, with
+    None for a formant that wasn't found.
+    """
+    return [
+        {"freq": None, "bw": None} if np.isnan(f) else {"freq": float(f), "bw": float(bw)}
+        for f, bw in zip(freqs, bws)
+    ]
+
+
+def batch_volume_db(frames):
+    """RMS level of each frame in dBFS."""
+    frames = np.atleast_2d(np.asarray(frames, dtype=np.float64))
+    rms = np.sqrt(np.mean(frames ** 2, axis=1))
+    return 20 * np.log10(np.maximum(rms, 1e-10))
+
+
+def analyze_batch(frames, sr):
+    """
+    Live-tier metrics (pitch, LPC formants, volume) for a stacked batch of
+    frames, one dict per frame.
+    """
+    pitch, confidence = batch_yin_pitch(frames, sr)
+    freqs, bws = batch_lpc_formants(frames, sr)
+    volume = batch_volume_db(frames)
+    return [
+        {"pitch": float(p), "confidence": float(c), "formants": formants_to_dicts(f, b), "volume": float(v)}
+        for p, c, f, b, v in zip(pitch, confidence, freqs, bws, volume)
+    ]
+
 
 def estimate_formants(audio, sr):
     try:
-        audio = librosa.effects.preemphasis(audio)
-        lpc_coeffs = librosa.lpc(audio, order=2 + sr // 1000)
-        roots = np.roots(lpc_coeffs)
-        roots = roots[np.imag(roots) >= 0]
-        formant_freqs = np.angle(roots) * (sr / (2 * np.pi))
-        formant_bws = -0.5 * (sr / np.pi) * np.log(np.abs(roots))
-        formant_freqs = formant_freqs[formant_freqs > 0]
-        formant_bws = formant_bws[formant_freqs > 0]
-        indices = np.argsort(formant_freqs)
-        formant_freqs = formant_freqs[indices][:3]
-        formant_bws = formant_bws[indices][:3]
-        return [{"freq": float(f), "bw": float(bw)} for f, bw in zip(formant_freqs, formant_bws)] if len(formant_freqs) >= 3 else [
-            {"freq": 500, "bw": 50}, {"freq": 1500, "bw": 100}, {"freq": 2500, "bw": 150}
-        ]
+        freqs, bws = batch_lpc_formants(audio, sr)
+        return formants_to_dicts(freqs[0], bws[0])
     except Exception:
-        return [{"freq": 500, "bw": 50}, {"freq": 1500, "bw": 100}, {"freq": 2500, "bw": 150}]
+        return missing_formants()
 
-def extract_pitch_parselmouth(audio, sr):
-    try:
-        snd = parselmouth.Sound(audio, sampling_frequency=sr)
-        pitch_obj = snd.to_pitch()
-        pitch_values = pitch_obj.selected_array['frequency']
-        pitch_values = pitch_values[pitch_values > 0]
-        if len(pitch_values) == 0:
+
+class VoiceAnalysis:
+    """
+    Single-pass analysis context for one chunk of audio.
+
+    The Praat objects (Sound, Pitch, PointProcess, Harmonicity, Formant) are
+    built lazily on first use and shared by every metric, so asking for the
+    pitch, jitter/shimmer and the voice report only runs each Praat pass once.
+    """
+
+    def __init__(self, audio, sr, pitch_floor=75.0, pitch_ceiling=600.0):
+        self.audio = audio
+        self.sr = sr
+        self.pitch_floor = pitch_floor
+        self.pitch_ceiling = pitch_ceiling
+
+    @cached_property
+    def sound(self):
+        return parselmouth.Sound(self.audio, sampling_frequency=self.sr)
+
+    @cached_property
+    def pitch(self):
+        return self.sound.to_pitch(pitch_floor=self.pitch_floor, pitch_ceiling=self.pitch_ceiling)
+
+    @cached_property
+    def point_process(self):
+        # Derived from the shared Pitch object instead of a second pitch pass.
+        return call([self.sound, self.pitch], "To PointProcess (cc)")
+
+    @cached_property
+    def harmonicity(self):
+        return self.sound.to_harmonicity_cc(minimum_pitch=self.pitch_floor)
+
+    @cached_property
+    def formant(self):
+        return self.sound.to_formant_burg()
+
+    def median_pitch(self):
+        try:
+            pitch_values = self.pitch.selected_array['frequency']
+            pitch_values = pitch_values[pitch_values > 0]
+            if len(pitch_values) == 0:
+                return 0.0
+            return float(np.median(pitch_values))
+        except Exception:
             return 0.0
-        return float(np.median(pitch_values))
-    except Exception:
-        return 0.0
+
+    def hnr(self):
+        try:
+            hnr = call(self.harmonicity, "Get mean", 0, 0)
+            return float(hnr) if hnr is not None and not np.isnan(hnr) else 0.0
+        except Exception:
+            return 0.0
+
+    def voice_quality(self):
+        try:
+            jitter_local = call(self.point_process, "Get jitter (local)", 0, 0, 0.0001, 0.02, 1.3)
+            shimmer_local = call([self.sound, self.point_process], "Get shimmer (local)", 0, 0, 0.0001, 0.02, 1.3, 1.6)
+            return {
+                "jitter_local": float(np.nan_to_num(jitter_local)),
+                "shimmer_local": float(np.nan_to_num(shimmer_local))
+            }
+        except Exception:
+            return {"jitter_local": 0.0, "shimmer_local": 0.0}
+
+    def voice_report(self):
+        try:
+            return call([self.sound, self.pitch, self.point_process], "Voice report", 0, 0, 75, 500, 1.3, 1.6, 0.03, 0.45)
+        except Exception:
+            return ""
+
+    def formants(self, max_formants=3):
+        try:
+            t = self.sound.get_total_duration() / 2
+            formants = []
+            for i in range(1, max_formants + 1):
+                freq = self.formant.get_value_at_time(i, t)
+                bw = self.formant.get_bandwidth_at_time(i, t)
+                if freq is None or np.isnan(freq):
+                    formants.append({"freq": None, "bw": None})
+                    continue
+                formants.append({"freq": float(freq), "bw": float(bw) if bw is not None and not np.isnan(bw) else None})
+            return formants
+        except Exception:
+            return missing_formants(max_formants)
+
+    def harmonic_profile(self, pitch):
+        return estimate_harmonics(self.audio, pitch, self.sr)
+
+    def harmonics(self, pitch):
+        return self.harmonic_profile(pitch)["harmonics"]
+
+
+def extract_pitch_parselmouth(audio, sr):
+    return VoiceAnalysis(audio, sr).median_pitch()
 
 def extract_formants_parselmouth(audio, sr, max_formants=3):
-    try:
-        snd = parselmouth.Sound(audio, sampling_frequency=sr)
-        formant_obj = snd.to_formant_burg()
-        t = snd.get_total_duration() / 2
-        formants = []
-        for i in range(1, max_formants + 1):
-            freq = formant_obj.get_value_at_time(i, t)
-            bw = formant_obj.get_bandwidth_at_time(i, t)
-            if freq is None or np.isnan(freq):
-                freq = 0.0
-            if bw is None or np.isnan(bw):
-                bw = 0.0
-            formants.append({"freq": float(freq), "bw": float(bw)})
-        return formants
-    except Exception:
-        return [{"freq": 500, "bw": 50}, {"freq": 1500, "bw": 100}, {"freq": 2500, "bw": 150}]
+    return VoiceAnalysis(audio, sr).formants(max_formants)
 
 def extract_hnr_parselmouth(audio, sr):
-    try:
-        snd = parselmouth.Sound(audio, sampling_frequency=sr)
-        harmonicity = snd.to_harmonicity_cc()
-        hnr = harmonicity.get_mean()
-        return float(hnr) if hnr is not None else 0.0
-    except Exception:
-        return 0.0
+    return VoiceAnalysis(audio, sr).hnr()
 
 def extract_voice_quality_parselmouth(audio, sr):
-    try:
-        snd = parselmouth.Sound(audio, sampling_frequency=sr)
-        point_process = snd.to_point_process_cc()
-        jitter_local = parselmouth.praat.call(point_process, "Get jitter (local)", 0, 0, 0.0001, 0.02, 1.3)
-        shimmer_local = parselmouth.praat.call([snd, point_process], "Get shimmer (local)", 0, 0, 0.0001, 0.02, 1.3, 1.6)
-        return {
-            "jitter_local": float(jitter_local),
-            "shimmer_local": float(shimmer_local)
-        }
-    except Exception:
-        return {"jitter_local": 0.0, "shimmer_local": 0.0}
+    return VoiceAnalysis(audio, sr).voice_quality()
 
 def generate_voice_report_parselmouth(audio, sr):
+    return VoiceAnalysis(audio, sr).voice_report()
+
+def _parabolic_peak(spectrum_db, idx):
+    """Sub-bin offset and height of the parabola through a peak and its neighbours."""
+    a, b, c = spectrum_db[idx - 1], spectrum_db[idx], spectrum_db[idx + 1]
+    denom = a - 2 * b + c
+    offset = 0.5 * (a - c) / denom if denom < 0 else 0.0
+    return offset, b - 0.25 * (a - c) * offset
+
+
+def estimate_harmonics(audio, pitch, sr, n_harmonics=5, frame_size=2048):
+    """
+    Harmonic amplitudes from the known f0, without harmonic/percussive separation.
+
+    The Hann-windowed magnitude spectrum is averaged over ``frame_size``
+    frames (hop ``frame_size // 2``). Each harmonic is the largest peak
+    within +/- f0/4 of k * f0, refined with parabolic interpolation on the dB
+    spectrum. Amplitudes use the same scale as ``extract_harmonics``.
+
+    Returns a dict with ``harmonics`` (the list-of-dicts API form),
+    ``h1_h2`` (dB) and ``spectral_tilt`` (dB per octave across harmonics).
+    """
+    fallback = {"harmonics": default_harmonics(pitch), "h1_h2": 0.0, "spectral_tilt": 0.0}
     try:
-        snd = parselmouth.Sound(audio, sampling_frequency=sr)
-        point_process = snd.to_point_process_cc()
-        report = parselmouth.praat.call([snd, point_process], "Voice report", 0, 0, 75, 500, 1.3, 1.6, 0.03, 0.45)
-        return report
+        audio = np.asarray(audio, dtype=np.float64)
+        if pitch <= 0 or len(audio) == 0:
+            return fallback
+        hop = frame_size // 2
+        if len(audio) < frame_size:
+            audio = np.pad(audio, (0, frame_size - len(audio)))
+        n_frames = 1 + (len(audio) - frame_size) // hop
+        frames = np.lib.stride_tricks.sliding_window_view(audio, frame_size)[::hop][:n_frames]
+        nfft = 2 * frame_size
+        spectrum = np.abs(np.fft.rfft(frames * np.hanning(frame_size), nfft)).mean(axis=0)
+        spectrum_db = 20 * np.log10(np.maximum(spectrum, 1e-12))
+        bin_hz = sr / nfft
+        search = max(1, int(pitch / 4 / bin_hz))
+
+        harmonics = []
+        for k in range(1, n_harmonics + 1):
+            center = int(round(k * pitch / bin_hz))
+            lo, hi = max(1, center - search), min(len(spectrum) - 2, center + search)
+            if lo > hi:
+                break
+            idx = lo + int(np.argmax(spectrum_db[lo:hi + 1]))
+            offset, peak_db = _parabolic_peak(spectrum_db, idx)
+            harmonics.append({"freq": float((idx + offset) * bin_hz), "amp": float(10 ** (peak_db / 20)), "ratio": k})
+        if not harmonics:
+            return fallback
+
+        levels = 20 * np.log10([max(h["amp"], 1e-12) for h in harmonics])
+        h1_h2 = float(levels[0] - levels[1]) if len(levels) > 1 else 0.0
+        tilt = float(np.polyfit(np.log2([h["ratio"] for h in harmonics]), levels, 1)[0]) if len(levels) > 1 else 0.0
+        return {"harmonics": harmonics, "h1_h2": h1_h2, "spectral_tilt": tilt}
     except Exception:
-        return ""
+        return fallback
+
 
 def extract_harmonics(audio, pitch, sr):
+    """
+    Reference harmonic estimator (HPSS + STFT); see ``estimate_harmonics``.
+    """
     try:
         harmonic_audio = librosa.effects.harmonic(audio)
         stft = np.abs(librosa.stft(harmonic_audio, n_fft=2048, hop_length=1024))
@@ -98,8 +543,163 @@ def extract_harmonics(audio, pitch, sr):
                 harmonics.append({"freq": float(harmonic_freq), "amp": amp, "ratio": i + 1})
 
         if not harmonics:
-            harmonics = [{"freq": pitch * (i + 1), "amp": 1.0 / (i + 1), "ratio": i + 1} for i in range(5)]
+            harmonics = default_harmonics(pitch)
 
         return harmonics
     except Exception:
-        return [{"freq": pitch * (i + 1), "amp": 1.0 / (i + 1), "ratio": i + 1} for i in range(5)]
+        return default_harmonics(pitch)
+
+class PitchTracker:
+    """
+    Continuous aubio pitch tracking over a stream of samples.
+
+    The detector and its internal YIN state live as long as the tracker, so
+    consecutive frames are analyzed as one signal. Samples that don't fill a
+    whole hop are carried over to the next ``feed``. A loose YIN tolerance
+    (aubio's old 0.8 here) locks onto upper harmonics of voiced input.
+    """
+
+    def __init__(self, sample_rate, method="yin", buf_size=2048, hop_size=1024, tolerance=0.15):
+        from aubio import pitch as aubio_pitch
+
+        self.sample_rate = sample_rate
+        self.hop_size = hop_size
+        self.detector = aubio_pitch(method, buf_size, hop_size, sample_rate)
+        self.detector.set_tolerance(tolerance)
+        self._carry = np.zeros(0, dtype=np.float32)
+
+    def feed(self, samples):
+        """
+        Consume samples and return a (pitch, confidence) tuple per full hop.
+        """
+        samples = np.asarray(samples, dtype=np.float32)
+        if len(self._carry):
+            samples = np.concatenate([self._carry, samples])
+        estimates = []
+        hops = len(samples) // self.hop_size
+        for i in range(hops):
+            hop = samples[i * self.hop_size:(i + 1) * self.hop_size]
+            pitch = float(self.detector(hop)[0])
+            estimates.append((pitch, float(self.detector.get_confidence())))
+        self._carry = samples[hops * self.hop_size:].copy()
+        return estimates
+
+
+class VoiceActivityDetector:
+    """
+    Cheap energy + zero-crossing voice activity detector with an adaptive
+    noise floor, kept per session.
+
+    A window is active when its level is ``margin_db`` above the tracked
+    noise floor (and above ``min_db``) and its zero-crossing rate is low
+    enough to be voiced. The floor follows quiet windows slowly and drops
+    immediately to anything quieter. During speech it rises slowly towards
+    the quietest of the last ``floor_windows`` windows: speech keeps dipping
+    between syllables, but a noise that comes up and stays (a fan, mains
+    hum) is absorbed instead of passing as speech forever. After speech,
+    ``hangover`` windows stay active so word endings aren't clipped.
+    """
+
+    # Digital silence must not drag the floor to where any noise looks like speech
+    FLOOR_LIMIT_DB = -90.0
+
+    def __init__(self, margin_db=10.0, min_db=-55.0, max_zcr=0.25, adapt=0.05, hangover=2, floor_windows=40):
+        self.margin_db = margin_db
+        self.min_db = min_db
+        self.max_zcr = max_zcr
+        self.adapt = adapt
+        self.hangover = hangover
+        self.noise_floor = None
+        self._recent = deque(maxlen=floor_windows)
+        self._hold = 0
+        self.level_db = None
+
+    def update(self, window):
+        """
+        Classify one window, update the noise floor and return True if active.
+        """
+        window = np.asarray(window, dtype=np.float32)
+        if len(window) < 2:
+            return False
+        level = float(batch_volume_db(window)[0])
+        zcr = float(np.mean(np.signbit(window[1:]) != np.signbit(window[:-1])))
+        self.level_db = level
+        self._recent.append(level)
+        if self.noise_floor is None:
+            self.noise_floor = max(min(level, self.min_db), self.FLOOR_LIMIT_DB)
+
+        speech = level > self.min_db and level > self.noise_floor + self.margin_db and zcr < self.max_zcr
+        if speech:
+            self._hold = self.hangover
+            if len(self._recent) == self._recent.maxlen:
+                quietest = min(self._recent)
+                if quietest > self.noise_floor:
+                    self.noise_floor += self.adapt * (quietest - self.noise_floor)
+        else:
+            if level < self.noise_floor:
+                self.noise_floor = max(level, self.FLOOR_LIMIT_DB)
+            else:
+                self.noise_floor += self.adapt * (level - self.noise_floor)
+            if self._hold > 0:
+                self._hold -= 1
+                return True
+        return speech
+
+
+def most_confident(estimates):
+    """Pick the (pitch, confidence) estimate with the highest confidence."""
+    return max(estimates, key=lambda e: e[1], default=(0.0, 0.0))
+
+
+def analyze_chunk(audio, sr, pitch=None, confidence=0.0, formants=None):
+    """
+    Run the full per-chunk analysis chain and return the metrics as a dict.
+
+    ``pitch``/``confidence`` may come from a caller's own PitchTracker or the
+    batch engine; when omitted, aubio runs on the chunk itself. Precomputed
+    ``formants`` skip the Praat formant pass. Kept at module level (and free of
+    app state) so it can be shipped to the analysis engine's worker processes.
+    """
+    audio = np.asarray(audio, dtype=np.float32)
+    if pitch is None:
+        pitch, confidence = most_confident(PitchTracker(sr).feed(audio))
+
+    # One analysis context per chunk: every Praat object is built at most once
+    analysis = VoiceAnalysis(audio, sr)
+
+    if confidence > 0.9 and pitch > 20:
+        final_pitch = float(pitch)
+    else:
+        final_pitch = analysis.median_pitch()
+    profile = analysis.harmonic_profile(final_pitch)
+
+    return {
+        "pitch": final_pitch,
+        "hnr": analysis.hnr(),
+        "harmonics": profile["harmonics"],
+        "h1_h2": profile["h1_h2"],
+        "spectral_tilt": profile["spectral_tilt"],
+        "formants": formants if formants is not None else analysis.formants(),
+        "jitter_shimmer": analysis.voice_quality(),
+        "praat_report": analysis.voice_report()
+    }
+
+
+def analyze_segment(audio, sr):
+    """
+    Full-tier analysis of a longer stretch of session audio: Praat pitch,
+    HNR, jitter/shimmer, the voice report, formants and harmonics.
+    """
+    analysis = VoiceAnalysis(np.asarray(audio, dtype=np.float32), sr)
+    pitch = analysis.median_pitch()
+    profile = analysis.harmonic_profile(pitch)
+    return {
+        "pitch": pitch,
+        "hnr": analysis.hnr(),
+        "harmonics": profile["harmonics"],
+        "h1_h2": profile["h1_h2"],
+        "spectral_tilt": profile["spectral_tilt"],
+        "formants": analysis.formants(),
+        "jitter_shimmer": analysis.voice_quality(),
+        "praat_report": analysis.voice_report()
+    }
@@ -0,0 +1,350 @@
+import os
+import asyncio
+from datetime import timedelta
+from collections import OrderedDict, deque
+
+import numpy as np
+
+from vox.audio_processing import PitchTracker, StreamingResampler, VoiceActivityDetector, most_confident
+
+# Streams are decimated once, on arrival, to this rate before any DSP runs.
+# Pitch and formants need nothing above ~8 kHz.
+ANALYSIS_SAMPLE_RATE = int(os.environ.get("VOX_ANALYSIS_SAMPLE_RATE", "16000"))
+# Analysis schedule for streamed audio: every STREAM_HOP_MS a window of the
+# last STREAM_WINDOW_MS is analyzed. The ring buffer keeps STREAM_BUFFER_SECONDS.
+STREAM_WINDOW_MS = float(os.environ.get("VOX_STREAM_WINDOW_MS", "300"))
+STREAM_HOP_MS = float(os.environ.get("VOX_STREAM_HOP_MS", "150"))
+STREAM_BUFFER_SECONDS = float(os.environ.get("VOX_STREAM_BUFFER_SECONDS", "2"))
+# Full-tier analysis (voice report, jitter/shimmer, HNR) runs on the audio
+# accumulated over this many seconds, and once more on stop_recording.
+FULL_ANALYSIS_INTERVAL = float(os.environ.get("VOX_FULL_ANALYSIS_INTERVAL", "10"))
+# Voice activity gating: windows without voice skip analysis and storage
+VAD_ENABLED = os.environ.get("VOX_VAD_ENABLED", "true").lower() == "true"
+VAD_MARGIN_DB = float(os.environ.get("VOX_VAD_MARGIN_DB", "10"))
+VAD_MIN_DB = float(os.environ.get("VOX_VAD_MIN_DB", "-55"))
+# Per-session inbox between frame intake and analysis: when analysis falls
+# behind, INBOX_POLICY decides what happens to windows beyond INBOX_SIZE.
+INBOX_POLICY = os.environ.get("VOX_INBOX_POLICY", "latest_wins")
+INBOX_SIZE = int(os.environ.get("VOX_INBOX_SIZE", "4"))
+INBOX_COALESCE_MAX_MS = float(os.environ.get("VOX_INBOX_COALESCE_MAX_MS", "1000"))
+# Upper bound on live aubio detectors across all sessions
+PITCH_TRACKER_CACHE_SIZE = int(os.environ.get("VOX_PITCH_TRACKER_CACHE_SIZE", "512"))
+
+
+class AudioRingBuffer:
+    """
+    Fixed-size float32 ring buffer addressed by absolute sample index.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.total_written = 0
+        self._buffer = np.zeros(capacity, dtype=np.float32)
+
+    @property
+    def oldest(self):
+        """Absolute index of the oldest sample still held."""
+        return max(0, self.total_written - self.capacity)
+
+    def append(self, samples):
+        samples = np.asarray(samples, dtype=np.float32)
+        if len(samples) > self.capacity:
+            # Only the tail survives; account for the skipped head
+            self.total_written += len(samples) - self.capacity
+            samples = samples[-self.capacity:]
+        start = self.total_written % self.capacity
+        first = min(len(samples), self.capacity - start)
+        self._buffer[start:start + first] = samples[:first]
+        self._buffer[:len(samples) - first] = samples[first:]
+        self.total_written += len(samples)
+
+    def read(self, start, end):
+        """
+        Return a contiguous copy of samples [start, end) (absolute indices).
+        """
+        if start < self.oldest or end > self.total_written or start > end:
+            raise IndexError("Requested samples are not in the ring buffer")
+        idx = np.arange(start, end) % self.capacity
+        return self._buffer[idx]
+
+
+class AudioStream:
+    """
+    Per-session stream of sequenced audio frames.
+
+    Frames are appended to a ring buffer and ``push`` returns every analysis
+    window that became due, on a fixed hop/window schedule, so analysis runs
+    on continuous audio rather than on whatever each frame happened to hold.
+
+    With a ``pitch_tracker``, every accepted frame is also fed to it and each
+    window carries the most confident aubio estimate from inside it.
+
+    Accepted frames are also collected into the current full-tier segment,
+    which ``take_segment`` hands out and resets.
+
+    Each stream has its own voice activity detector (unless disabled); the
+    caller counts voiced windows per segment in ``segment_voiced_windows``.
+
+    Frames arrive at the client's ``input_rate`` and are decimated to
+    ``analysis_rate`` before anything else sees them; ``sample_rate`` is the
+    rate of everything the stream hands out.
+
+    A frame's ``timestamp`` marks the time of its last sample; windows and
+    segments are stamped from their sample offset to it, so no two of them
+    share a timestamp.
+    """
+
+    def __init__(self, input_rate, analysis_rate=ANALYSIS_SAMPLE_RATE, window_ms=STREAM_WINDOW_MS,
+                 hop_ms=STREAM_HOP_MS, buffer_seconds=STREAM_BUFFER_SECONDS, pitch_tracker=None,
+                 collect_segments=True, vad=VAD_ENABLED):
+        self.input_rate = input_rate
+        self.sample_rate = min(input_rate, analysis_rate)
+        self.resampler = StreamingResampler(input_rate, self.sample_rate) if input_rate != self.sample_rate else None
+        sample_rate = self.sample_rate
+        self.window_size = int(sample_rate * window_ms / 1000)
+        self.hop_size = max(1, int(sample_rate * hop_ms / 1000))
+        capacity = max(int(sample_rate * buffer_seconds), self.window_size + self.hop_size)
+        self.buffer = AudioRingBuffer(capacity)
+        self.last_seq = None
+        self.missing_frames = 0
+        self.stale_frames = 0
+        self._next_window_end = self.window_size
+        self.pitch_tracker = pitch_tracker
+        # (absolute end sample, pitch, confidence) of recent tracker hops
+        self._pitch_estimates = deque()
+        self._tracked = 0
+        self.collect_segments = collect_segments
+        self._segment = []
+        self.segment_samples = 0
+        self.segment_voiced_windows = 0
+        self.vad = VoiceActivityDetector(margin_db=VAD_MARGIN_DB, min_db=VAD_MIN_DB) if vad else None
+        # Serializes frames while their DSP runs in a worker thread
+        self.lock = asyncio.Lock()
+        self.inbox = SessionInbox(max_coalesced=int(sample_rate * INBOX_COALESCE_MAX_MS / 1000))
+        # (timestamp, absolute sample index) of the end of the latest frame
+        self._clock = None
+        self.last_full_result = None
+
+    def push(self, audio, seq=None, timestamp=None):
+        """
+        Append a frame and return the analysis windows now due, as a list of
+        dicts with the window ``audio``, its absolute ``end`` sample, the
+        ``timestamp`` of that sample (None until a frame had one) and the
+        tracker's ``pitch``/``confidence`` (pitch is None without a tracker).
+
+        Runs the three stages below in one go; the socket handler runs
+        ``process`` off the event loop instead.
+        """
+        if not self.accept(seq):
+            return []
+        return self.append(self.process(audio), timestamp)
+
+    def accept(self, seq):
+        """
+        Check a frame's sequence number; False for a duplicate or reordered
+        frame, which would corrupt the timeline.
+        """
+        if seq is not None and self.last_seq is not None:
+            if seq <= self.last_seq:
+                self.stale_frames += 1
+                return False
+            self.missing_frames += seq - self.last_seq - 1
+        if seq is not None:
+            self.last_seq = seq
+        return True
+
+    def process(self, audio):
+        """
+        The CPU-bound part of a frame: decimate it to ``sample_rate`` and feed
+        the pitch tracker. Returns the decimated audio for ``append``. Frames
+        must go through in order, one at a time.
+        """
+        if self.resampler is not None:
+            audio = self.resampler.process(audio)
+        if self.pitch_tracker is not None:
+            self._track_pitch(audio)
+        return audio
+
+    def append(self, audio, timestamp=None):
+        """
+        Add a processed frame to the ring buffer and the current segment and
+        cut the windows now due.
+        """
+        self.buffer.append(audio)
+        if timestamp is not None:
+            self._clock = (timestamp, self.buffer.total_written)
+        if self.collect_segments:
+            self._segment.append(np.asarray(audio, dtype=np.float32))
+            self.segment_samples += len(audio)
+
+        windows = []
+        # Skip windows whose samples have already been overwritten
+        earliest_end = self.buffer.oldest + self.window_size
+        if self._next_window_end < earliest_end:
+            hops = -(-(earliest_end - self._next_window_end) // self.hop_size)
+            self._next_window_end += hops * self.hop_size
+        while self._next_window_end <= self.buffer.total_written:
+            end = self._next_window_end
+            pitch, confidence = self._window_pitch(end)
+            windows.append({
+                "audio": self.buffer.read(end - self.window_size, end),
+                "end": end,
+                "timestamp": self.time_at(end),
+                "pitch": pitch,
+                "confidence": confidence
+            })
+            self._next_window_end += self.hop_size
+        return windows
+
+    def time_at(self, sample):
+        """Timestamp of absolute sample index ``sample``, or None before the first timestamped frame."""
+        if self._clock is None:
+            return None
+        timestamp, clock_sample = self._clock
+        return timestamp - timedelta(seconds=(clock_sample - sample) / self.sample_rate)
+
+    @property
+    def segment_start_time(self):
+        """Timestamp of the first sample of the current segment."""
+        return self.time_at(self.buffer.total_written - self.segment_samples)
+
+    @property
+    def segment_seconds(self):
+        return self.segment_samples / self.sample_rate
+
+    def take_segment(self):
+        """
+        Return the audio accumulated since the last call and start a new segment.
+        """
+        segment = np.concatenate(self._segment) if self._segment else np.zeros(0, dtype=np.float32)
+        self._segment = []
+        self.segment_samples = 0
+        self.segment_voiced_windows = 0
+        return segment
+
+    def is_voiced(self, window):
+        """
+        Run the stream's VAD on a window (always True without one).
+        """
+        return self.vad is None or self.vad.update(window)
+
+    def voiced(self, windows):
+        """``is_voiced`` for each of ``windows``, in order."""
+        return [self.is_voiced(window["audio"]) for window in windows]
+
+    def _track_pitch(self, audio):
+        hop_size = self.pitch_tracker.hop_size
+        for pitch, confidence in self.pitch_tracker.feed(audio):
+            self._tracked += hop_size
+            self._pitch_estimates.append((self._tracked, pitch, confidence))
+        # Estimates older than one window can no longer be used
+        while self._pitch_estimates and self._pitch_estimates[0][0] <= self._tracked - self.window_size - self.hop_size:
+            self._pitch_estimates.popleft()
+
+    def _window_pitch(self, end):
+        if self.pitch_tracker is None:
+            return None, 0.0
+        start = end - self.window_size
+        return most_confident([(p, c) for hop_end, p, c in self._pitch_estimates if start < hop_end <= end])
+
+
+class SessionInbox:
+    """
+    Bounded queue of analysis windows waiting for one session's worker.
+
+    Policies when a window arrives and the inbox is full:
+
+    * ``drop_oldest``: discard the oldest queued window.
+    * ``latest_wins``: never queue more than one window; a new one replaces
+      whatever is still waiting, whatever ``max_size`` is.
+    * ``coalesce``: merge the queued windows and the new one into a single
+      longer window over the same audio (at most ``max_coalesced`` samples,
+      keeping the newest).
+
+    ``put`` returns the number of windows dropped; running totals are kept
+    in ``dropped`` and ``coalesced``.
+    """
+
+    POLICIES = ("drop_oldest", "latest_wins", "coalesce")
+
+    def __init__(self, max_size=INBOX_SIZE, policy=INBOX_POLICY, max_coalesced=None):
+        if policy not in self.POLICIES:
+            raise ValueError(f"Unknown inbox policy: {policy}")
+        self.max_size = max(1, max_size)
+        self.policy = policy
+        self.max_coalesced = max_coalesced
+        self.dropped = 0
+        self.coalesced = 0
+        self._items = deque()
+
+    def put(self, item):
+        dropped = 0
+        if self.policy == "latest_wins":
+            dropped = len(self._items)
+            self._items.clear()
+        elif len(self._items) >= self.max_size:
+            if self.policy == "coalesce":
+                while self._items:
+                    item = self._merge(self._items.pop(), item)
+            else:
+                self._items.popleft()
+                dropped = 1
+        self._items.append(item)
+        self.dropped += dropped
+        return dropped
+
+    def get(self):
+        return self._items.popleft()
+
+    def clear(self):
+        self._items.clear()
+
+    def __len__(self):
+        return len(self._items)
+
+    def _merge(self, older, newer):
+        # Windows overlap on a fixed schedule: append only the audio that
+        # ``newer`` adds past the end of ``older``.
+        new_samples = newer["end"] - older["end"]
+        if new_samples <= 0 or new_samples > len(newer["audio"]):
+            # Not contiguous (a VAD gap): keep the newer window alone
+            self.dropped += 1
+            return newer
+        audio = np.concatenate([older["audio"], newer["audio"][-new_samples:]])
+        if self.max_coalesced and len(audio) > self.max_coalesced:
+            audio = audio[-self.max_coalesced:]
+        self.coalesced += 1
+        better = newer if newer["confidence"] >= older["confidence"] else older
+        return dict(newer, audio=audio, pitch=better["pitch"], confidence=better["confidence"])
+
+
+class PitchTrackerCache:
+    """
+    LRU-bounded cache of per-session pitch trackers.
+
+    Trackers are keyed by (sid, method, buffer size, hop, sample rate) so a
+    session keeps its detector, and its YIN state, across frames. Sessions
+    are evicted explicitly on stop/disconnect; the LRU cap bounds the rest.
+    """
+
+    def __init__(self, max_size=PITCH_TRACKER_CACHE_SIZE):
+        self.max_size = max_size
+        self._trackers = OrderedDict()
+
+    def get(self, sid, sample_rate, method="yin", buf_size=2048, hop_size=1024):
+        key = (sid, method, buf_size, hop_size, sample_rate)
+        tracker = self._trackers.get(key)
+        if tracker is None:
+            tracker = self._trackers[key] = PitchTracker(sample_rate, method, buf_size, hop_size)
+            while len(self._trackers) > self.max_size:
+                self._trackers.popitem(last=False)
+        else:
+            self._trackers.move_to_end(key)
+        return tracker
+
+    def evict(self, sid):
+        for key in [key for key in self._trackers if key[0] == sid]:
+            del self._trackers[key]
+
+    def __len__(self):
+        return len(self._trackers)
@@ -0,0 +1,65 @@
+import struct
+
+import numpy as np
+
+# Binary raw_audio frame: a 12-byte little-endian header followed by mono PCM.
+#   u8  version      (AUDIO_FRAME_VERSION)
+#   u8  sample format (FORMAT_FLOAT32 or FORMAT_INT16)
+#   u16 reserved
+#   u32 sample rate in Hz
+#   u32 sequence number
+AUDIO_FRAME_HEADER = struct.Struct("<BBHII")
+AUDIO_FRAME_VERSION = 1
+FORMAT_FLOAT32 = 1
+FORMAT_INT16 = 2
+
+DEFAULT_SAMPLE_RATE = 44100
+MIN_SAMPLE_RATE = 8000
+MAX_SAMPLE_RATE = 192000
+
+
+def check_sample_rate(sample_rate):
+    """Return ``sample_rate`` as an int, or raise ValueError outside MIN/MAX_SAMPLE_RATE."""
+    sample_rate = int(sample_rate)
+    if not MIN_SAMPLE_RATE <= sample_rate <= MAX_SAMPLE_RATE:
+        raise ValueError(
+            f"Unsupported sample rate: {sample_rate} (expected {MIN_SAMPLE_RATE}-{MAX_SAMPLE_RATE} Hz)"
+        )
+    return sample_rate
+
+
+def decode_audio_frame(frame):
+    """
+    Decode a binary audio frame into (audio, sample_rate, seq).
+
+    Float32 payloads are returned as a read-only view over the received
+    bytes, without copying. Int16 payloads are scaled to float32 in [-1, 1).
+    """
+    if len(frame) < AUDIO_FRAME_HEADER.size:
+        raise ValueError("Audio frame is shorter than its header")
+    version, sample_format, _, sample_rate, seq = AUDIO_FRAME_HEADER.unpack_from(frame)
+    if version != AUDIO_FRAME_VERSION:
+        raise ValueError(f"Unsupported audio frame version: {version}")
+
+    if sample_format == FORMAT_FLOAT32:
+        audio = np.frombuffer(frame, dtype="<f4", offset=AUDIO_FRAME_HEADER.size)
+    elif sample_format == FORMAT_INT16:
+        pcm = np.frombuffer(frame, dtype="<i2", offset=AUDIO_FRAME_HEADER.size)
+        audio = pcm.astype(np.float32) / 32768.0
+    else:
+        raise ValueError(f"Unsupported audio sample format: {sample_format}")
+    return audio, check_sample_rate(sample_rate), seq
+
+
+def decode_raw_audio(data):
+    """
+    Decode a raw_audio event payload into (audio, sample_rate, seq).
+
+    Accepts the binary frame sent by current clients and the JSON list of
+    floats sent by older ones.
+    """
+    payload = data['audio']
+    if isinstance(payload, (bytes, bytearray, memoryview)):
+        return decode_audio_frame(payload)
+    audio = np.array(payload, dtype=np.float32)
+    return audio, check_sample_rate(data.get('sample_rate') or DEFAULT_SAMPLE_RATE), data.get('seq')
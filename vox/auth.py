@@ -8,6 +8,16 @@ import asyncio
 
 from vox.limiter import limiter
 
+from vox.repository import (
+    apply_password_reset,
+    create_email_user,
+    fetch_password_reset,
+    fetch_user_by_discord_id,
+    fetch_user_by_email,
+    save_password_reset,
+    verify_email_token,
+)
+
 from email_utils import send_verification_email, send_password_reset_email
 
 __all__ = ["router"]
@@ -32,7 +42,7 @@ async def register(request: Request, db_pool=Depends(get_db_pool)):
         )
 
     async with db_pool.acquire() as conn:
-        existing = await conn.fetchrow("SELECT * FROM users WHERE email = $1", email)
+        existing = await fetch_user_by_email(conn, email)
         if existing:
             return JSONResponse(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -44,11 +54,7 @@ async def register(request: Request, db_pool=Depends(get_db_pool)):
         token = secrets.token_urlsafe(32)
         expires = datetime.utcnow() + timedelta(hours=24)
 
-        await conn.execute(
-            "INSERT INTO users (email, password_hash, user_name, user_pronouns, verification_token, verification_token_expires) "
-            "VALUES ($1, $2, $3, $4, $5, $6)",
-            email, password_hash, user_name, user_pronouns, token, expires
-        )
+        await create_email_user(conn, email, password_hash, user_name, user_pronouns, token, expires)
 
     send_verification_email(email, token)
     return JSONResponse(
@@ -66,18 +72,11 @@ async def verify_email(request: Request, db_pool=Depends(get_db_pool)):
         )
 
     async with db_pool.acquire() as conn:
-        user = await conn.fetchrow(
-            "SELECT * FROM users WHERE verification_token = $1 AND verification_token_expires > now()", token
-        )
-        if not user:
-            return JSONResponse(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                content={'status': 'error', 'message': 'Invalid or expired token'}
-            )
-
-        await conn.execute(
-            "UPDATE users SET email_verified = TRUE, verification_token = NULL, verification_token_expires = NULL WHERE user_id = $1",
-            user['user_id']
+        user_id = await verify_email_token(conn, token)
+    if not user_id:
+        return JSONResponse(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            content={'status': 'error', 'message': 'Invalid or expired token'}
         )
 
     return JSONResponse(
@@ -101,7 +100,7 @@ async def login(request: Request, db_pool=Depends(get_db_pool)):
         )
 
     async with db_pool.acquire() as conn:
-        user = await conn.fetchrow("SELECT * FROM users WHERE email = $1", email)
+        user = await fetch_user_by_email(conn, email)
         if not user:
             return JSONResponse(
                 status_code=status.HTTP_401_UNAUTHORIZED,
@@ -141,7 +140,7 @@ async def request_password_reset(request: Request, db_pool=Depends(get_db_pool))
         )
 
     async with db_pool.acquire() as conn:
-        user = await conn.fetchrow("SELECT * FROM users WHERE email = $1", email)
+        user = await fetch_user_by_email(conn, email)
         if not user:
             return JSONResponse(
                 status_code=status.HTTP_200_OK,
@@ -151,11 +150,7 @@ async def request_password_reset(request: Request, db_pool=Depends(get_db_pool))
         token = secrets.token_urlsafe(32)
         expires = datetime.utcnow() + timedelta(hours=1)
 
-        await conn.execute(
-            "INSERT INTO password_resets (email, token, expires_at) VALUES ($1, $2, $3) "
-            "ON CONFLICT (token) DO UPDATE SET expires_at = $3",
-            email, token, expires
-        )
+        await save_password_reset(conn, email, token, expires)
 
     send_password_reset_email(email, token)
     return JSONResponse(
@@ -176,17 +171,14 @@ async def reset_password(request: Request, db_pool=Depends(get_db_pool)):
         )
 
     async with db_pool.acquire() as conn:
-        reset = await conn.fetchrow(
-            "SELECT * FROM password_resets WHERE token = $1 AND expires_at > now()", token
-        )
+        reset = await fetch_password_reset(conn, token)
         if not reset:
             return JSONResponse(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 content={'status': 'error', 'message': 'Invalid or expired token'}
             )
 
-        user = await conn.fetchrow("SELECT * FROM users WHERE email = $1", reset['email'])
-        if not user:
+        if not reset['user_id']:
             return JSONResponse(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 content={'status': 'error', 'message': 'User not found'}
@@ -194,11 +186,7 @@ async def reset_password(request: Request, db_pool=Depends(get_db_pool)):
 
         password_hash = await asyncio.to_thread(lambda: __import__('bcrypt').hashpw(new_password.encode(), __import__('bcrypt').gensalt()).decode())
 
-        await conn.execute(
-            "UPDATE users SET password_hash = $1 WHERE email = $2",
-            password_hash, reset['email']
-        )
-        await conn.execute("DELETE FROM password_resets WHERE token = $1", token)
+        await apply_password_reset(conn, token, reset['email'], password_hash)
 
     return JSONResponse(
         status_code=status.HTTP_200_OK,
@@ -268,7 +256,7 @@ async def discord_callback(request: Request, db_pool=Depends(get_db_pool)):
 
     session = request.session
     async with db_pool.acquire() as conn:
-        user = await conn.fetchrow("SELECT * FROM users WHERE discord_id = $1", discord_id)
+        user = await fetch_user_by_discord_id(conn, discord_id)
         # No longer update session_id in users table; session-user link is managed in sessions table
 
     return JSONResponse(
@@ -2,6 +2,7 @@ from fastapi import APIRouter, Request, Depends
 from fastapi.responses import JSONResponse
 from vox.user import get_session_id
 from vox.limiter import limiter
+from vox.identity import get_user_profile, user_name_and_pronouns
 from fastapi import status
 
 router = APIRouter()
@@ -25,17 +26,8 @@ async def chat(request: Request, sid: str = Depends(get_session_id), db_pool=Dep
                 content={"status": "error", "message": "Empty message"}
             )
 
-        async with db_pool.acquire() as conn:
-            # Look up user via sessions table
-            session_row = await conn.fetchrow("SELECT user_id FROM sessions WHERE session_id = $1", sid)
-            user = None
-            if session_row and session_row["user_id"]:
-                user = await conn.fetchrow(
-                    "SELECT user_name, user_pronouns FROM users WHERE user_id = $1",
-                    session_row["user_id"]
-                )
-        user_name = user['user_name'] if user and user['user_name'] else 'friend'
-        user_pronouns = user['user_pronouns'] if user and user['user_pronouns'] else 'they/them/theirs/themselves'
+        user = await get_user_profile(db_pool, request.app.state.identity_cache, sid)
+        user_name, user_pronouns = user_name_and_pronouns(user)
 
         from vox.utils import LLM_PERSONALITY_PROMPT_BASE
         from vox.llm import chat_with_llm
@@ -0,0 +1,217 @@
+import json
+import math
+
+# vocal_data stores each row's full-tier metrics in typed columns instead of
+# JSONB and report text:
+#   f1..f3, f1_bw..f3_bw   formant frequencies and bandwidths (real)
+#   harmonic_amps          H1..H5 amplitudes (real[]; frequencies are
+#                          multiples of the pitch)
+#   jitter, shimmer        local jitter and shimmer as fractions (real)
+#   voice_report           the Praat voice report's numbers (real[], in
+#                          VOICE_REPORT_FIELDS order, NULL where undefined)
+# Rows written before the change keep the old JSONB/text columns until
+# migrate_compact_vocal_data.py converts them; decode_metrics reads both.
+
+COMPACT_COLUMNS = ("f1", "f2", "f3", "f1_bw", "f2_bw", "f3_bw", "harmonic_amps", "jitter", "shimmer", "voice_report")
+LEGACY_COLUMNS = ("harmonics", "formants", "jitter_shimmer", "praat_report")
+
+N_FORMANTS = 3
+N_HARMONICS = 5
+
+# (field, label in Praat's "Voice report", unit). Percentages are stored as
+# fractions. Append only: stored arrays are positional.
+VOICE_REPORT_FIELDS = (
+    ("median_pitch", "Median pitch", "Hz"),
+    ("mean_pitch", "Mean pitch", "Hz"),
+    ("pitch_sd", "Standard deviation", "Hz"),
+    ("min_pitch", "Minimum pitch", "Hz"),
+    ("max_pitch", "Maximum pitch", "Hz"),
+    ("pulses", "Number of pulses", ""),
+    ("periods", "Number of periods", ""),
+    ("mean_period", "Mean period", "seconds"),
+    ("period_sd", "Standard deviation of period", "seconds"),
+    ("unvoiced_fraction", "Fraction of locally unvoiced frames", "%"),
+    ("voice_breaks", "Number of voice breaks", ""),
+    ("voice_break_degree", "Degree of voice breaks", "%"),
+    ("jitter_local", "Jitter (local)", "%"),
+    ("jitter_local_abs", "Jitter (local, absolute)", "seconds"),
+    ("jitter_rap", "Jitter (rap)", "%"),
+    ("jitter_ppq5", "Jitter (ppq5)", "%"),
+    ("jitter_ddp", "Jitter (ddp)", "%"),
+    ("shimmer_local", "Shimmer (local)", "%"),
+    ("shimmer_local_db", "Shimmer (local, dB)", "dB"),
+    ("shimmer_apq3", "Shimmer (apq3)", "%"),
+    ("shimmer_apq5", "Shimmer (apq5)", "%"),
+    ("shimmer_apq11", "Shimmer (apq11)", "%"),
+    ("shimmer_dda", "Shimmer (dda)", "%"),
+    ("mean_autocorrelation", "Mean autocorrelation", ""),
+    ("mean_nhr", "Mean noise-to-harmonics ratio", ""),
+    ("mean_hnr", "Mean harmonics-to-noise ratio", "dB"),
+)
+
+_REPORT_INDEX = {label: i for i, (_, label, _) in enumerate(VOICE_REPORT_FIELDS)}
+
+
+def _decoded(value):
+    if isinstance(value, str):
+        try:
+            return json.loads(value)
+        except ValueError:
+            return None
+    return value
+
+
+def _finite(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if math.isfinite(value) else None
+
+
+def parse_voice_report(text):
+    """
+    The numbers of a Praat voice report in VOICE_REPORT_FIELDS order (None
+    for --undefined-- or missing lines), or None if nothing was recognized.
+    """
+    if not text:
+        return None
+    values = [None] * len(VOICE_REPORT_FIELDS)
+    found = False
+    for line in text.splitlines():
+        label, sep, rest = line.strip().partition(":")
+        i = _REPORT_INDEX.get(label)
+        if not sep or i is None or values[i] is not None or not rest.split():
+            continue
+        token = rest.split()[0]
+        value = _finite(token.rstrip("%"))
+        if value is not None and token.endswith("%"):
+            value /= 100
+        values[i] = value
+        found = True
+    return values if found else None
+
+
+def voice_report_dict(values):
+    if values is None:
+        return None
+    return {name: value for (name, _, _), value in zip(VOICE_REPORT_FIELDS, values)}
+
+
+def format_voice_report(values):
+    """
+    Praat-style report text rebuilt from stored values, for readers of the
+    old praat_report field.
+    """
+    if values is None:
+        return None
+    lines = []
+    for (_, label, unit), value in zip(VOICE_REPORT_FIELDS, values):
+        if value is None:
+            text = "--undefined--"
+        elif unit == "%":
+            text = f"{value * 100:.3f}%"
+        elif unit == "seconds":
+            text = f"{value:.6E} seconds"
+        elif unit:
+            text = f"{value:.3f} {unit}"
+        else:
+            text = f"{value:g}"
+        lines.append(f"   {label}: {text}")
+    return "\n".join(lines)
+
+
+def compact_metrics(harmonics, formants, jitter_shimmer, praat_report):
+    """
+    Analysis output (API form: lists of dicts, dict, report text) as values
+    for COMPACT_COLUMNS.
+    """
+    freqs = [None] * N_FORMANTS
+    bws = [None] * N_FORMANTS
+    formants = _decoded(formants)
+    if isinstance(formants, list):
+        for i, formant in enumerate(formants[:N_FORMANTS]):
+            if isinstance(formant, dict):
+                freqs[i] = _finite(formant.get("freq"))
+                bws[i] = _finite(formant.get("bw"))
+    elif isinstance(formants, dict):
+        # {"F1": hz, ...} as written by generate_transition_data.py before
+        for i in range(N_FORMANTS):
+            freqs[i] = _finite(formants.get(f"F{i + 1}"))
+
+    amps = None
+    harmonics = _decoded(harmonics)
+    if isinstance(harmonics, list) and harmonics:
+        amps = [_finite(h.get("amp")) if isinstance(h, dict) else None for h in harmonics[:N_HARMONICS]]
+
+    jitter = shimmer = None
+    jitter_shimmer = _decoded(jitter_shimmer)
+    if isinstance(jitter_shimmer, dict):
+        jitter = _finite(jitter_shimmer.get("jitter_local"))
+        shimmer = _finite(jitter_shimmer.get("shimmer_local"))
+        # {"jitter": percent, "shimmer": percent} from generate_transition_data.py
+        if jitter is None and _finite(jitter_shimmer.get("jitter")) is not None:
+            jitter = _finite(jitter_shimmer["jitter"]) / 100
+        if shimmer is None and _finite(jitter_shimmer.get("shimmer")) is not None:
+            shimmer = _finite(jitter_shimmer["shimmer"]) / 100
+
+    return (*freqs, *bws, amps, jitter, shimmer, parse_voice_report(praat_report))
+
+
+def decode_metrics(row):
+    """
+    harmonics, formants, jitter_shimmer, voice_report and praat_report (API
+    form) from a vocal_data row with the compact columns, falling back to
+    the legacy JSONB/text columns for rows not yet migrated. Missing columns
+    count as NULL, so any projection can be decoded.
+    """
+    get = row.get
+
+    formants = None
+    if any(get(f"f{i + 1}") is not None for i in range(N_FORMANTS)):
+        formants = [
+            {"freq": get(f"f{i + 1}"), "bw": get(f"f{i + 1}_bw")}
+            for i in range(N_FORMANTS)
+        ]
+    elif get("formants") is not None:
+        formants = _decoded(get("formants"))
+
+    harmonics = None
+    if get("harmonic_amps") is not None:
+        pitch = get("pitch") or 0.0
+        harmonics = [
+            {"freq": pitch * (i + 1), "amp": amp or 0.0, "ratio": i + 1}
+            for i, amp in enumerate(get("harmonic_amps"))
+        ]
+    elif get("harmonics") is not None:
+        harmonics = _decoded(get("harmonics"))
+
+    jitter_shimmer = None
+    if get("jitter") is not None or get("shimmer") is not None:
+        jitter_shimmer = {"jitter_local": get("jitter") or 0.0, "shimmer_local": get("shimmer") or 0.0}
+    elif get("jitter_shimmer") is not None:
+        jitter_shimmer = _decoded(get("jitter_shimmer"))
+
+    voice_report = get("voice_report")
+    praat_report = get("praat_report")
+    if voice_report is None:
+        voice_report = parse_voice_report(praat_report)
+    elif praat_report is None:
+        praat_report = format_voice_report(voice_report)
+    return {
+        "harmonics": harmonics,
+        "formants": formants,
+        "jitter_shimmer": jitter_shimmer,
+        "voice_report": voice_report_dict(voice_report),
+        "praat_report": praat_report,
+    }
+
+
+def real_array_literal(values):
+    """
+    A real[] value as Postgres array text, for passing arrays of arrays
+    through unnest() (which would flatten a 2-D array parameter).
+    """
+    if values is None:
+        return None
+    return "{" + ",".join("NULL" if v is None else repr(float(v)) for v in values) + "}"
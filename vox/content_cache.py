@@ -0,0 +1,220 @@
+import os
+import copy
+import json
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Bump when analysis or transform output changes for the same input, so
+# cached results from the old code are never served.
+ANALYSIS_VERSION = "1"
+TRANSFORM_VERSION = "1"
+
+CACHE_DIR = os.environ.get("VOX_CACHE_DIR", "cache")
+CACHE_MEMORY_ITEMS = int(os.environ.get("VOX_CACHE_MEMORY_ITEMS", "256"))
+CACHE_MAX_MB = float(os.environ.get("VOX_CACHE_MAX_MB", "512"))
+
+_HASH_BLOCK = 1 << 20
+
+
+def file_hash(path):
+    """
+    Content hash of a file, read in 1 MiB blocks.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def cache_key(content_hash, **params):
+    """
+    Key for a result derived from some content with the given parameters.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(content_hash.encode())
+    h.update(json.dumps(params, sort_keys=True).encode())
+    return h.hexdigest()
+
+
+class ContentCache:
+    """
+    Two-tier content-addressed cache: an in-memory LRU of Python values in
+    front of a directory of files evicted oldest-first once it exceeds
+    ``max_bytes``. Values must be JSON-serializable and are stored as JSON
+    (never pickle: the directory may be shared); ``get`` returns a copy, so
+    callers may modify it. ``get_file``/``put_file`` store files (e.g.
+    transformed audio) as they are.
+
+    Several processes may share a directory: each keeps its own index, and a
+    file evicted by another process is simply a miss.
+    """
+
+    def __init__(self, directory=CACHE_DIR, memory_items=CACHE_MEMORY_ITEMS, max_bytes=int(CACHE_MAX_MB * 1024 * 1024)):
+        self.directory = directory
+        self.memory_items = memory_items
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._index = None  # file name -> size, oldest first
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """
+        Build a cache from VOX_CACHE_* environment variables; an empty
+        VOX_CACHE_DIR keeps the memory tier only.
+        """
+        return cls(directory=CACHE_DIR or None)
+
+    def get(self, key):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(self._memory[key])
+            if not self.directory:
+                self.misses += 1
+                return None
+        path = self._disk_path(key)
+        try:
+            with open(path, "rb") as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        self._touch(key, path)
+        with self._lock:
+            self.disk_hits += 1
+            self._remember(key, copy.deepcopy(value))
+        return value
+
+    def put(self, key, value):
+        data = json.dumps(value).encode()
+        with self._lock:
+            self._remember(key, json.loads(data))
+        if self.directory:
+            self._write(key, lambda f: f.write(data))
+
+    def get_file(self, key, output_path):
+        """
+        Copy a cached file to ``output_path``; returns False on a miss.
+        """
+        if not self.directory:
+            with self._lock:
+                self.misses += 1
+            return False
+        path = self._disk_path(key, ".bin")
+        try:
+            shutil.copyfile(path, output_path)
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return False
+        self._touch(key, path)
+        with self._lock:
+            self.disk_hits += 1
+        return True
+
+    def put_file(self, key, source_path):
+        if self.directory:
+            with open(source_path, "rb") as src:
+                self._write(key, lambda f: shutil.copyfileobj(src, f), ".bin")
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "memory_items": len(self._memory),
+                "disk_bytes": self._disk_bytes
+            }
+
+    def _remember(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _disk_path(self, key, suffix=".json"):
+        return os.path.join(self.directory, key[:2], key + suffix)
+
+    def _load_index(self):
+        # Oldest first, by mtime (refreshed on every hit)
+        entries = []
+        if os.path.isdir(self.directory):
+            for shard in os.scandir(self.directory):
+                if shard.is_dir():
+                    for entry in os.scandir(shard.path):
+                        # Leftovers of interrupted writes are not cache entries
+                        if entry.name.endswith(".tmp") or not entry.is_file():
+                            continue
+                        stat = entry.stat()
+                        entries.append((stat.st_mtime, entry.name, stat.st_size))
+        self._index = OrderedDict((name, size) for _, name, size in sorted(entries))
+        self._disk_bytes = sum(self._index.values())
+
+    def _write(self, key, write, suffix=".json"):
+        path = self._disk_path(key, suffix)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write beside the target and rename, so readers never see a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+            os.replace(tmp_path, path)
+            size = os.path.getsize(path)
+        except OSError as e:
+            logger.warning(f"Content cache write failed for {key}: {e}")
+            return
+        with self._lock:
+            if self._index is None:
+                self._load_index()
+            name = os.path.basename(path)
+            self._disk_bytes += size - self._index.pop(name, 0)
+            self._index[name] = size
+            self._evict()
+
+    def _touch(self, key, path):
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            name = os.path.basename(path)
+            if self._index is not None and name in self._index:
+                self._index.move_to_end(name)
+
+    def _evict(self):
+        while self._disk_bytes > self.max_bytes and len(self._index) > 1:
+            name, size = self._index.popitem(last=False)
+            self._disk_bytes -= size
+            try:
+                os.remove(os.path.join(self.directory, name[:2], name))
+            except OSError:
+                pass
+
+
+def cached_transform(cache, input_path, output_path, target_gender):
+    """
+    ``transform_audio_to_gender`` through the cache, keyed by the input
+    file's content, the target gender and TRANSFORM_VERSION.
+    """
+    from gender_transform import transform_audio_to_gender
+
+    key = cache_key(file_hash(input_path), target_gender=target_gender.lower(), version=TRANSFORM_VERSION)
+    if cache.get_file(key, output_path):
+        return
+    transform_audio_to_gender(input_path, output_path, target_gender)
+    cache.put_file(key, output_path)
@@ -1,8 +1,22 @@
+import os
 import json
-from datetime import datetime, timedelta
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from vox.compact_metrics import COMPACT_COLUMNS, compact_metrics
+from vox.rollups import apply_rollups
 
 # --- Persistent Session Management ---
 
+# Statements are constants, like vox/repository.py's: the memory storage
+# backend (vox/memory_store.py) keys on their text
+CREATE_SESSION_SQL = "INSERT INTO sessions (session_id, user_id, created_at, expires_at, data) VALUES ($1, $2, now(), $3, $4)"
+GET_SESSION_SQL = "SELECT * FROM sessions WHERE session_id = $1"
+UPDATE_SESSION_DATA_EXPIRY_SQL = "UPDATE sessions SET data = $1, expires_at = $2 WHERE session_id = $3"
+UPDATE_SESSION_DATA_SQL = "UPDATE sessions SET data = $1 WHERE session_id = $2"
+UPDATE_SESSION_EXPIRY_SQL = "UPDATE sessions SET expires_at = $1 WHERE session_id = $2"
+DELETE_SESSION_SQL = "DELETE FROM sessions WHERE session_id = $1"
+
 async def create_session(db_pool, session_id, user_id=None, expires_days=30, data=None):
     """
     Create a new session in the database.
@@ -10,7 +24,7 @@ async def create_session(db_pool, session_id, user_id=None, expires_days=30, dat
     expires_at = datetime.utcnow() + timedelta(days=expires_days)
     async with db_pool.acquire() as conn:
         await conn.execute(
-            "INSERT INTO sessions (session_id, user_id, created_at, expires_at, data) VALUES ($1, $2, now(), $3, $4)",
+            CREATE_SESSION_SQL,
             session_id, user_id, expires_at, json.dumps(data) if data else None
         )
 
@@ -19,7 +33,7 @@ async def get_session(db_pool, session_id):
     Retrieve a session by session_id.
     """
     async with db_pool.acquire() as conn:
-        return await conn.fetchrow("SELECT * FROM sessions WHERE session_id = $1", session_id)
+        return await conn.fetchrow(GET_SESSION_SQL, session_id)
 
 async def update_session(db_pool, session_id, data=None, expires_days=None):
     """
@@ -28,93 +42,269 @@ async def update_session(db_pool, session_id, data=None, expires_days=None):
     async with db_pool.acquire() as conn:
         if data is not None and expires_days is not None:
             expires_at = datetime.utcnow() + timedelta(days=expires_days)
-            await conn.execute(
-                "UPDATE sessions SET data = $1, expires_at = $2 WHERE session_id = $3",
-                json.dumps(data), expires_at, session_id
-            )
+            await conn.execute(UPDATE_SESSION_DATA_EXPIRY_SQL, json.dumps(data), expires_at, session_id)
         elif data is not None:
-            await conn.execute(
-                "UPDATE sessions SET data = $1 WHERE session_id = $2",
-                json.dumps(data), session_id
-            )
+            await conn.execute(UPDATE_SESSION_DATA_SQL, json.dumps(data), session_id)
         elif expires_days is not None:
             expires_at = datetime.utcnow() + timedelta(days=expires_days)
-            await conn.execute(
-                "UPDATE sessions SET expires_at = $1 WHERE session_id = $2",
-                expires_at, session_id
-            )
+            await conn.execute(UPDATE_SESSION_EXPIRY_SQL, expires_at, session_id)
 
 async def delete_session(db_pool, session_id):
     """
     Delete a session from the database.
     """
     async with db_pool.acquire() as conn:
-        await conn.execute("DELETE FROM sessions WHERE session_id = $1", session_id)
+        await conn.execute(DELETE_SESSION_SQL, session_id)
 
 async def cleanup_expired_sessions(db_pool):
     """
-    Delete all expired sessions.
+    Delete all expired sessions, in batches (the maintenance scheduler runs
+    this regularly, see vox/maintenance.py).
     """
+    from vox.maintenance import delete_expired_sessions
     async with db_pool.acquire() as conn:
-        await conn.execute("DELETE FROM sessions WHERE expires_at < now()")
+        return await delete_expired_sessions(conn)
 
 # --- Existing Vocal Data Logic ---
 
-async def save_vocal_data_async(db_pool, sid, timestamp, pitch, hnr, harmonics, formants, jitter_shimmer, praat_report, logger=None):
+# Full-tier metrics go in the typed columns of vox/compact_metrics.py
+VOCAL_DATA_COLUMNS = ("session_id", "user_id", "timestamp", "pitch", "hnr") + COMPACT_COLUMNS
+
+INSERT_VOCAL_SQL = (
+    f"INSERT INTO vocal_data ({', '.join(VOCAL_DATA_COLUMNS)}) "
+    f"VALUES ({', '.join(f'${i + 1}' for i in range(len(VOCAL_DATA_COLUMNS)))})"
+)
+# For a schema without the compact columns
+INSERT_VOCAL_BASIC_SQL = "INSERT INTO vocal_data (session_id, user_id, timestamp, pitch, hnr) VALUES ($1, $2, $3, $4, $5)"
+UPDATE_RECORDING_PATH_SQL = "UPDATE vocal_data SET recording_path = $1 WHERE session_id = $2 AND timestamp = $3"
+
+# Write-behind buffer for vocal_data (see VocalDataWriter)
+WRITER_BATCH_SIZE = int(os.environ.get("VOX_WRITER_BATCH_SIZE", "500"))
+WRITER_FLUSH_MS = float(os.environ.get("VOX_WRITER_FLUSH_MS", "1000"))
+WRITER_MAX_BUFFER = int(os.environ.get("VOX_WRITER_MAX_BUFFER", "10000"))
+WRITER_MAX_RETRIES = int(os.environ.get("VOX_WRITER_MAX_RETRIES", "5"))
+
+def _float_or_none(value):
+    return float(value) if value is not None else None
+
+def parse_timestamp(value):
     """
-    Save vocal analysis data asynchronously.
+    Client timestamps arrive as ISO 8601 strings; the timestamp columns are
+    naive UTC. Datetimes pass through (aware ones converted to naive UTC).
     """
-    async with db_pool.acquire() as conn:
+    if value is None:
+        return datetime.utcnow()
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+def vocal_data_record(session_id, user_id, timestamp, pitch, hnr, harmonics, formants, jitter_shimmer, praat_report):
+    """
+    One vocal_data row as a tuple in VOCAL_DATA_COLUMNS order; the voice
+    report is parsed here, once, and its text is not stored. ``session_id``
+    is the HTTP session (sessions.session_id) and ``user_id`` its user, if
+    known when the row is written.
+    """
+    return (
+        session_id, user_id, parse_timestamp(timestamp), _float_or_none(pitch), _float_or_none(hnr),
+        *compact_metrics(harmonics, formants, jitter_shimmer, praat_report)
+    )
+
+async def _insert_vocal_record(conn, record, logger=None):
+    try:
+        await conn.execute(INSERT_VOCAL_SQL, *record)
+        return True
+    except Exception as e:
+        if logger:
+            logger.error(f"DB insert error (likely missing columns): {e}")
+        # fallback: a schema without the compact columns still takes the basics
         try:
-            await conn.execute(
-                "INSERT INTO vocal_data (session_id, timestamp, pitch, hnr, harmonics, formants, jitter_shimmer, praat_report, recording_path) "
-                "VALUES ($1, $2, $3, $4, $5, $6, $7, $8, NULL)",
-                sid, timestamp, float(pitch), float(hnr), json.dumps(harmonics), json.dumps(formants), json.dumps(jitter_shimmer), praat_report
-            )
-        except Exception as e:
+            await conn.execute(INSERT_VOCAL_BASIC_SQL, *record[:5])
+            return True
+        except Exception as e2:
             if logger:
-                logger.error(f"DB insert error (likely missing columns): {e}")
-            # fallback: insert without new columns
+                logger.error(f"Fallback DB insert error: {e2}")
+            return False
+
+async def save_vocal_data_async(db_pool, session_id, user_id, timestamp, pitch, hnr, harmonics, formants, jitter_shimmer, praat_report, logger=None):
+    """
+    Save vocal analysis data asynchronously.
+    Live-tier rows leave the full-tier metrics (hnr, harmonics, jitter_shimmer, praat_report) as None.
+    """
+    record = vocal_data_record(session_id, user_id, timestamp, pitch, hnr, harmonics, formants, jitter_shimmer, praat_report)
+    async with db_pool.acquire() as conn:
+        await _insert_vocal_record(conn, record, logger)
+
+class VocalDataWriter:
+    """
+    Write-behind buffer for vocal_data inserts.
+
+    Rows are buffered in memory and written with one COPY per flush, when
+    ``batch_size`` rows are waiting or every ``flush_interval`` seconds. Once
+    ``max_buffer`` rows are waiting, ``add`` blocks until a flush makes room.
+    A batch that COPY rejects is retried row by row so one bad row doesn't
+    lose the rest. If the database can't be reached at all, the batch goes
+    back to the front of the buffer and is retried on the next flush, up to
+    ``max_retries`` times before it is dropped. The rows written are then
+    added to the users' progress rollups. ``close`` flushes whatever is
+    left; rows added after that are inserted directly.
+    """
+
+    def __init__(self, db_pool, batch_size=WRITER_BATCH_SIZE, flush_interval=WRITER_FLUSH_MS / 1000,
+                 max_buffer=WRITER_MAX_BUFFER, max_retries=WRITER_MAX_RETRIES, logger=None):
+        self.db_pool = db_pool
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max(max_buffer, batch_size)
+        self.max_retries = max_retries
+        self.logger = logger
+        self.rows_written = 0
+        self.rows_dropped = 0
+        self.flushes = 0
+        self._failures = 0
+        self._buffer = []
+        self._wake = asyncio.Event()
+        self._space = asyncio.Condition()
+        self._task = None
+        self._closing = False
+        self._flush_lock = asyncio.Lock()
+
+    @classmethod
+    def from_env(cls, db_pool, logger=None):
+        return cls(db_pool, logger=logger)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def __len__(self):
+        return len(self._buffer)
+
+    async def add(self, session_id, user_id, timestamp, pitch, hnr, harmonics, formants, jitter_shimmer, praat_report):
+        if self.db_pool is None:
+            return
+        record = vocal_data_record(session_id, user_id, timestamp, pitch, hnr, harmonics, formants, jitter_shimmer, praat_report)
+        if self._closing:
+            # Nothing flushes after close; don't strand the row in the buffer
+            try:
+                async with self.db_pool.acquire() as conn:
+                    if await _insert_vocal_record(conn, record, self.logger):
+                        self.rows_written += 1
+            except Exception as e:
+                self.rows_dropped += 1
+                if self.logger:
+                    self.logger.error(f"vocal_data insert after close failed: {e}")
+            return
+        async with self._space:
+            # Backpressure: wait for a flush rather than grow without bound
+            await self._space.wait_for(lambda: len(self._buffer) < self.max_buffer)
+            self._buffer.append(record)
+        if len(self._buffer) >= self.batch_size:
+            self._wake.set()
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._buffer:
+                return
+            rows, self._buffer = self._buffer, []
+            async with self._space:
+                self._space.notify_all()
+            try:
+                written = await self._write(rows)
+            except Exception as e:
+                self._failures += 1
+                if self._failures > self.max_retries:
+                    self._failures = 0
+                    self.rows_dropped += len(rows)
+                    if self.logger:
+                        self.logger.error(f"vocal_data flush failed {self.max_retries + 1} times, dropping {len(rows)} rows: {e}")
+                else:
+                    # Keep arrival order: the failed batch goes ahead of rows added meanwhile
+                    self._buffer[:0] = rows
+                    if self.logger:
+                        self.logger.error(f"vocal_data flush of {len(rows)} rows failed (attempt {self._failures}), will retry: {e}")
+                return
+            self._failures = 0
+            self.rows_written += len(written)
+            self.rows_dropped += len(rows) - len(written)
+            self.flushes += 1
+
+    async def _write(self, rows):
+        """
+        COPY ``rows`` (falling back to row-by-row inserts) and update the
+        rollups; returns the rows written. Raises if no connection could be
+        had, in which case nothing was written.
+        """
+        async with self.db_pool.acquire() as conn:
+            try:
+                await conn.copy_records_to_table("vocal_data", records=rows, columns=VOCAL_DATA_COLUMNS)
+                written = rows
+            except Exception as e:
+                if self.logger:
+                    self.logger.error(f"vocal_data COPY of {len(rows)} rows failed, inserting row by row: {e}")
+                written = [record for record in rows if await _insert_vocal_record(conn, record, self.logger)]
+            # Rollups can be rebuilt from vocal_data, so a failure here loses nothing
             try:
-                await conn.execute(
-                    "INSERT INTO vocal_data (session_id, timestamp, pitch, hnr, harmonics, formants, recording_path) "
-                    "VALUES ($1, $2, $3, $4, $5, $6, NULL)",
-                    sid, timestamp, float(pitch), float(hnr), json.dumps(harmonics), json.dumps(formants)
-                )
-            except Exception as e2:
-                if logger:
-                    logger.error(f"Fallback DB insert error: {e2}")
+                await apply_rollups(conn, [dict(zip(VOCAL_DATA_COLUMNS, record)) for record in written])
+            except Exception as e:
+                if self.logger:
+                    self.logger.error(f"vocal_rollups update failed for {len(written)} rows: {e}")
+        return written
+
+    async def close(self):
+        # Let an in-flight flush finish instead of cancelling it mid-COPY
+        self._closing = True
+        self._wake.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        # A failing flush re-buffers its rows until max_retries drops them
+        while self.db_pool is not None and self._buffer:
+            await self.flush()
+
+    async def _run(self):
+        while not self._closing:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                if self.logger:
+                    self.logger.error(f"vocal_data flush error: {e}")
 
 async def update_recording_path_async(db_pool, sid, timestamp, recording_path):
     """
     Update the database record with the saved file path.
     """
     async with db_pool.acquire() as conn:
-        await conn.execute(
-            "UPDATE vocal_data SET recording_path = $1 WHERE session_id = $2 AND timestamp = $3",
-            recording_path, sid, timestamp
-        )
+        await conn.execute(UPDATE_RECORDING_PATH_SQL, recording_path, sid, parse_timestamp(timestamp))
 
 # --- Chat Message Logic ---
 
+INSERT_CHAT_MESSAGE_SQL = (
+    "INSERT INTO chat_messages (session_id, user_role, message, timestamp) VALUES ($1, $2, $3, COALESCE($4, now()))"
+)
+CHAT_HISTORY_SQL = (
+    "SELECT user_role, message, timestamp FROM chat_messages WHERE session_id = $1 ORDER BY timestamp DESC LIMIT $2"
+)
+
 async def save_chat_message_async(db_pool, session_id, user_role, message, timestamp=None):
     """
     Save a chat message to the database.
     """
     async with db_pool.acquire() as conn:
-        await conn.execute(
-            "INSERT INTO chat_messages (session_id, user_role, message, timestamp) VALUES ($1, $2, $3, COALESCE($4, now()))",
-            session_id, user_role, message, timestamp
-        )
+        await conn.execute(INSERT_CHAT_MESSAGE_SQL, session_id, user_role, message, timestamp)
 
 async def fetch_chat_history_async(db_pool, session_id, limit=50):
     """
     Fetch the most recent chat messages for a session, ordered oldest to newest.
     """
     async with db_pool.acquire() as conn:
-        rows = await conn.fetch(
-            "SELECT user_role, message, timestamp FROM chat_messages WHERE session_id = $1 ORDER BY timestamp DESC LIMIT $2",
-            session_id, limit
-        )
+        rows = await conn.fetch(CHAT_HISTORY_SQL, session_id, limit)
         # Return in chronological order
         return list(reversed([dict(row) for row in rows]))
@@ -0,0 +1,375 @@
+import os
+import re
+import time
+import asyncio
+import logging
+from bisect import bisect_left
+from contextlib import asynccontextmanager
+
+from vox.repository import DB_POOL_MAX_SIZE
+
+# Every pool the app gets from repository.create_storage is wrapped in an
+# InstrumentedPool: it times each acquire (per lane) and each statement (by
+# label), logs slow statements, and splits the connections into lanes.
+# Request handlers use the pool as-is (the "interactive" lane, which may
+# take every connection). Background work goes through capped lanes of its
+# own, so no kind of it can take the connections another needs:
+#   "bulk"         the vocal_data writer's flushes and rollups
+#                  (VOX_DB_BULK_MAX_SIZE connections)
+#   "export"       NDJSON history exports, which hold a connection for as
+#                  long as the client takes to read (VOX_DB_EXPORT_MAX_SIZE)
+#   "maintenance"  the maintenance scheduler (one connection)
+# While interactive acquires keep waiting, the bulk and export limits
+# shrink towards one connection, and grow back once they stop.
+
+DB_BULK_MAX_SIZE = int(os.environ.get("VOX_DB_BULK_MAX_SIZE", str(max(1, DB_POOL_MAX_SIZE // 3))))
+DB_EXPORT_MAX_SIZE = int(os.environ.get("VOX_DB_EXPORT_MAX_SIZE", str(max(1, DB_POOL_MAX_SIZE // 5))))
+DB_SLOW_QUERY_MS = float(os.environ.get("VOX_DB_SLOW_QUERY_MS", "500"))  # 0 disables the log
+DB_ADAPT_INTERVAL_S = float(os.environ.get("VOX_DB_ADAPT_INTERVAL_S", "5"))  # 0 keeps the bulk limit fixed
+DB_ADAPT_WAIT_MS = float(os.environ.get("VOX_DB_ADAPT_WAIT_MS", "20"))  # interactive p95 acquire wait
+DB_STATS_INTERVAL_S = float(os.environ.get("VOX_DB_STATS_INTERVAL_S", "0"))  # 0: log stats at shutdown only
+
+INTERACTIVE = "interactive"
+BULK = "bulk"
+EXPORT = "export"
+MAINTENANCE = "maintenance"
+ADAPTIVE_LANES = (BULK, EXPORT)
+
+# Upper bounds (ms); one more bucket catches everything slower
+LATENCY_BUCKETS_MS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+MAX_LABELS = 500
+
+logger = logging.getLogger(__name__)
+
+_STATEMENT_TARGET = re.compile(r"\b(?:FROM|INTO|UPDATE|TABLE)\s+([\w.\"]+)", re.IGNORECASE)
+
+
+class LatencyHistogram:
+    """Counts of durations (ms) per LATENCY_BUCKETS_MS bucket, with count, total and max."""
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, ms):
+        self.counts[bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def percentile(self, q):
+        """Upper bound of the bucket holding the ``q`` quantile (the max for the last one)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return min(LATENCY_BUCKETS_MS[i], self.max_ms) if i < len(LATENCY_BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def stats(self):
+        return {
+            "count": self.count,
+            "avg_ms": self.total_ms / self.count if self.count else None,
+            "p50_ms": self.percentile(0.5),
+            "p95_ms": self.percentile(0.95),
+            "p99_ms": self.percentile(0.99),
+            "max_ms": self.max_ms,
+            "total_ms": self.total_ms,
+            "buckets": {
+                (f"le_{bound}" if i < len(LATENCY_BUCKETS_MS) else "inf"): n
+                for i, (bound, n) in enumerate(zip(LATENCY_BUCKETS_MS + (None,), self.counts)) if n
+            },
+        }
+
+
+_named_statements = None
+
+
+def named_statements():
+    """{SQL text: label} for the *_SQL constants of the modules that run statements."""
+    global _named_statements
+    if _named_statements is None:
+        from vox import database, maintenance, repository, retention, rollups
+        _named_statements = {}
+        for module in (repository, database, rollups, maintenance, retention):
+            for name, value in vars(module).items():
+                if name.endswith("_SQL") and isinstance(value, str):
+                    _named_statements.setdefault(value, name[:-len("_SQL")].lower())
+    return _named_statements
+
+
+def statement_label(sql):
+    """
+    The constant name for a known statement, otherwise its verb and first
+    table ("delete sessions"), so generated SQL still groups sensibly.
+    """
+    label = named_statements().get(sql)
+    if label is None:
+        words = sql.split(None, 1)
+        target = _STATEMENT_TARGET.search(sql)
+        label = " ".join(filter(None, [words[0].lower() if words else "", target and target[1].strip('"')]))
+    return label
+
+
+class _Limit:
+    """A semaphore whose limit can be changed while it is held."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_use = 0
+        self.waiting = 0
+        self._changed = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._changed:
+            self.waiting += 1
+            try:
+                await self._changed.wait_for(lambda: self.in_use < self.limit)
+            finally:
+                self.waiting -= 1
+            self.in_use += 1
+
+    async def release(self):
+        async with self._changed:
+            self.in_use -= 1
+            self._changed.notify()
+
+    async def resize(self, limit):
+        async with self._changed:
+            self.limit = limit
+            self._changed.notify_all()
+
+
+class PoolLane:
+    """
+    A pool look-alike for one class of work: acquires go through the shared
+    pool, at most ``limit`` at a time (None for no limit of its own).
+    """
+
+    def __init__(self, pool, name, limit=None):
+        self.pool = pool
+        self.name = name
+        self.max_limit = limit
+        self._limit = _Limit(limit) if limit is not None else None
+        self.acquire_wait = LatencyHistogram()
+        self.window_wait = LatencyHistogram()  # since the last adapt
+        self.acquires = 0
+        self.in_use = 0
+
+    @property
+    def limit(self):
+        return self._limit.limit if self._limit is not None else None
+
+    @asynccontextmanager
+    async def acquire(self):
+        start = time.perf_counter()
+        if self._limit is not None:
+            await self._limit.acquire()
+        try:
+            async with self.pool.raw_pool.acquire() as conn:
+                wait_ms = (time.perf_counter() - start) * 1000
+                self.acquire_wait.observe(wait_ms)
+                self.window_wait.observe(wait_ms)
+                self.acquires += 1
+                self.in_use += 1
+                try:
+                    yield InstrumentedConnection(conn, self.pool)
+                finally:
+                    self.in_use -= 1
+        finally:
+            if self._limit is not None:
+                await self._limit.release()
+
+    async def fetch(self, sql, *args, **kwargs):
+        async with self.acquire() as conn:
+            return await conn.fetch(sql, *args, **kwargs)
+
+    async def fetchrow(self, sql, *args, **kwargs):
+        async with self.acquire() as conn:
+            return await conn.fetchrow(sql, *args, **kwargs)
+
+    async def fetchval(self, sql, *args, **kwargs):
+        async with self.acquire() as conn:
+            return await conn.fetchval(sql, *args, **kwargs)
+
+    async def execute(self, sql, *args, **kwargs):
+        async with self.acquire() as conn:
+            return await conn.execute(sql, *args, **kwargs)
+
+    async def executemany(self, sql, args, **kwargs):
+        async with self.acquire() as conn:
+            return await conn.executemany(sql, args, **kwargs)
+
+    def lane_stats(self):
+        stats = {"acquires": self.acquires, "in_use": self.in_use, "wait": self.acquire_wait.stats()}
+        if self._limit is not None:
+            stats.update(limit=self._limit.limit, max_limit=self.max_limit, waiting=self._limit.waiting)
+        return stats
+
+
+class InstrumentedConnection:
+    """Times every statement run on ``conn`` into ``pool``'s per-label histograms."""
+
+    def __init__(self, conn, pool):
+        self._conn = conn
+        self._pool = pool
+
+    def __getattr__(self, name):
+        # transaction(), is_closed(), ... go straight to the connection
+        return getattr(self._conn, name)
+
+    async def _timed(self, label, call, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await call(*args, **kwargs)
+        finally:
+            self._pool.record(label, (time.perf_counter() - start) * 1000)
+
+    async def fetch(self, sql, *args, **kwargs):
+        return await self._timed(statement_label(sql), self._conn.fetch, sql, *args, **kwargs)
+
+    async def fetchrow(self, sql, *args, **kwargs):
+        return await self._timed(statement_label(sql), self._conn.fetchrow, sql, *args, **kwargs)
+
+    async def fetchval(self, sql, *args, **kwargs):
+        return await self._timed(statement_label(sql), self._conn.fetchval, sql, *args, **kwargs)
+
+    async def execute(self, sql, *args, **kwargs):
+        return await self._timed(statement_label(sql), self._conn.execute, sql, *args, **kwargs)
+
+    async def executemany(self, sql, args, **kwargs):
+        return await self._timed(statement_label(sql), self._conn.executemany, sql, args, **kwargs)
+
+    async def copy_records_to_table(self, table, **kwargs):
+        return await self._timed(f"copy {table}", self._conn.copy_records_to_table, table, **kwargs)
+
+    async def cursor(self, sql, *args, **kwargs):
+        # Timed from the first fetch to the end of the iteration, which includes
+        # the caller's work between rows, so it never counts as a slow query
+        label = f"{statement_label(sql)} (cursor)"
+        start = time.perf_counter()
+        try:
+            async for row in self._conn.cursor(sql, *args, **kwargs):
+                yield row
+        finally:
+            self._pool.record(label, (time.perf_counter() - start) * 1000, slow_log=False)
+
+
+class InstrumentedPool(PoolLane):
+    """
+    Wraps an asyncpg pool (or a MemoryPool) as the interactive lane, with
+    the other lanes from ``lane(name)``. ``stats()`` reports the pool size,
+    connections in use and idle, acquire waits per lane and timings per
+    statement label.
+    """
+
+    def __init__(self, raw_pool, bulk_max_size=DB_BULK_MAX_SIZE, export_max_size=DB_EXPORT_MAX_SIZE,
+                 slow_query_ms=DB_SLOW_QUERY_MS, adapt_interval=DB_ADAPT_INTERVAL_S,
+                 adapt_wait_ms=DB_ADAPT_WAIT_MS, stats_interval=DB_STATS_INTERVAL_S, logger=None):
+        super().__init__(self, INTERACTIVE)
+        self.raw_pool = raw_pool
+        self.lanes = {
+            INTERACTIVE: self,
+            BULK: PoolLane(self, BULK, max(1, bulk_max_size)),
+            EXPORT: PoolLane(self, EXPORT, max(1, export_max_size)),
+            MAINTENANCE: PoolLane(self, MAINTENANCE, 1),
+        }
+        self.statements = {}
+        self.slow_queries = 0
+        self.slow_query_ms = slow_query_ms
+        self.adapt_interval = adapt_interval
+        self.adapt_wait_ms = adapt_wait_ms
+        self.stats_interval = stats_interval
+        self.logger = logger or logging.getLogger(__name__)
+        self._tasks = []
+
+    def lane(self, name):
+        return self.lanes[name]
+
+    def record(self, label, ms, slow_log=True):
+        histogram = self.statements.get(label)
+        if histogram is None:
+            if len(self.statements) >= MAX_LABELS:
+                label = "other"
+            histogram = self.statements.setdefault(label, LatencyHistogram())
+        histogram.observe(ms)
+        if slow_log and self.slow_query_ms and ms >= self.slow_query_ms:
+            self.slow_queries += 1
+            self.logger.warning(f"Slow query {label}: {ms:.0f} ms")
+
+    def start(self):
+        if not self._tasks:
+            if self.adapt_interval > 0:
+                self._tasks.append(asyncio.create_task(self._every(self.adapt_interval, self.adapt)))
+            if self.stats_interval > 0:
+                self._tasks.append(asyncio.create_task(self._every(self.stats_interval, self.log_stats)))
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+        self._tasks = []
+        await self.raw_pool.close()
+
+    async def adapt(self):
+        """
+        Halve the bulk and export limits when interactive acquires waited
+        more than ``adapt_wait_ms`` (p95) since the last call; add a
+        connection back when they hardly waited.
+        """
+        p95 = self.window_wait.percentile(0.95)
+        self.window_wait = LatencyHistogram()
+        if p95 is not None and self.adapt_wait_ms / 4 <= p95 <= self.adapt_wait_ms:
+            return
+        for name in ADAPTIVE_LANES:
+            lane = self.lanes[name]
+            lane.window_wait = LatencyHistogram()
+            limit = lane.limit // 2 if p95 is not None and p95 > self.adapt_wait_ms else lane.limit + 1
+            limit = min(max(limit, 1), lane.max_limit)
+            if limit != lane.limit:
+                self.logger.info(f"{name} lane limit {lane.limit} -> {limit} (interactive p95 wait {p95} ms)")
+                await lane._limit.resize(limit)
+
+    def log_stats(self):
+        stats = self.stats()
+        lanes = ", ".join(
+            f"{name} p95 wait {lane['wait']['p95_ms']} ms" for name, lane in stats["lanes"].items()
+        )
+        slowest = sorted(stats["statements"].items(), key=lambda item: -item[1]["total_ms"])[:5]
+        self.logger.info(
+            f"DB pool: {stats['in_use']} in use, {stats['idle']} idle of {stats['size']} "
+            f"(max {stats['max_size']}); {lanes}; {stats['slow_queries']} slow queries; top statements by time: "
+            + ", ".join(f"{label} {s['count']}x avg {s['avg_ms']:.1f} ms" for label, s in slowest)
+        )
+
+    async def _every(self, interval, step):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                result = step()
+                if asyncio.iscoroutine(result):
+                    await result
+            except Exception as e:
+                self.logger.error(f"DB pool {step.__name__} error: {e}")
+
+    def stats(self):
+        raw = self.raw_pool
+        max_size = raw.get_max_size() if hasattr(raw, "get_max_size") else getattr(raw, "max_size", None)
+        return {
+            "size": raw.get_size(),
+            "idle": raw.get_idle_size(),
+            "in_use": sum(lane.in_use for lane in self.lanes.values()),
+            "max_size": max_size,
+            "slow_queries": self.slow_queries,
+            "lanes": {name: lane.lane_stats() for name, lane in self.lanes.items()},
+            "statements": {label: histogram.stats() for label, histogram in self.statements.items()},
+        }
@@ -8,6 +8,13 @@ from starlette.middleware.sessions import SessionMiddleware
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 from vox.limiter import limiter
+from vox.analysis_engine import AnalysisEngine, MicroBatcher
+from vox.content_cache import ContentCache
+from vox.database import VocalDataWriter
+from vox.identity import IdentityCache
+from vox.repository import DB_STATEMENT_MODE, STORAGE_BACKEND, create_storage
+from vox.db_pool import BULK, MAINTENANCE
+from vox.maintenance import MaintenanceScheduler
 
 import asyncio
 
@@ -39,23 +46,91 @@ logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(me
 logger = logging.getLogger(__name__)
 app.state.logger = logger
 
-# Database pool (asyncpg)
+# Database pool (asyncpg or the memory store, instrumented: see vox/db_pool.py)
 app.state.db_pool = None
+# Lane of db_pool for the vocal_data writer's flushes (VOX_DB_BULK_MAX_SIZE)
+app.state.bulk_pool = None
+# Write-behind vocal_data writer, created once the pool exists (VOX_WRITER_* env vars)
+app.state.vocal_writer = None
+# Expired-row cleanup and vocal_data retention, started with the pool
+# (VOX_MAINTENANCE_* and VOX_RETENTION_* env vars)
+app.state.maintenance = None
+
+# Audio analysis engine (process pool, configured via VOX_ANALYSIS_* env vars)
+app.state.analysis_engine = AnalysisEngine.from_env()
+# Batches live pitch/formant work across sessions (VOX_BATCH_* env vars)
+app.state.batch_scheduler = MicroBatcher.from_env(app.state.analysis_engine)
+# Content-addressed cache for analysis results and transformed audio (VOX_CACHE_* env vars)
+app.state.content_cache = ContentCache.from_env()
+# Session -> user profile cache (VOX_IDENTITY_CACHE_* env vars)
+app.state.identity_cache = IdentityCache()
+
+# Serializes pool creation between startup and later retries from requests
+_storage_lock = asyncio.Lock()
+
+async def ensure_db_pool():
+    """
+    Create and start the storage pool unless it already exists, and hand it
+    to the writer and maintenance if they were started without one. Safe to
+    call again after a failed attempt; returns the pool or None.
+    """
+    async with _storage_lock:
+        if app.state.db_pool is not None:
+            return app.state.db_pool
+        SUPABASE_DB_URL = os.environ.get("SUPABASE_DB_URL")
+        if STORAGE_BACKEND == "memory":
+            app.state.db_pool = await create_storage()
+            logger.warning("VOX_STORAGE=memory: data is kept in this process only and lost on restart")
+        elif SUPABASE_DB_URL:
+            try:
+                # VOX_DB_STATEMENT_MODE picks prepared statements or pgbouncer compatibility
+                app.state.db_pool = await create_storage(SUPABASE_DB_URL)
+                logger.info(f"Database connection pool created successfully ({DB_STATEMENT_MODE} statements)")
+            except Exception as e:
+                logger.error(f"Failed to create database pool: {e}")
+                return None
+        else:
+            logger.warning("SUPABASE_DB_URL not set, database features will be unavailable (VOX_STORAGE=memory runs without one)")
+            return None
+
+        app.state.db_pool.start()
+        app.state.bulk_pool = app.state.db_pool.lane(BULK)
+        if app.state.vocal_writer is not None:
+            app.state.vocal_writer.db_pool = app.state.bulk_pool
+        if app.state.maintenance is not None:
+            app.state.maintenance.db_pool = app.state.db_pool.lane(MAINTENANCE)
+            app.state.maintenance.start()
+        return app.state.db_pool
 
 @app.on_event("startup")
 async def startup_event():
-    import asyncpg
-    SUPABASE_DB_URL = os.environ.get("SUPABASE_DB_URL")
-    if SUPABASE_DB_URL:
-        try:
-            app.state.db_pool = await asyncpg.create_pool(SUPABASE_DB_URL, max_size=10, statement_cache_size=0)
-            logger.info("Database connection pool created successfully")
-        except Exception as e:
-            logger.error(f"Failed to create database pool: {e}")
-            app.state.db_pool = None
-    else:
-        logger.warning("SUPABASE_DB_URL not set, database features will be unavailable")
-        app.state.db_pool = None
+    # Runs once; requests that find no pool only retry ensure_db_pool
+    if app.state.vocal_writer is not None:
+        return
+    await ensure_db_pool()
+    app.state.vocal_writer = VocalDataWriter.from_env(app.state.bulk_pool, logger)
+    app.state.vocal_writer.start()
+    # Maintenance is Postgres housekeeping; the memory store has nothing to clean
+    if STORAGE_BACKEND == "postgres":
+        maintenance_pool = app.state.db_pool.lane(MAINTENANCE) if app.state.db_pool is not None else None
+        app.state.maintenance = MaintenanceScheduler.from_env(maintenance_pool, logger)
+        app.state.maintenance.start()
+    await app.state.analysis_engine.warm_up()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    # Flush buffered rows before the pool goes away
+    if app.state.vocal_writer is not None:
+        await app.state.vocal_writer.close()
+    if app.state.maintenance is not None:
+        await app.state.maintenance.close()
+        logger.info(f"Maintenance: {app.state.maintenance.stats()}")
+    logger.info(f"Identity cache: {app.state.identity_cache.stats()}")
+    if app.state.db_pool is not None:
+        app.state.db_pool.log_stats()
+        await app.state.db_pool.close()
+    await app.state.batch_scheduler.close()
+    app.state.analysis_engine.shutdown()
 
 # Register routers
 app.include_router(main_router)
@@ -92,6 +167,27 @@ def get_socketio():
 def get_db_pool():
     return app.state.db_pool
 
+def get_bulk_pool():
+    return app.state.bulk_pool
+
+def get_analysis_engine():
+    return app.state.analysis_engine
+
+def get_batch_scheduler():
+    return app.state.batch_scheduler
+
+def get_vocal_writer():
+    return app.state.vocal_writer
+
+def get_maintenance():
+    return app.state.maintenance
+
+def get_identity_cache():
+    return app.state.identity_cache
+
+def get_content_cache():
+    return app.state.content_cache
+
 # Note: You should now run with:
 # hypercorn vox.fastapi_app:sio_app --bind 0.0.0.0:3000
 
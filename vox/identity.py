@@ -0,0 +1,117 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+from vox.repository import fetch_user_profile
+
+# Resolved session -> user profiles are served from memory for this long.
+# Writes made through this process invalidate immediately; the TTL bounds
+# staleness from writes made elsewhere (other workers, manual SQL).
+IDENTITY_CACHE_TTL = float(os.environ.get("VOX_IDENTITY_CACHE_TTL", "60"))
+IDENTITY_CACHE_SIZE = int(os.environ.get("VOX_IDENTITY_CACHE_SIZE", "10000"))
+
+DEFAULT_USER_NAME = "friend"
+DEFAULT_USER_PRONOUNS = "they/them/theirs/themselves"
+
+class IdentityCache:
+    """
+    TTL- and size-bounded LRU of session id -> user profile
+    (user_id, user_name, user_pronouns, target_gender).
+
+    Only resolved sessions are cached, so a session created after a miss is
+    found on the next lookup. ``invalidate_user`` drops every session of a
+    user after a write to the users table.
+    """
+
+    def __init__(self, ttl=IDENTITY_CACHE_TTL, max_size=IDENTITY_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()  # sid -> (expires_at, profile)
+        self._sessions_by_user = {}
+        self._lock = threading.Lock()
+
+    def get(self, sid):
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(sid)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                self._drop(sid)
+            self.misses += 1
+            return None
+
+    def put(self, sid, profile):
+        with self._lock:
+            if sid in self._entries:
+                self._drop(sid)
+            self._entries[sid] = (time.monotonic() + self.ttl, profile)
+            self._sessions_by_user.setdefault(profile["user_id"], set()).add(sid)
+            while len(self._entries) > self.max_size:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, sid):
+        with self._lock:
+            if sid in self._entries:
+                self._drop(sid)
+                self.invalidations += 1
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for sid in list(self._sessions_by_user.get(user_id, ())):
+                self._drop(sid)
+                self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _drop(self, sid):
+        _, profile = self._entries.pop(sid)
+        sessions = self._sessions_by_user.get(profile["user_id"])
+        if sessions is not None:
+            sessions.discard(sid)
+            if not sessions:
+                del self._sessions_by_user[profile["user_id"]]
+
+
+async def get_user_profile(db_pool, cache, sid):
+    """
+    Profile dict of the user behind a session, or None if the session has no
+    user. Misses cost one JOIN query instead of two sequential lookups.
+    """
+    profile = cache.get(sid)
+    if profile is not None:
+        return profile
+    async with db_pool.acquire() as conn:
+        row = await fetch_user_profile(conn, sid)
+    if row is None:
+        return None
+    profile = dict(row)
+    cache.put(sid, profile)
+    return profile
+
+
+def user_name_and_pronouns(profile):
+    """The profile's name and pronouns, with the app's defaults for blanks."""
+    user_name = profile["user_name"] if profile and profile["user_name"] else DEFAULT_USER_NAME
+    user_pronouns = profile["user_pronouns"] if profile and profile["user_pronouns"] else DEFAULT_USER_PRONOUNS
+    return user_name, user_pronouns
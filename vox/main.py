@@ -3,9 +3,12 @@ from fastapi.responses import HTMLResponse
 from vox.fastapi_app import templates
 import uuid
 import asyncio
+from datetime import datetime, timedelta
 
 from starlette.responses import RedirectResponse
-from vox.database import create_session, get_session
+from vox.database import get_session
+from vox.identity import DEFAULT_USER_NAME, DEFAULT_USER_PRONOUNS, get_user_profile
+from vox.repository import create_user_with_session
 
 router = APIRouter()
 
@@ -22,38 +25,33 @@ async def index(request: Request):
     logger = getattr(app.state, "logger", None)
 
     if pool is None:
-        # Should not happen if startup event is set up correctly
-        from vox.fastapi_app import startup_event
-        await startup_event()
+        # Startup couldn't reach the database; only retry creating the pool
+        from vox.fastapi_app import ensure_db_pool
+        pool = await ensure_db_pool()
 
     # Persistent session management using database
+    identity_cache = app.state.identity_cache
     sid = request.cookies.get("session_id")
-    session_obj = None
+    session_obj = user = None
     if sid:
-        session_obj = await get_session(pool, sid)
+        # A cached profile proves the session exists; otherwise ask the database
+        user = await get_user_profile(pool, identity_cache, sid)
+        session_obj = user or await get_session(pool, sid)
     if not session_obj:
         sid = str(uuid.uuid4())
         user_id = str(uuid.uuid4())
-        # Create user first
+        expires_at = datetime.utcnow() + timedelta(days=30)
         async with pool.acquire() as conn:
-            await conn.execute(
-                "INSERT INTO users (user_id, user_name, user_pronouns) VALUES ($1, $2, $3)",
-                user_id, "friend", "they/them/theirs/themselves"
-            )
-        await create_session(pool, sid, user_id=user_id)
+            await create_user_with_session(conn, sid, user_id, DEFAULT_USER_NAME, DEFAULT_USER_PRONOUNS, expires_at)
         new_session = True
     else:
         new_session = False
 
-    async with pool.acquire() as conn:
-        # Fetch user by session from sessions table, then get user info
-        session_row = await conn.fetchrow("SELECT user_id FROM sessions WHERE session_id = $1", sid)
-        user = None
-        if session_row and session_row["user_id"]:
-            user = await conn.fetchrow("SELECT user_name, user_pronouns FROM users WHERE user_id = $1", session_row["user_id"])
+    if user is None:
+        user = await get_user_profile(pool, identity_cache, sid)
 
     if logger:
-        user_name = user["user_name"] if user and "user_name" in user else "friend"
+        user_name = user["user_name"] if user and user["user_name"] else "friend"
         logger.info(f"Session {sid} - login: User '{user_name}' accessed Vox")
 
     response = templates.TemplateResponse("index.html", {"request": request})
@@ -0,0 +1,227 @@
+import os
+import time
+import socket
+import asyncio
+import logging
+from datetime import timedelta
+
+from vox.repository import claim_maintenance_job, finish_maintenance_job
+from vox.retention import RETENTION_INTERVAL_HOURS, run_retention
+
+# Background cleanup run from the app: each job deletes what has expired in
+# bounded batches, pausing between them, so it never holds long locks or
+# floods the pool. Every worker runs the scheduler, but a job only runs
+# where its lease row in maintenance_runs was claimed, once per interval
+# across all workers.
+
+MAINTENANCE_ENABLED = os.environ.get("VOX_MAINTENANCE_ENABLED", "1") == "1"
+MAINTENANCE_TICK_S = float(os.environ.get("VOX_MAINTENANCE_TICK_S", "60"))
+MAINTENANCE_BATCH_SIZE = int(os.environ.get("VOX_MAINTENANCE_BATCH_SIZE", "1000"))
+MAINTENANCE_BATCH_PAUSE_MS = float(os.environ.get("VOX_MAINTENANCE_BATCH_PAUSE_MS", "50"))
+MAINTENANCE_MAX_BATCHES = int(os.environ.get("VOX_MAINTENANCE_MAX_BATCHES", "200"))  # per run
+MAINTENANCE_LEASE_S = float(os.environ.get("VOX_MAINTENANCE_LEASE_S", "900"))
+CHAT_RETENTION_DAYS = int(os.environ.get("VOX_CHAT_RETENTION_DAYS", "90"))  # 0 keeps everything
+ORPHAN_USER_GRACE_HOURS = float(os.environ.get("VOX_ORPHAN_USER_GRACE_HOURS", "24"))
+
+logger = logging.getLogger(__name__)
+
+NOW_UTC = "(now() AT TIME ZONE 'utc')"
+
+
+def batched_delete_sql(table, where, batch_size):
+    """
+    DELETE of at most ``batch_size`` rows matching ``where``, picked by ctid
+    so each statement is a short index or TID lookup.
+    """
+    return f"DELETE FROM {table} WHERE ctid IN (SELECT ctid FROM {table} WHERE {where} LIMIT {int(batch_size)})"
+
+
+async def delete_in_batches(conn, table, where, *args, batch_size=MAINTENANCE_BATCH_SIZE,
+                            pause=MAINTENANCE_BATCH_PAUSE_MS / 1000, max_batches=MAINTENANCE_MAX_BATCHES):
+    """
+    Delete the rows of ``table`` matching ``where`` one committed batch at a
+    time, sleeping ``pause`` seconds between batches. Stops after
+    ``max_batches``; the next run continues. Returns the rows deleted.
+    """
+    sql = batched_delete_sql(table, where, batch_size)
+    deleted = 0
+    for _ in range(max_batches):
+        status = await conn.execute(sql, *args)  # "DELETE <n>"
+        count = int(status.split()[-1])
+        deleted += count
+        if count < batch_size:
+            break
+        await asyncio.sleep(pause)
+    return deleted
+
+
+async def delete_expired_sessions(conn):
+    # Chat messages of the sessions go with them (ON DELETE CASCADE)
+    return await delete_in_batches(conn, "sessions", f"expires_at < {NOW_UTC}")
+
+
+async def delete_expired_password_resets(conn):
+    return await delete_in_batches(conn, "password_resets", f"expires_at < {NOW_UTC}")
+
+
+async def delete_orphan_users(conn):
+    """
+    Anonymous users (no email or Discord login) with no session left: the
+    index page creates one per visitor, and once the session expires
+    nobody can get back to it.
+    """
+    return await delete_in_batches(
+        conn, "users",
+        f"email IS NULL AND discord_id IS NULL AND created_at < {NOW_UTC} - $1::interval "
+        "AND NOT EXISTS (SELECT 1 FROM sessions s WHERE s.user_id = users.user_id)",
+        timedelta(hours=ORPHAN_USER_GRACE_HOURS)
+    )
+
+
+async def delete_stale_chat_messages(conn):
+    if CHAT_RETENTION_DAYS <= 0:
+        return 0
+    return await delete_in_batches(
+        conn, "chat_messages", f"timestamp < {NOW_UTC} - $1::interval", timedelta(days=CHAT_RETENTION_DAYS)
+    )
+
+
+async def expire_vocal_data(conn):
+    summary = await run_retention(conn)
+    return len(summary["expired"]) if summary else 0
+
+
+class MaintenanceJob:
+    """A named cleanup coroutine ``run(conn) -> rows deleted``, due every ``interval`` seconds."""
+
+    def __init__(self, name, run, interval):
+        self.name = name
+        self.run = run
+        self.interval = interval
+        self.runs = 0
+        self.errors = 0
+        self.deleted = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.last_ms = None
+        self.last_error = None
+        self.next_check = 0.0
+
+    def record(self, duration_ms, deleted, error=None):
+        self.runs += 1
+        self.deleted += deleted
+        self.total_ms += duration_ms
+        self.max_ms = max(self.max_ms, duration_ms)
+        self.last_ms = duration_ms
+        self.last_error = error
+        if error is not None:
+            self.errors += 1
+
+    def stats(self):
+        return {
+            "runs": self.runs,
+            "errors": self.errors,
+            "deleted": self.deleted,
+            "last_ms": self.last_ms,
+            "avg_ms": self.total_ms / self.runs if self.runs else None,
+            "max_ms": self.max_ms,
+            "last_error": self.last_error,
+        }
+
+
+def default_jobs():
+    return [
+        MaintenanceJob("expired_sessions", delete_expired_sessions, 3600),
+        MaintenanceJob("expired_password_resets", delete_expired_password_resets, 3600),
+        MaintenanceJob("orphan_users", delete_orphan_users, 6 * 3600),
+        MaintenanceJob("stale_chat_messages", delete_stale_chat_messages, 6 * 3600),
+        MaintenanceJob("vocal_data_retention", expire_vocal_data, RETENTION_INTERVAL_HOURS * 3600),
+    ]
+
+
+class MaintenanceScheduler:
+    """
+    Runs the maintenance jobs from one background task. Every ``tick``
+    seconds each job whose interval has passed is claimed in
+    maintenance_runs; the worker that wins the claim runs it and records the
+    outcome there, the others skip it. A lease outlives a crashed worker by
+    at most ``lease`` seconds. Per-job timings are kept in ``stats``.
+    """
+
+    def __init__(self, db_pool, jobs=None, tick=MAINTENANCE_TICK_S, lease=MAINTENANCE_LEASE_S, logger=None):
+        self.db_pool = db_pool
+        self.jobs = default_jobs() if jobs is None else jobs
+        self.tick = tick
+        self.lease = timedelta(seconds=lease)
+        self.holder = f"{socket.gethostname()}:{os.getpid()}"
+        self.logger = logger or logging.getLogger(__name__)
+        self._task = None
+        self._stop = asyncio.Event()
+
+    @classmethod
+    def from_env(cls, db_pool, logger=None):
+        return cls(db_pool, logger=logger)
+
+    def start(self):
+        if self._task is None and self.db_pool is not None and MAINTENANCE_ENABLED:
+            self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        # Every batch commits on its own, so a job can stop anywhere
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self):
+        return {job.name: job.stats() for job in self.jobs}
+
+    async def run_job(self, conn, job):
+        """Run ``job`` if this worker can claim it. Returns the rows deleted, or None if skipped."""
+        if not await claim_maintenance_job(conn, job.name, self.holder, self.lease, timedelta(seconds=job.interval)):
+            return None
+        start = time.perf_counter()
+        deleted, error = 0, None
+        try:
+            deleted = await job.run(conn)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+            self.logger.error(f"Maintenance job {job.name} failed: {error}")
+        duration_ms = (time.perf_counter() - start) * 1000
+        job.record(duration_ms, deleted, error)
+        await finish_maintenance_job(conn, job.name, self.holder, duration_ms, deleted, error)
+        if deleted or duration_ms > 1000:
+            self.logger.info(f"Maintenance job {job.name}: deleted {deleted} in {duration_ms:.0f} ms")
+        return deleted
+
+    async def run_due(self):
+        now = time.monotonic()
+        due = [job for job in self.jobs if job.next_check <= now]
+        if not due:
+            return
+        async with self.db_pool.acquire() as conn:
+            for job in due:
+                if self._stop.is_set():
+                    break
+                # Claimed or not, nobody runs it again before its interval
+                job.next_check = now + job.interval
+                try:
+                    await self.run_job(conn, job)
+                except Exception as e:
+                    job.next_check = now + self.tick
+                    self.logger.error(f"Maintenance job {job.name} could not be claimed: {e}")
+
+    async def _run(self):
+        while not self._stop.is_set():
+            try:
+                await self.run_due()
+            except Exception as e:
+                self.logger.error(f"Maintenance scheduler error: {e}")
+            try:
+                await asyncio.wait_for(self._stop.wait(), self.tick)
+            except asyncio.TimeoutError:
+                pass
@@ -0,0 +1,600 @@
+import os
+import uuid
+import random
+import asyncio
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+
+from vox import database as db_sql
+from vox import repository as repo_sql
+from vox.compact_metrics import COMPACT_COLUMNS, LEGACY_COLUMNS
+
+# In-process stand-in for the asyncpg pool, for load tests and profiling
+# without Postgres (VOX_STORAGE=memory, see repository.create_storage). It
+# looks the app's statements up, never parses them: every statement the app
+# runs is a constant in vox/repository.py or vox/database.py with a handler
+# here over plain dicts, or a performances_sql variant served from the
+# arguments it was built with. Statements without a handler raise
+# NotImplementedError. There is no isolation or rollback, and nothing
+# survives a restart.
+#
+# Each round trip sleeps for a gamma-distributed delay (mean and standard
+# deviation below, plus a per-row cost), and at most VOX_DB_POOL_MAX_SIZE
+# connections are out at once, so pool contention shows up as it would.
+
+MEMORY_LATENCY_MS = float(os.environ.get("VOX_MEMORY_LATENCY_MS", "0"))
+MEMORY_LATENCY_JITTER_MS = float(os.environ.get("VOX_MEMORY_LATENCY_JITTER_MS", "0"))
+MEMORY_ROW_US = float(os.environ.get("VOX_MEMORY_ROW_US", "0"))
+
+USER_DEFAULTS = {
+    "user_name": None, "user_pronouns": None, "target_gender": "unspecified", "email": None,
+    "password_hash": None, "discord_id": None, "email_verified": False, "verification_token": None,
+    "verification_token_expires": None,
+}
+VOCAL_DATA_FIELDS = (
+    ("id", "user_id", "session_id", "timestamp", "pitch", "hnr") + COMPACT_COLUMNS + LEGACY_COLUMNS
+    + ("recording_path", "transformed_path")
+)
+
+
+class MemoryRecord(dict):
+    """A row; like asyncpg.Record it can also be indexed by position."""
+
+    def __getitem__(self, key):
+        if isinstance(key, int):
+            return list(self.values())[key]
+        return super().__getitem__(key)
+
+
+class MemoryUniqueViolation(Exception):
+    pass
+
+
+class Latency:
+    """Per-round-trip delay: gamma(mean, std) milliseconds plus ``per_row_us`` per row."""
+
+    def __init__(self, mean_ms=MEMORY_LATENCY_MS, jitter_ms=MEMORY_LATENCY_JITTER_MS, per_row_us=MEMORY_ROW_US):
+        self.mean_ms = mean_ms
+        self.jitter_ms = jitter_ms
+        self.per_row_us = per_row_us
+
+    def sample(self, rows=0):
+        delay_ms = self.mean_ms
+        if self.mean_ms > 0 and self.jitter_ms > 0:
+            # Right-skewed like real round trips; shape and scale from mean and std
+            shape = (self.mean_ms / self.jitter_ms) ** 2
+            delay_ms = random.gammavariate(shape, self.mean_ms / shape)
+        return delay_ms / 1000 + rows * self.per_row_us / 1e6
+
+    async def wait(self, rows=0):
+        delay = self.sample(rows)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+def _uuid(value):
+    if value is None or isinstance(value, uuid.UUID):
+        return value
+    return uuid.UUID(str(value))
+
+
+def _now():
+    return datetime.utcnow()
+
+
+def _project(row, columns):
+    return MemoryRecord((c, row.get(c)) for c in columns)
+
+
+class MemoryStore:
+    """The tables, with the indexes the statements need."""
+
+    def __init__(self):
+        self.users = {}  # user_id -> row
+        self.sessions = {}  # session_id -> row
+        self.password_resets = {}  # token -> row
+        self.vocal_data = {}  # id -> row
+        self.vocal_by_session = defaultdict(set)
+        self.vocal_by_user = defaultdict(set)
+        self.chat_messages = []
+        self.vocal_rollups = {}  # (user_id, granularity, metric, bucket) -> row
+        self._vocal_id = 0
+
+    def session_user(self, session_id):
+        session = self.sessions.get(_uuid(session_id))
+        if session is None:
+            return None
+        return self.users.get(session["user_id"])
+
+    def user_where(self, column, value):
+        return next((u for u in self.users.values() if value is not None and u[column] == value), None)
+
+    def insert_user(self, **values):
+        row = {"user_id": uuid.uuid4(), **USER_DEFAULTS, "created_at": _now(), "updated_at": _now()}
+        row.update(values)
+        row["user_id"] = _uuid(row["user_id"])
+        for column in ("email", "discord_id"):
+            if row[column] is not None and self.user_where(column, row[column]):
+                raise MemoryUniqueViolation(f"duplicate users.{column}: {row[column]}")
+        if row["user_id"] in self.users:
+            raise MemoryUniqueViolation(f"duplicate users.user_id: {row['user_id']}")
+        self.users[row["user_id"]] = row
+        return row
+
+    def insert_session(self, session_id, user_id, expires_at, data=None):
+        session_id = _uuid(session_id)
+        if session_id in self.sessions:
+            raise MemoryUniqueViolation(f"duplicate sessions.session_id: {session_id}")
+        self.sessions[session_id] = {
+            "session_id": session_id, "user_id": _uuid(user_id), "created_at": _now(),
+            "expires_at": expires_at, "data": data,
+        }
+
+    def delete_session(self, session_id):
+        session_id = _uuid(session_id)
+        if self.sessions.pop(session_id, None) is None:
+            return 0
+        # chat_messages.session_id ON DELETE CASCADE
+        self.chat_messages = [m for m in self.chat_messages if m["session_id"] != session_id]
+        return 1
+
+    def insert_vocal(self, values):
+        self._vocal_id += 1
+        row = dict.fromkeys(VOCAL_DATA_FIELDS)
+        row.update(values)
+        row["id"] = self._vocal_id
+        row["session_id"] = _uuid(row["session_id"])
+        row["user_id"] = _uuid(row["user_id"])
+        self.vocal_data[row["id"]] = row
+        if row["session_id"] is not None:
+            self.vocal_by_session[row["session_id"]].add(row["id"])
+        if row["user_id"] is not None:
+            self.vocal_by_user[row["user_id"]].add(row["id"])
+        return row
+
+    def delete_vocal(self, row):
+        del self.vocal_data[row["id"]]
+        self.vocal_by_session[row["session_id"]].discard(row["id"])
+        self.vocal_by_user[row["user_id"]].discard(row["id"])
+
+    def session_vocal(self, session_id):
+        return [self.vocal_data[i] for i in self.vocal_by_session.get(_uuid(session_id), ())]
+
+    def user_vocal(self, user_id):
+        return [self.vocal_data[i] for i in self.vocal_by_user.get(_uuid(user_id), ())]
+
+
+# --- Statement handlers: (store, *args) -> affected or returned rows ---
+
+HANDLERS = {}
+
+
+def handles(*statements, command="SELECT"):
+    """
+    Register a handler for statements; ``command`` is the verb of the
+    command tag ``execute`` returns for them.
+    """
+    def register(handler):
+        for sql in statements:
+            HANDLERS[sql] = (handler, command)
+        return handler
+    return register
+
+
+@handles(repo_sql.USER_PROFILE_SQL)
+def _user_profile(store, session_id):
+    user = store.session_user(session_id)
+    return [_project(user, ("user_id", "user_name", "user_pronouns", "target_gender"))] if user else []
+
+
+@handles(repo_sql.USER_ACCOUNT_SQL)
+def _user_account(store, session_id):
+    user = store.session_user(session_id)
+    columns = ("user_id", "email", "email_verified", "discord_id", "user_name", "user_pronouns")
+    return [_project(user, columns)] if user else []
+
+
+@handles(repo_sql.CREATE_USER_SESSION_SQL, command="INSERT")
+def _create_user_session(store, session_id, user_id, user_name, user_pronouns, expires_at):
+    user = store.insert_user(user_id=user_id, user_name=user_name, user_pronouns=user_pronouns)
+    store.insert_session(session_id, user["user_id"], expires_at)
+    return [{}]
+
+
+@handles(repo_sql.UPDATE_SESSION_USER_SQL, command="UPDATE")
+def _update_session_user(store, session_id, user_name, user_pronouns, target_gender):
+    user = store.session_user(session_id)
+    if user is None:
+        return []
+    for column, value in (("user_name", user_name), ("user_pronouns", user_pronouns), ("target_gender", target_gender)):
+        if value is not None:
+            user[column] = value
+    user["updated_at"] = _now()
+    return [MemoryRecord(user_id=user["user_id"])]
+
+
+@handles(repo_sql.USER_BY_EMAIL_SQL)
+def _user_by_email(store, email):
+    user = store.user_where("email", email)
+    return [MemoryRecord(user)] if user else []
+
+
+@handles(repo_sql.USER_BY_DISCORD_ID_SQL)
+def _user_by_discord_id(store, discord_id):
+    user = store.user_where("discord_id", discord_id)
+    return [MemoryRecord(user)] if user else []
+
+
+@handles(repo_sql.CREATE_EMAIL_USER_SQL, command="INSERT")
+def _create_email_user(store, email, password_hash, user_name, user_pronouns, token, expires):
+    store.insert_user(
+        email=email, password_hash=password_hash, user_name=user_name, user_pronouns=user_pronouns,
+        verification_token=token, verification_token_expires=expires,
+    )
+    return [{}]
+
+
+@handles(repo_sql.VERIFY_EMAIL_SQL, command="UPDATE")
+def _verify_email(store, token):
+    user = store.user_where("verification_token", token)
+    if user is None or not user["verification_token_expires"] or user["verification_token_expires"] <= _now():
+        return []
+    user.update(email_verified=True, verification_token=None, verification_token_expires=None)
+    return [MemoryRecord(user_id=user["user_id"])]
+
+
+@handles(repo_sql.UPSERT_PASSWORD_RESET_SQL, command="INSERT")
+def _upsert_password_reset(store, email, token, expires_at):
+    reset = store.password_resets.setdefault(token, {"email": email, "token": token})
+    reset["expires_at"] = expires_at
+    return [{}]
+
+
+@handles(repo_sql.PASSWORD_RESET_SQL)
+def _password_reset(store, token):
+    reset = store.password_resets.get(token)
+    if reset is None or reset["expires_at"] <= _now():
+        return []
+    user = store.user_where("email", reset["email"])
+    return [MemoryRecord(email=reset["email"], user_id=user["user_id"] if user else None)]
+
+
+@handles(repo_sql.RESET_PASSWORD_SQL, command="UPDATE")
+def _reset_password(store, token, password_hash, email):
+    store.password_resets.pop(token, None)
+    user = store.user_where("email", email)
+    if user is None:
+        return []
+    user.update(password_hash=password_hash, updated_at=_now())
+    return [{}]
+
+
+@handles(repo_sql.LATEST_FULL_METRICS_SQL)
+def _latest_full_metrics(store, session_id):
+    rows = [row for row in store.session_vocal(session_id) if row["hnr"] is not None and row["timestamp"] is not None]
+    if not rows:
+        return []
+    columns = ("pitch", "hnr") + COMPACT_COLUMNS[:-1] + ("harmonics", "formants", "jitter_shimmer")
+    return [_project(max(rows, key=lambda row: row["timestamp"]), columns)]
+
+
+@handles(repo_sql.INSERT_RECORDING_SQL, command="INSERT")
+def _insert_recording(store, session_id, timestamp, recording_path):
+    store.insert_vocal({"session_id": session_id, "timestamp": timestamp, "recording_path": recording_path})
+    return [{}]
+
+
+@handles(repo_sql.SET_TRANSFORMED_PATH_SQL, command="UPDATE")
+def _set_transformed_path(store, transformed_path, session_id, recording_path):
+    rows = [row for row in store.session_vocal(session_id) if row["recording_path"] == recording_path]
+    for row in rows:
+        row["transformed_path"] = transformed_path
+    return rows
+
+
+@handles(repo_sql.DELETE_SESSION_VOCAL_DATA_SQL, command="DELETE")
+def _delete_session_vocal_data(store, session_id):
+    rows = store.session_vocal(session_id)
+    for row in rows:
+        store.delete_vocal(row)
+    return [MemoryRecord(recording_path=row["recording_path"]) for row in rows]
+
+
+def _performances(store, fields, after_cursor, limited, user_id, *args):
+    # One performances_sql(fields, after_cursor, limited) variant
+    rows = [row for row in store.user_vocal(user_id) if row["timestamp"] is not None]
+    if after_cursor:
+        after = (args[0], args[1])
+        rows = [row for row in rows if (row["timestamp"], row["id"]) < after]
+        args = args[2:]
+    rows.sort(key=lambda row: (row["timestamp"], row["id"]), reverse=True)
+    if limited:
+        rows = rows[:args[0]]
+    columns = repo_sql.performance_columns(fields)
+    return [_project(row, columns) for row in rows]
+
+
+@handles(repo_sql.PERFORMANCE_BUCKETS_SQL)
+def _performance_buckets(store, user_id, start, end, width):
+    buckets = defaultdict(list)
+    for row in store.user_vocal(user_id):
+        if row["timestamp"] is not None and start <= row["timestamp"] < end:
+            offset = (row["timestamp"] - start).total_seconds()
+            buckets[(offset // width) * width].append(row)
+    result = []
+    for bucket in sorted(buckets):
+        rows = buckets[bucket]
+        pitches = [row["pitch"] for row in rows if row["pitch"] is not None]
+        hnrs = [row["hnr"] for row in rows if row["hnr"] is not None]
+        result.append(MemoryRecord(
+            timestamp=start + timedelta(seconds=bucket),
+            pitch=sum(pitches) / len(pitches) if pitches else None,
+            hnr=sum(hnrs) / len(hnrs) if hnrs else None,
+            samples=len(rows),
+        ))
+    return result
+
+
+@handles(repo_sql.SESSION_USERS_SQL)
+def _session_users(store, session_ids):
+    rows = []
+    for session_id in session_ids:
+        session = store.sessions.get(_uuid(session_id))
+        if session is not None and session["user_id"] is not None:
+            rows.append(MemoryRecord(session_id=session["session_id"], user_id=session["user_id"]))
+    return rows
+
+
+@handles(repo_sql.UPSERT_ROLLUP_SQL, command="INSERT")
+def _upsert_rollup(store, user_id, granularity, bucket, metric, count, total, sum_sq, low, high, histogram):
+    key = (_uuid(user_id), granularity, metric, bucket)
+    row = store.vocal_rollups.get(key)
+    if row is None:
+        store.vocal_rollups[key] = {
+            "user_id": key[0], "granularity": granularity, "metric": metric, "bucket": bucket, "count": count,
+            "sum": total, "sum_sq": sum_sq, "min": low, "max": high, "histogram": list(histogram),
+        }
+    else:
+        row["count"] += count
+        row["sum"] += total
+        row["sum_sq"] += sum_sq
+        row["min"] = min(row["min"], low)
+        row["max"] = max(row["max"], high)
+        size = max(len(row["histogram"]), len(histogram))
+        row["histogram"] = [
+            (row["histogram"][i] if i < len(row["histogram"]) else 0) + (histogram[i] if i < len(histogram) else 0)
+            for i in range(size)
+        ]
+    return [{}]
+
+
+@handles(repo_sql.ROLLUPS_SQL)
+def _rollups(store, user_id, granularity, metrics, start, end):
+    user_id = _uuid(user_id)
+    rows = [
+        row for (uid, gran, metric, bucket), row in store.vocal_rollups.items()
+        if uid == user_id and gran == granularity and metric in metrics and start <= bucket < end
+    ]
+    rows.sort(key=lambda row: (row["metric"], row["bucket"]))
+    columns = ("metric", "bucket", "count", "sum", "sum_sq", "min", "max", "histogram")
+    return [_project(row, columns) for row in rows]
+
+
+@handles(repo_sql.DELETE_ROLLUPS_SQL, command="DELETE")
+def _delete_rollups(store):
+    rows = list(store.vocal_rollups.values())
+    store.vocal_rollups.clear()
+    return rows
+
+
+@handles(repo_sql.DELETE_USER_ROLLUPS_SQL, command="DELETE")
+def _delete_user_rollups(store, user_id):
+    user_id = _uuid(user_id)
+    keys = [key for key in store.vocal_rollups if key[0] == user_id]
+    return [store.vocal_rollups.pop(key) for key in keys]
+
+
+@handles(repo_sql.ROLLUP_SOURCE_SQL, repo_sql.USER_ROLLUP_SOURCE_SQL)
+def _rollup_source(store, user_id=None):
+    user_id = _uuid(user_id)
+    rows = []
+    for row in store.vocal_data.values():
+        session = store.sessions.get(row["session_id"])
+        owner = row["user_id"] or (session["user_id"] if session else None)
+        if row["timestamp"] is None or owner is None or (user_id is not None and owner != user_id):
+            continue
+        record = _project(row, ("timestamp", "pitch", "hnr", "f1", "f2", "f3", "jitter", "shimmer"))
+        record["user_id"] = owner
+        rows.append(record)
+    return rows
+
+
+@handles(db_sql.CREATE_SESSION_SQL, command="INSERT")
+def _create_session(store, session_id, user_id, expires_at, data):
+    store.insert_session(session_id, user_id, expires_at, data)
+    return [{}]
+
+
+@handles(db_sql.GET_SESSION_SQL)
+def _get_session(store, session_id):
+    session = store.sessions.get(_uuid(session_id))
+    return [MemoryRecord(session)] if session else []
+
+
+@handles(db_sql.UPDATE_SESSION_DATA_EXPIRY_SQL, db_sql.UPDATE_SESSION_DATA_SQL, db_sql.UPDATE_SESSION_EXPIRY_SQL, command="UPDATE")
+def _update_session(store, *args):
+    # (data, expires_at, sid), (data, sid) or (expires_at, sid)
+    session = store.sessions.get(_uuid(args[-1]))
+    if session is None:
+        return []
+    for value in args[:-1]:
+        session["expires_at" if isinstance(value, datetime) else "data"] = value
+    return [session]
+
+
+@handles(db_sql.DELETE_SESSION_SQL, command="DELETE")
+def _delete_session(store, session_id):
+    return [{}] * store.delete_session(session_id)
+
+
+@handles(db_sql.INSERT_VOCAL_SQL, db_sql.INSERT_VOCAL_BASIC_SQL, command="INSERT")
+def _insert_vocal(store, *values):
+    store.insert_vocal(dict(zip(db_sql.VOCAL_DATA_COLUMNS, values)))
+    return [{}]
+
+
+@handles(db_sql.UPDATE_RECORDING_PATH_SQL, command="UPDATE")
+def _update_recording_path(store, recording_path, session_id, timestamp):
+    rows = [row for row in store.session_vocal(session_id) if row["timestamp"] == timestamp]
+    for row in rows:
+        row["recording_path"] = recording_path
+    return rows
+
+
+@handles(db_sql.INSERT_CHAT_MESSAGE_SQL, command="INSERT")
+def _insert_chat_message(store, session_id, user_role, message, timestamp):
+    store.chat_messages.append({
+        "id": len(store.chat_messages) + 1, "session_id": _uuid(session_id), "user_role": user_role,
+        "message": message, "timestamp": timestamp or _now(),
+    })
+    return [{}]
+
+
+@handles(db_sql.CHAT_HISTORY_SQL)
+def _chat_history(store, session_id, limit):
+    session_id = _uuid(session_id)
+    rows = sorted((m for m in store.chat_messages if m["session_id"] == session_id), key=lambda m: m["timestamp"])
+    return [_project(m, ("user_role", "message", "timestamp")) for m in reversed(rows[-limit:])]
+
+
+def _status(command, rows):
+    return f"INSERT 0 {len(rows)}" if command == "INSERT" else f"{command} {len(rows)}"
+
+
+# --- The asyncpg surface ---
+
+class MemoryCursor:
+    def __init__(self, conn, sql, args, prefetch):
+        self.conn = conn
+        self.sql = sql
+        self.args = args
+        self.prefetch = prefetch or 50
+
+    async def __aiter__(self):
+        rows = self.conn._run(self.sql, self.args)
+        for start in range(0, len(rows), self.prefetch):
+            # One round trip per prefetch batch, as with a server-side cursor
+            await self.conn.pool.latency.wait(min(self.prefetch, len(rows) - start))
+            for row in rows[start:start + self.prefetch]:
+                yield row
+
+
+class MemoryConnection:
+    def __init__(self, pool):
+        self.pool = pool
+
+    def _handler(self, sql):
+        if sql in HANDLERS:
+            return HANDLERS[sql]
+        variant = repo_sql.PERFORMANCE_STATEMENTS.get(sql)
+        if variant is not None:
+            return (lambda store, *args: _performances(store, *variant, *args)), "SELECT"
+        raise NotImplementedError(f"Memory storage has no handler for: {' '.join(sql.split())[:120]}")
+
+    def _run(self, sql, args):
+        return self._handler(sql)[0](self.pool.store, *args)
+
+    async def _call(self, sql, args):
+        rows = self._run(sql, args)
+        await self.pool.latency.wait(len(rows))
+        return rows
+
+    async def fetch(self, sql, *args):
+        return [MemoryRecord(row) for row in await self._call(sql, args)]
+
+    async def fetchrow(self, sql, *args):
+        rows = await self._call(sql, args)
+        return MemoryRecord(rows[0]) if rows else None
+
+    async def fetchval(self, sql, *args, column=0):
+        rows = await self._call(sql, args)
+        return list(rows[0].values())[column] if rows and rows[0] else None
+
+    async def execute(self, sql, *args):
+        return _status(self._handler(sql)[1], await self._call(sql, args))
+
+    async def executemany(self, sql, args_list):
+        count = sum(len(self._run(sql, args)) for args in args_list)
+        await self.pool.latency.wait(count)
+
+    async def copy_records_to_table(self, table, records, columns):
+        if table != "vocal_data":
+            raise NotImplementedError(f"Memory storage has no COPY into {table}")
+        records = list(records)
+        for record in records:
+            self.pool.store.insert_vocal(dict(zip(columns, record)))
+        await self.pool.latency.wait(len(records))
+        return f"COPY {len(records)}"
+
+    def cursor(self, sql, *args, prefetch=None):
+        return MemoryCursor(self, sql, args, prefetch)
+
+    @asynccontextmanager
+    async def transaction(self, **kwargs):
+        # Statements apply immediately; nothing to commit or roll back
+        await self.pool.latency.wait()
+        yield
+        await self.pool.latency.wait()
+
+
+class MemoryPool:
+    """
+    asyncpg.Pool look-alike over a MemoryStore. ``acquire`` waits when
+    ``max_size`` connections are out.
+    """
+
+    def __init__(self, store=None, max_size=repo_sql.DB_POOL_MAX_SIZE, latency=None):
+        self.store = store or MemoryStore()
+        self.max_size = max_size
+        self.latency = latency or Latency()
+        self._slots = asyncio.Semaphore(max_size)
+        self._in_use = 0
+
+    @asynccontextmanager
+    async def acquire(self):
+        async with self._slots:
+            self._in_use += 1
+            try:
+                yield MemoryConnection(self)
+            finally:
+                self._in_use -= 1
+
+    def get_size(self):
+        return self.max_size
+
+    def get_idle_size(self):
+        return self.max_size - self._in_use
+
+    async def fetch(self, sql, *args):
+        async with self.acquire() as conn:
+            return await conn.fetch(sql, *args)
+
+    async def fetchrow(self, sql, *args):
+        async with self.acquire() as conn:
+            return await conn.fetchrow(sql, *args)
+
+    async def fetchval(self, sql, *args, column=0):
+        async with self.acquire() as conn:
+            return await conn.fetchval(sql, *args, column=column)
+
+    async def execute(self, sql, *args):
+        async with self.acquire() as conn:
+            return await conn.execute(sql, *args)
+
+    async def executemany(self, sql, args_list):
+        async with self.acquire() as conn:
+            return await conn.executemany(sql, args_list)
+
+    async def close(self):
+        pass
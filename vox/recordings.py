@@ -10,6 +10,10 @@ from datetime import datetime
 import asyncio
 
 from vox.limiter import limiter
+from vox.content_cache import cached_transform
+from vox.database import parse_timestamp
+from vox.identity import get_user_profile
+from vox.repository import delete_session_vocal_data, insert_recording, set_transformed_path
 
 router = APIRouter()
 
@@ -37,24 +41,15 @@ async def save_recording(
     transformed_filepath = None
 
     if apply_gender_transform.lower() == "true":
-        pool = request.app.state.db_pool
-        async with pool.acquire() as conn:
-            # Look up user via sessions table
-            session_row = await conn.fetchrow("SELECT user_id FROM sessions WHERE session_id = $1", sid)
-            user_row = None
-            if session_row and session_row["user_id"]:
-                user_row = await conn.fetchrow(
-                    "SELECT target_gender FROM users WHERE user_id = $1",
-                    session_row["user_id"]
-                )
-        target_gender = user_row["target_gender"] if user_row and user_row["target_gender"] else "unspecified"
+        user = await get_user_profile(request.app.state.db_pool, request.app.state.identity_cache, sid)
+        target_gender = user["target_gender"] if user and user["target_gender"] else "unspecified"
 
         transformed_filename = filename.replace(".wav", "_gendered.wav")
         transformed_filepath = os.path.join(session_dir, transformed_filename)
 
         try:
-            from gender_transform import transform_audio_to_gender
-            transform_audio_to_gender(filepath, transformed_filepath, target_gender)
+            # Retried uploads of the same audio reuse the cached transform
+            cached_transform(request.app.state.content_cache, filepath, transformed_filepath, target_gender)
         except Exception as e:
             import logging
             logging.error(f"Gender transform error: {e}")
@@ -62,17 +57,10 @@ async def save_recording(
 
     pool = request.app.state.db_pool
     async with pool.acquire() as conn:
-        await conn.execute(
-            "INSERT INTO vocal_data (session_id, timestamp, pitch, hnr, harmonics, formants, recording_path) "
-            "VALUES ($1, $2, NULL, NULL, NULL, NULL, $3)",
-            sid, timestamp, filepath
-        )
+        await insert_recording(conn, sid, parse_timestamp(timestamp), filepath)
         if transformed_filepath:
             try:
-                await conn.execute(
-                    "UPDATE vocal_data SET transformed_path = $1 WHERE session_id = $2 AND timestamp = $3",
-                    transformed_filepath, sid, timestamp
-                )
+                await set_transformed_path(conn, sid, filepath, transformed_filepath)
             except Exception:
                 pass
 
@@ -91,17 +79,9 @@ async def clear_history(request: Request, sid: str = Depends(get_session_id)):
 
     pool = request.app.state.db_pool
     async with pool.acquire() as conn:
-        rows = await conn.fetch(
-            "SELECT recording_path FROM vocal_data WHERE session_id = $1",
-            sid
-        )
-        await conn.execute(
-            "DELETE FROM vocal_data WHERE session_id = $1",
-            sid
-        )
-
-    for row in rows:
-        path = row["recording_path"]
+        paths = await delete_session_vocal_data(conn, sid)
+
+    for path in paths:
         if path and os.path.exists(path):
             try:
                 os.remove(path)
@@ -132,19 +112,10 @@ async def convert_recordings(request: Request, sid: str = Depends(get_session_id
         return JSONResponse({"status": "error", "message": "No recordings provided"}, status_code=400)
 
     pool = request.app.state.db_pool
-    async with pool.acquire() as conn:
-        # Look up user via sessions table
-        session_row = await conn.fetchrow("SELECT user_id FROM sessions WHERE session_id = $1", sid)
-        user_row = None
-        if session_row and session_row["user_id"]:
-            user_row = await conn.fetchrow(
-                "SELECT target_gender FROM users WHERE user_id = $1",
-                session_row["user_id"]
-            )
-    target_gender = user_row["target_gender"] if user_row and user_row["target_gender"] else "unspecified"
-
-    from gender_transform import transform_audio_to_gender
+    user = await get_user_profile(pool, request.app.state.identity_cache, sid)
+    target_gender = user["target_gender"] if user and user["target_gender"] else "unspecified"
 
+    cache = request.app.state.content_cache
     for original_path in paths:
         try:
             if not original_path.endswith(".wav"):
@@ -153,13 +124,10 @@ async def convert_recordings(request: Request, sid: str = Depends(get_session_id
             if os.path.exists(transformed_path):
                 continue
 
-            transform_audio_to_gender(original_path, transformed_path, target_gender)
+            cached_transform(cache, original_path, transformed_path, target_gender)
 
             async with pool.acquire() as conn:
-                await conn.execute(
-                    "UPDATE vocal_data SET transformed_path = $1 WHERE session_id = $2 AND recording_path = $3",
-                    transformed_path, sid, original_path
-                )
+                await set_transformed_path(conn, sid, original_path, transformed_path)
         except Exception as e:
             import logging
             logging.error(f"Error converting {original_path}: {e}")
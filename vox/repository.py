@@ -0,0 +1,522 @@
+import os
+import uuid
+import base64
+from datetime import datetime
+from functools import lru_cache
+
+from vox.compact_metrics import decode_metrics
+
+# How queries reach Postgres:
+#   "prepared"   each connection prepares a statement once and reuses its plan
+#                (direct connections, session-mode poolers)
+#   "pgbouncer"  unnamed statements only, re-parsed per call; required behind a
+#                transaction-mode pooler (pgbouncer, Supabase's port 6543)
+DB_STATEMENT_MODE = os.environ.get("VOX_DB_STATEMENT_MODE", "pgbouncer")
+DB_STATEMENT_CACHE_SIZE = int(os.environ.get("VOX_DB_STATEMENT_CACHE_SIZE", "256"))
+# The pool opens connections as load needs them, up to the max, and closes
+# the ones idle for VOX_DB_POOL_IDLE_S down to the min
+DB_POOL_MAX_SIZE = int(os.environ.get("VOX_DB_POOL_MAX_SIZE", "10"))
+DB_POOL_MIN_SIZE = min(int(os.environ.get("VOX_DB_POOL_MIN_SIZE", "2")), DB_POOL_MAX_SIZE)
+DB_POOL_IDLE_S = float(os.environ.get("VOX_DB_POOL_IDLE_S", "300"))
+# "postgres", or "memory" for an in-process store (vox/memory_store.py)
+STORAGE_BACKEND = os.environ.get("VOX_STORAGE", "postgres")
+
+STATEMENT_MODES = ("prepared", "pgbouncer")
+STORAGE_BACKENDS = ("postgres", "memory")
+
+
+def connect_options(mode=None):
+    """
+    asyncpg connect/create_pool keyword arguments for a statement mode
+    (default VOX_DB_STATEMENT_MODE).
+    """
+    mode = mode or DB_STATEMENT_MODE
+    if mode == "prepared":
+        return {"statement_cache_size": DB_STATEMENT_CACHE_SIZE}
+    if mode == "pgbouncer":
+        return {"statement_cache_size": 0}
+    raise ValueError(f"Unknown VOX_DB_STATEMENT_MODE {mode!r}, expected one of {STATEMENT_MODES}")
+
+
+async def create_pool(db_url, mode=None, **kwargs):
+    import asyncpg
+    kwargs.setdefault("max_size", DB_POOL_MAX_SIZE)
+    kwargs.setdefault("min_size", min(DB_POOL_MIN_SIZE, kwargs["max_size"]))
+    kwargs.setdefault("max_inactive_connection_lifetime", DB_POOL_IDLE_S)
+    return await asyncpg.create_pool(db_url, **connect_options(mode), **kwargs)
+
+
+async def create_storage(db_url=None, backend=None):
+    """
+    The pool the app runs its statements on for a VOX_STORAGE backend: an
+    asyncpg pool (None without ``db_url``) or a MemoryPool, wrapped in a
+    db_pool.InstrumentedPool.
+    """
+    from vox.db_pool import InstrumentedPool
+    backend = backend or STORAGE_BACKEND
+    if backend == "memory":
+        from vox.memory_store import MemoryPool
+        return InstrumentedPool(MemoryPool())
+    if backend == "postgres":
+        return InstrumentedPool(await create_pool(db_url)) if db_url else None
+    raise ValueError(f"Unknown VOX_STORAGE {backend!r}, expected one of {STORAGE_BACKENDS}")
+
+
+# Every function takes ``db``: a pool or an acquired connection. Statements
+# are module constants so the text is identical on every call, which is what
+# the per-connection statement cache keys on in prepared mode.
+
+# --- Users and sessions ---
+
+USER_PROFILE_SQL = """
+SELECT u.user_id, u.user_name, u.user_pronouns, u.target_gender
+FROM sessions s JOIN users u ON u.user_id = s.user_id
+WHERE s.session_id = $1
+"""
+
+USER_ACCOUNT_SQL = """
+SELECT u.user_id, u.email, u.email_verified, u.discord_id, u.user_name, u.user_pronouns
+FROM sessions s JOIN users u ON u.user_id = s.user_id
+WHERE s.session_id = $1
+"""
+
+# New visitor: the user and their session in one round trip
+CREATE_USER_SESSION_SQL = """
+WITH new_user AS (
+    INSERT INTO users (user_id, user_name, user_pronouns) VALUES ($2, $3, $4)
+    RETURNING user_id
+)
+INSERT INTO sessions (session_id, user_id, created_at, expires_at)
+SELECT $1, user_id, now(), $5 FROM new_user
+"""
+
+# Session -> user resolved inside the UPDATE; NULL arguments keep the old value
+UPDATE_SESSION_USER_SQL = """
+UPDATE users u
+SET user_name = COALESCE($2, u.user_name),
+    user_pronouns = COALESCE($3, u.user_pronouns),
+    target_gender = COALESCE($4, u.target_gender),
+    updated_at = now()
+FROM sessions s
+WHERE s.session_id = $1 AND u.user_id = s.user_id
+RETURNING u.user_id
+"""
+
+
+async def fetch_user_profile(db, session_id):
+    return await db.fetchrow(USER_PROFILE_SQL, session_id)
+
+
+async def fetch_user_account(db, session_id):
+    return await db.fetchrow(USER_ACCOUNT_SQL, session_id)
+
+
+async def create_user_with_session(db, session_id, user_id, user_name, user_pronouns, expires_at):
+    await db.execute(CREATE_USER_SESSION_SQL, session_id, user_id, user_name, user_pronouns, expires_at)
+
+
+async def update_session_user(db, session_id, user_name=None, user_pronouns=None, target_gender=None):
+    """
+    Update the user behind a session; returns their user_id, or None if the
+    session has no user.
+    """
+    return await db.fetchval(UPDATE_SESSION_USER_SQL, session_id, user_name, user_pronouns, target_gender)
+
+
+# --- Email/password and Discord accounts ---
+
+USER_BY_EMAIL_SQL = "SELECT * FROM users WHERE email = $1"
+USER_BY_DISCORD_ID_SQL = "SELECT * FROM users WHERE discord_id = $1"
+
+CREATE_EMAIL_USER_SQL = """
+INSERT INTO users (email, password_hash, user_name, user_pronouns, verification_token, verification_token_expires)
+VALUES ($1, $2, $3, $4, $5, $6)
+"""
+
+# Token check and update in one statement
+VERIFY_EMAIL_SQL = """
+UPDATE users
+SET email_verified = TRUE, verification_token = NULL, verification_token_expires = NULL
+WHERE verification_token = $1 AND verification_token_expires > now()
+RETURNING user_id
+"""
+
+UPSERT_PASSWORD_RESET_SQL = """
+INSERT INTO password_resets (email, token, expires_at) VALUES ($1, $2, $3)
+ON CONFLICT (token) DO UPDATE SET expires_at = $3
+"""
+
+PASSWORD_RESET_SQL = """
+SELECT r.email, u.user_id
+FROM password_resets r LEFT JOIN users u ON u.email = r.email
+WHERE r.token = $1 AND r.expires_at > now()
+"""
+
+# Consumes the token with the same statement that sets the password
+RESET_PASSWORD_SQL = """
+WITH used AS (
+    DELETE FROM password_resets WHERE token = $1
+)
+UPDATE users SET password_hash = $2, updated_at = now() WHERE email = $3
+"""
+
+
+async def fetch_user_by_email(db, email):
+    return await db.fetchrow(USER_BY_EMAIL_SQL, email)
+
+
+async def fetch_user_by_discord_id(db, discord_id):
+    return await db.fetchrow(USER_BY_DISCORD_ID_SQL, discord_id)
+
+
+async def create_email_user(db, email, password_hash, user_name, user_pronouns, token, expires):
+    await db.execute(CREATE_EMAIL_USER_SQL, email, password_hash, user_name, user_pronouns, token, expires)
+
+
+async def verify_email_token(db, token):
+    """
+    Mark the account holding a live verification token as verified; returns
+    its user_id, or None if the token is unknown or expired.
+    """
+    return await db.fetchval(VERIFY_EMAIL_SQL, token)
+
+
+async def save_password_reset(db, email, token, expires_at):
+    await db.execute(UPSERT_PASSWORD_RESET_SQL, email, token, expires_at)
+
+
+async def fetch_password_reset(db, token):
+    """
+    The email of a live reset token and the user_id it belongs to (None if
+    the account is gone), or None if the token is unknown or expired.
+    """
+    return await db.fetchrow(PASSWORD_RESET_SQL, token)
+
+
+async def apply_password_reset(db, token, email, password_hash):
+    await db.execute(RESET_PASSWORD_SQL, token, password_hash, email)
+
+
+# --- Vocal data ---
+
+LATEST_FULL_METRICS_SQL = """
+SELECT pitch, hnr, f1, f2, f3, f1_bw, f2_bw, f3_bw, harmonic_amps, jitter, shimmer,
+       harmonics, formants, jitter_shimmer
+FROM vocal_data
+WHERE session_id = $1 AND hnr IS NOT NULL
+ORDER BY timestamp DESC LIMIT 1
+"""
+
+INSERT_RECORDING_SQL = """
+INSERT INTO vocal_data (session_id, timestamp, pitch, hnr, harmonics, formants, recording_path)
+VALUES ($1, $2, NULL, NULL, NULL, NULL, $3)
+"""
+
+SET_TRANSFORMED_PATH_SQL = """
+UPDATE vocal_data SET transformed_path = $1
+WHERE session_id = $2 AND recording_path = $3
+"""
+
+# Returns the deleted paths so the files can be removed without a prior SELECT
+DELETE_SESSION_VOCAL_DATA_SQL = "DELETE FROM vocal_data WHERE session_id = $1 RETURNING recording_path"
+
+
+async def fetch_latest_full_metrics(db, session_id):
+    """
+    pitch, hnr, harmonics, formants and jitter_shimmer (API form) of the
+    session's latest full-tier row, or None.
+    """
+    row = await db.fetchrow(LATEST_FULL_METRICS_SQL, session_id)
+    if row is None:
+        return None
+    metrics = decode_metrics(row)
+    return {
+        "pitch": row["pitch"],
+        "hnr": row["hnr"],
+        "harmonics": metrics["harmonics"],
+        "formants": metrics["formants"],
+        "jitter_shimmer": metrics["jitter_shimmer"],
+    }
+
+
+async def insert_recording(db, session_id, timestamp, recording_path):
+    await db.execute(INSERT_RECORDING_SQL, session_id, timestamp, recording_path)
+
+
+async def set_transformed_path(db, session_id, recording_path, transformed_path):
+    await db.execute(SET_TRANSFORMED_PATH_SQL, transformed_path, session_id, recording_path)
+
+
+async def delete_session_vocal_data(db, session_id):
+    """
+    Delete a session's vocal_data rows; returns their recording paths.
+    """
+    rows = await db.fetch(DELETE_SESSION_VOCAL_DATA_SQL, session_id)
+    return [row["recording_path"] for row in rows]
+
+
+# --- Performance history ---
+#
+# Pages are keyset-paginated on (user_id, timestamp, id), newest first, and
+# served by idx_vocal_data_user_timestamp: each page is an index range scan
+# however deep into the history it starts.
+
+# API field -> the columns it is decoded from (compact and legacy, see
+# vox/compact_metrics.py)
+PERFORMANCE_FIELD_COLUMNS = {
+    "pitch": ("pitch",),
+    "hnr": ("hnr",),
+    "harmonics": ("pitch", "harmonic_amps", "harmonics"),
+    "formants": ("f1", "f2", "f3", "f1_bw", "f2_bw", "f3_bw", "formants"),
+    "jitter_shimmer": ("jitter", "shimmer", "jitter_shimmer"),
+    "voice_report": ("voice_report", "praat_report"),
+    "praat_report": ("voice_report", "praat_report"),
+    "recording_path": ("recording_path",),
+}
+PERFORMANCE_FIELDS = tuple(PERFORMANCE_FIELD_COLUMNS)
+# What /user/get_performances returns when no fields are requested
+PERFORMANCE_DEFAULT_FIELDS = ("pitch", "hnr", "harmonics", "formants", "recording_path")
+# Only these can be averaged into downsampled buckets
+PERFORMANCE_NUMERIC_FIELDS = ("pitch", "hnr")
+
+# Buckets are aligned to the range start, so there are never more than ``points``
+PERFORMANCE_BUCKETS_SQL = """
+SELECT $2::timestamp + make_interval(secs => floor(extract(epoch FROM timestamp - $2::timestamp)::float8 / $4::float8) * $4::float8) AS timestamp,
+       avg(pitch) AS pitch,
+       avg(hnr) AS hnr,
+       count(*) AS samples
+FROM vocal_data
+WHERE user_id = $1 AND timestamp >= $2 AND timestamp < $3
+GROUP BY 1
+ORDER BY 1
+"""
+
+
+# Every statement performances_sql has built -> its (fields, after_cursor,
+# limited), so the memory storage backend can serve a variant from its
+# arguments
+PERFORMANCE_STATEMENTS = {}
+
+
+def performance_columns(fields):
+    """The vocal_data columns a history page with ``fields`` selects, in order."""
+    unknown = set(fields) - set(PERFORMANCE_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown performance fields: {sorted(unknown)}")
+    return tuple(dict.fromkeys(("id", "timestamp") + tuple(c for f in fields for c in PERFORMANCE_FIELD_COLUMNS[f])))
+
+
+@lru_cache(maxsize=None)
+def performances_sql(fields, after_cursor, limited):
+    """
+    Statement for one projection of the performance history; ``fields`` is a
+    tuple from PERFORMANCE_FIELDS. The text only depends on the arguments,
+    so each variant is prepared once per connection.
+    """
+    sql = f"SELECT {', '.join(performance_columns(fields))} FROM vocal_data WHERE user_id = $1 AND timestamp IS NOT NULL"
+    n = 1
+    if after_cursor:
+        sql += " AND (timestamp, id) < ($2, $3)"
+        n = 3
+    sql += " ORDER BY timestamp DESC, id DESC"
+    if limited:
+        sql += f" LIMIT ${n + 1}"
+    PERFORMANCE_STATEMENTS[sql] = (fields, after_cursor, limited)
+    return sql
+
+
+def performance_dict(row, fields):
+    """
+    The requested API fields of a history row, plus its timestamp.
+    """
+    performance = {"timestamp": row["timestamp"]}
+    metrics = decode_metrics(row)
+    for field in fields:
+        performance[field] = metrics[field] if field in metrics else row[field]
+    return performance
+
+
+def encode_cursor(row):
+    """
+    Opaque cursor pointing just past ``row`` (which must have id and timestamp).
+    """
+    raw = f"{row['timestamp'].isoformat()}|{row['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    (timestamp, id) from ``encode_cursor``; ValueError if it is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, row_id = raw.split("|")
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor!r}") from e
+
+
+def _performance_args(user_id, cursor):
+    return (user_id, *decode_cursor(cursor)) if cursor else (user_id,)
+
+
+async def fetch_performances_page(db, user_id, fields=PERFORMANCE_DEFAULT_FIELDS, limit=100, cursor=None):
+    """
+    Up to ``limit`` rows older than ``cursor`` (newest first) and the cursor
+    of the next page, or None on the last page.
+    """
+    sql = performances_sql(tuple(fields), cursor is not None, True)
+    rows = await db.fetch(sql, *_performance_args(user_id, cursor), limit + 1)
+    if len(rows) > limit:
+        return rows[:limit], encode_cursor(rows[limit - 1])
+    return rows, None
+
+
+async def iter_performances(conn, user_id, fields=PERFORMANCE_DEFAULT_FIELDS, cursor=None, prefetch=500):
+    """
+    Stream rows older than ``cursor`` (newest first) through a server-side
+    cursor, ``prefetch`` rows per round trip. Needs a connection inside a
+    transaction, which stays open until the iteration ends.
+    """
+    sql = performances_sql(tuple(fields), cursor is not None, False)
+    async for row in conn.cursor(sql, *_performance_args(user_id, cursor), prefetch=prefetch):
+        yield row
+
+
+async def fetch_performance_buckets(db, user_id, start, end, points):
+    """
+    Mean pitch and HNR over at most ``points`` equal time buckets from
+    ``start`` to ``end``, for charting long ranges. Each bucket is labelled
+    with its start.
+    """
+    width = max((end - start).total_seconds() / max(points, 1), 1.0)
+    return await db.fetch(PERFORMANCE_BUCKETS_SQL, user_id, start, end, width)
+
+
+# --- Progress rollups (see vox/rollups.py) ---
+
+SESSION_USERS_SQL = "SELECT session_id, user_id FROM sessions WHERE session_id = ANY($1::uuid[]) AND user_id IS NOT NULL"
+
+# Adds a batch's deltas; histograms are summed bin by bin
+UPSERT_ROLLUP_SQL = """
+INSERT INTO vocal_rollups (user_id, granularity, bucket, metric, count, sum, sum_sq, min, max, histogram)
+VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10)
+ON CONFLICT (user_id, granularity, metric, bucket) DO UPDATE SET
+    count = vocal_rollups.count + EXCLUDED.count,
+    sum = vocal_rollups.sum + EXCLUDED.sum,
+    sum_sq = vocal_rollups.sum_sq + EXCLUDED.sum_sq,
+    min = LEAST(vocal_rollups.min, EXCLUDED.min),
+    max = GREATEST(vocal_rollups.max, EXCLUDED.max),
+    histogram = ARRAY(
+        SELECT COALESCE(a, 0) + COALESCE(b, 0)
+        FROM unnest(vocal_rollups.histogram, EXCLUDED.histogram) WITH ORDINALITY AS h(a, b, i)
+        ORDER BY i
+    )
+"""
+
+ROLLUPS_SQL = """
+SELECT metric, bucket, count, sum, sum_sq, min, max, histogram FROM vocal_rollups
+WHERE user_id = $1 AND granularity = $2 AND metric = ANY($3::text[]) AND bucket >= $4 AND bucket < $5
+ORDER BY metric, bucket
+"""
+
+DELETE_ROLLUPS_SQL = "DELETE FROM vocal_rollups"
+DELETE_USER_ROLLUPS_SQL = "DELETE FROM vocal_rollups WHERE user_id = $1"
+
+# vocal_data rows with the user they belong to, directly or through their
+# session; rows not yet migrated to the compact columns are read from JSONB
+ROLLUP_SOURCE_SQL = """
+SELECT COALESCE(v.user_id, s.user_id) AS user_id, v.timestamp, v.pitch, v.hnr,
+       COALESCE(v.f1, (v.formants->0->>'freq')::real) AS f1,
+       COALESCE(v.f2, (v.formants->1->>'freq')::real) AS f2,
+       COALESCE(v.f3, (v.formants->2->>'freq')::real) AS f3,
+       COALESCE(v.jitter, (v.jitter_shimmer->>'jitter_local')::real) AS jitter,
+       COALESCE(v.shimmer, (v.jitter_shimmer->>'shimmer_local')::real) AS shimmer
+FROM vocal_data v LEFT JOIN sessions s ON s.session_id = v.session_id
+WHERE v.timestamp IS NOT NULL AND COALESCE(v.user_id, s.user_id) IS NOT NULL
+"""
+USER_ROLLUP_SOURCE_SQL = ROLLUP_SOURCE_SQL + "AND COALESCE(v.user_id, s.user_id) = $1\n"
+
+
+def is_uuid(value):
+    try:
+        uuid.UUID(str(value))
+        return True
+    except ValueError:
+        return False
+
+
+async def fetch_session_users(db, session_ids):
+    """
+    {session_id: user_id} (as strings) for the sessions that have a user.
+    Ids that aren't UUIDs can't be sessions and are skipped before the cast.
+    """
+    session_ids = [str(sid) for sid in session_ids if sid is not None and is_uuid(sid)]
+    if not session_ids:
+        return {}
+    rows = await db.fetch(SESSION_USERS_SQL, session_ids)
+    return {str(row["session_id"]): row["user_id"] for row in rows}
+
+
+async def upsert_rollups(db, records):
+    await db.executemany(UPSERT_ROLLUP_SQL, records)
+
+
+async def fetch_rollups(db, user_id, granularity, metrics, start, end):
+    return await db.fetch(ROLLUPS_SQL, user_id, granularity, list(metrics), start, end)
+
+
+async def delete_rollups(db, user_id=None):
+    if user_id is None:
+        await db.execute(DELETE_ROLLUPS_SQL)
+    else:
+        await db.execute(DELETE_USER_ROLLUPS_SQL, user_id)
+
+
+async def iter_rollup_source(conn, user_id=None, prefetch=1000):
+    """
+    Stream every vocal_data row with its user; needs a transaction.
+    """
+    if user_id is None:
+        rows = conn.cursor(ROLLUP_SOURCE_SQL, prefetch=prefetch)
+    else:
+        rows = conn.cursor(USER_ROLLUP_SOURCE_SQL, user_id, prefetch=prefetch)
+    async for row in rows:
+        yield row
+
+
+# --- Maintenance job leases (see vox/maintenance.py) ---
+
+# Claims a job for one worker: succeeds only when no other worker holds an
+# unexpired lease and the job last started at least an interval ago
+CLAIM_MAINTENANCE_JOB_SQL = """
+INSERT INTO maintenance_runs AS m (job, holder, lease_until, last_started_at)
+VALUES ($1, $2, (now() AT TIME ZONE 'utc') + $3::interval, now() AT TIME ZONE 'utc')
+ON CONFLICT (job) DO UPDATE
+SET holder = EXCLUDED.holder, lease_until = EXCLUDED.lease_until, last_started_at = EXCLUDED.last_started_at
+WHERE m.lease_until < now() AT TIME ZONE 'utc'
+  AND m.last_started_at <= (now() AT TIME ZONE 'utc') - $4::interval
+RETURNING job
+"""
+
+FINISH_MAINTENANCE_JOB_SQL = """
+UPDATE maintenance_runs
+SET lease_until = now() AT TIME ZONE 'utc', last_finished_at = now() AT TIME ZONE 'utc',
+    last_duration_ms = $3, last_deleted = $4, last_error = $5, runs = runs + 1
+WHERE job = $1 AND holder = $2
+"""
+
+MAINTENANCE_RUNS_SQL = "SELECT * FROM maintenance_runs ORDER BY job"
+
+
+async def claim_maintenance_job(db, job, holder, lease, interval):
+    """True if ``holder`` now owns ``job`` for ``lease`` (timedeltas)."""
+    return await db.fetchval(CLAIM_MAINTENANCE_JOB_SQL, job, holder, lease, interval) is not None
+
+
+async def finish_maintenance_job(db, job, holder, duration_ms, deleted, error=None):
+    await db.execute(FINISH_MAINTENANCE_JOB_SQL, job, holder, duration_ms, deleted, error)
+
+
+async def fetch_maintenance_runs(db):
+    return await db.fetch(MAINTENANCE_RUNS_SQL)
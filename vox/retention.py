@@ -0,0 +1,239 @@
+import os
+import re
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+# vocal_data is range-partitioned by month on timestamp (naive UTC):
+# vocal_data_pYYYYMM holds [YYYY-MM-01, next month) and vocal_data_default
+# catches anything outside the existing months. Partitions are created ahead
+# of time. Row retention is opt-in: with VOX_RETENTION_DAYS set, each whole
+# month is detached (and by default dropped) once all of it is older than
+# that, and the recording files its rows point to are deleted. vocal_rollups
+# is untouched, so trends outlive the raw rows. Recording files are only
+# ever deleted for rows that retention removes; sweeping by file age is a
+# manual, opt-in tool (utils.cleanup_old_recordings).
+
+RETENTION_DAYS = int(os.environ.get("VOX_RETENTION_DAYS", "0"))  # 0 keeps every row
+RECORDING_RETENTION_DAYS = int(os.environ.get("VOX_RECORDING_RETENTION_DAYS", "0"))  # 0 keeps every file
+RETENTION_MODE = os.environ.get("VOX_RETENTION_MODE", "drop")  # drop, or detach to keep the table
+RETENTION_INTERVAL_HOURS = float(os.environ.get("VOX_RETENTION_INTERVAL_HOURS", "6"))
+PARTITION_MONTHS_AHEAD = int(os.environ.get("VOX_PARTITION_MONTHS_AHEAD", "2"))
+RETENTION_MODES = ("drop", "detach")
+
+RECORDINGS_DIR = "recordings"
+DEFAULT_PARTITION = "vocal_data_default"
+
+_PARTITION_NAME = re.compile(r"^vocal_data_p(\d{4})(\d{2})$")
+
+logger = logging.getLogger(__name__)
+
+IS_PARTITIONED_SQL = "SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass('vocal_data')"
+
+LIST_PARTITIONS_SQL = """
+SELECT c.relname FROM pg_inherits i
+JOIN pg_class c ON c.oid = i.inhrelid
+WHERE i.inhparent = 'vocal_data'::regclass
+"""
+
+CREATE_DEFAULT_PARTITION_SQL = f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF vocal_data DEFAULT"
+
+
+def month_start(timestamp):
+    return datetime(timestamp.year, timestamp.month, 1)
+
+
+def add_months(month, n):
+    years, month_index = divmod(month.month - 1 + n, 12)
+    return datetime(month.year + years, month_index + 1, 1)
+
+
+def partition_name(month):
+    return f"vocal_data_p{month:%Y%m}"
+
+
+def partition_month(name):
+    """The month a partition covers, or None for tables not named by partition_name."""
+    match = _PARTITION_NAME.match(name)
+    return datetime(int(match[1]), int(match[2]), 1) if match else None
+
+
+async def is_partitioned(conn):
+    return bool(await conn.fetchval(IS_PARTITIONED_SQL))
+
+
+async def list_partitions(conn):
+    """Monthly partitions of vocal_data, as {month: table name}."""
+    partitions = {}
+    for row in await conn.fetch(LIST_PARTITIONS_SQL):
+        month = partition_month(row["relname"])
+        if month is not None:
+            partitions[month] = row["relname"]
+    return partitions
+
+
+async def create_partition(conn, month):
+    """
+    Attach the partition for ``month``, first moving in any of its rows that
+    were written to the default partition (the attach would fail otherwise).
+    """
+    name = partition_name(month)
+    end = add_months(month, 1)
+    async with conn.transaction():
+        await conn.execute(f"CREATE TABLE {name} (LIKE vocal_data INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+        await conn.execute(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE timestamp >= $1 AND timestamp < $2 RETURNING *) "
+            f"INSERT INTO {name} SELECT * FROM moved",
+            month, end
+        )
+        await conn.execute(
+            f"ALTER TABLE vocal_data ATTACH PARTITION {name} FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')"
+        )
+    return name
+
+
+async def ensure_partitions(conn, since=None, months_ahead=PARTITION_MONTHS_AHEAD):
+    """
+    Create the default partition and the monthly partitions from ``since``
+    (default: this month) to ``months_ahead`` months from now. Returns the
+    names created, or None if vocal_data is not partitioned yet
+    (partition_vocal_data.py converts it).
+    """
+    if not await is_partitioned(conn):
+        return None
+    await conn.execute(CREATE_DEFAULT_PARTITION_SQL)
+    existing = await list_partitions(conn)
+    this_month = month_start(datetime.utcnow())
+    month = month_start(since) if since else this_month
+    created = []
+    while month <= add_months(this_month, months_ahead):
+        if month not in existing:
+            created.append(await create_partition(conn, month))
+        month = add_months(month, 1)
+    return created
+
+
+async def expire_partitions(conn, cutoff, mode=RETENTION_MODE, recordings_dir=RECORDINGS_DIR):
+    """
+    Detach every monthly partition that ends on or before ``cutoff``, then
+    drop it (mode "drop") or keep it as vocal_data_archive_pYYYYMM (mode
+    "detach"). Rows in the default partition older than the cutoff are
+    deleted. The recording files of the expired rows are removed inside the
+    same transaction, before it commits: a crash in between leaves rows
+    without files, to be expired again, never files without rows. Returns
+    (expired table names, number of files removed).
+    """
+    if mode not in RETENTION_MODES:
+        raise ValueError(f"Unknown retention mode {mode!r}, expected one of {RETENTION_MODES}")
+    expired, removed = [], 0
+    for month, name in sorted((await list_partitions(conn)).items()):
+        if add_months(month, 1) > cutoff:
+            continue
+        async with conn.transaction():
+            await conn.execute(f"ALTER TABLE vocal_data DETACH PARTITION {name}")
+            # Read after the detach so no row can gain a path in between
+            rows = await conn.fetch(f"SELECT recording_path FROM {name} WHERE recording_path IS NOT NULL")
+            removed += await asyncio.to_thread(remove_recordings, [row["recording_path"] for row in rows], recordings_dir)
+            if mode == "drop":
+                await conn.execute(f"DROP TABLE {name}")
+            else:
+                await conn.execute(f"ALTER TABLE {name} RENAME TO vocal_data_archive_p{month:%Y%m}")
+        expired.append(name)
+    # Late rows for months that are already gone land in the default partition
+    async with conn.transaction():
+        rows = await conn.fetch(
+            f"DELETE FROM {DEFAULT_PARTITION} WHERE timestamp < $1 RETURNING recording_path", cutoff
+        )
+        paths = [row["recording_path"] for row in rows if row["recording_path"]]
+        removed += await asyncio.to_thread(remove_recordings, paths, recordings_dir)
+    return expired, removed
+
+
+def remove_recordings(paths, recordings_dir=RECORDINGS_DIR):
+    """
+    Delete the recording files (and their _gendered.wav transforms) at
+    ``paths``, then any session directories left empty. Paths outside
+    ``recordings_dir`` are skipped. Returns the number of files deleted.
+    """
+    root = os.path.realpath(recordings_dir)
+    removed = 0
+    session_dirs = set()
+    for path in paths:
+        # Stored as "recordings/<sid>/<file>.wav" or in URL form with a leading slash
+        full_path = os.path.realpath(path.lstrip("/"))
+        if os.path.commonpath([root, full_path]) != root or full_path == root:
+            logger.warning(f"Not deleting recording outside {recordings_dir}: {path}")
+            continue
+        candidates = [full_path]
+        if full_path.endswith(".wav"):
+            candidates.append(full_path[:-len(".wav")] + "_gendered.wav")
+        for candidate in candidates:
+            try:
+                os.remove(candidate)
+                removed += 1
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.error(f"Error deleting {candidate}: {e}")
+        session_dirs.add(os.path.dirname(full_path))
+    for session_dir in session_dirs:
+        if session_dir != root:
+            try:
+                os.rmdir(session_dir)
+            except OSError:
+                pass  # not empty or already gone
+    return removed
+
+
+def sweep_old_recordings(days=RECORDING_RETENTION_DAYS, recordings_dir=RECORDINGS_DIR):
+    """
+    Delete recording files older than ``days`` by mtime, whether or not
+    their rows still exist, then any session directories left empty. Not
+    scheduled: only for operators who opt in with ``days``. Blocking: run
+    it in a thread. Returns the number of files deleted.
+    """
+    if days <= 0 or not os.path.isdir(recordings_dir):
+        return 0
+    cutoff = (datetime.now() - timedelta(days=days)).timestamp()
+    removed = 0
+    for session in os.scandir(recordings_dir):
+        if not session.is_dir():
+            continue
+        for entry in os.scandir(session.path):
+            if entry.is_file() and entry.name.endswith(".wav") and entry.stat().st_mtime < cutoff:
+                try:
+                    os.remove(entry.path)
+                    removed += 1
+                except OSError as e:
+                    logger.error(f"Error deleting {entry.path}: {e}")
+        try:
+            os.rmdir(session.path)
+        except OSError:
+            pass  # not empty
+    if removed:
+        logger.info(f"Deleted {removed} recordings older than {days} days")
+    return removed
+
+
+async def run_retention(conn, retention_days=RETENTION_DAYS, mode=RETENTION_MODE,
+                        months_ahead=PARTITION_MONTHS_AHEAD, recordings_dir=RECORDINGS_DIR):
+    """
+    One vocal_data maintenance pass: create the upcoming monthly partitions,
+    expire the ones older than ``retention_days`` and delete their recording
+    files (see expire_partitions). Returns a summary dict, or None if
+    vocal_data is not partitioned.
+    """
+    created = await ensure_partitions(conn, months_ahead=months_ahead)
+    if created is None:
+        logger.warning("vocal_data is not partitioned, skipping retention (run partition_vocal_data.py)")
+        return None
+    summary = {"created": created, "expired": [], "files_removed": 0}
+    if retention_days > 0:
+        cutoff = datetime.utcnow() - timedelta(days=retention_days)
+        summary["expired"], summary["files_removed"] = await expire_partitions(conn, cutoff, mode, recordings_dir)
+    if created or summary["expired"]:
+        logger.info(
+            f"vocal_data retention: created {created}, {mode} {summary['expired']}, "
+            f"removed {summary['files_removed']} recording files"
+        )
+    return summary
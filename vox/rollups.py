@@ -0,0 +1,192 @@
+import math
+from datetime import datetime
+
+from vox.repository import delete_rollups, fetch_session_users, iter_rollup_source, upsert_rollups
+
+# Per-user aggregates of vocal_data, kept in vocal_rollups and updated by
+# VocalDataWriter as rows are flushed. Each (user, granularity, bucket, metric)
+# holds count, sum, sum of squares, min, max and a fixed-bin histogram. All
+# of these add up across batches, so a flush only adds its own rows and
+# percentiles come from the histogram.
+
+ROLLUP_GRANULARITIES = ("hour", "day")
+
+# metric -> (low, high, bins, log-spaced); values outside [low, high] land
+# in the end bins. Changing a layout makes stored histograms meaningless:
+# rebuild the rollups (rebuild_rollups.py) after editing it.
+ROLLUP_METRICS = {
+    "pitch": (50.0, 1000.0, 96, True),
+    "hnr": (-10.0, 40.0, 100, False),
+    "f1": (100.0, 5000.0, 96, True),
+    "f2": (100.0, 5000.0, 96, True),
+    "f3": (100.0, 5000.0, 96, True),
+    "jitter": (0.0005, 0.1, 64, True),
+    "shimmer": (0.005, 0.5, 64, True),
+}
+
+TREND_PERCENTILES = (10, 50, 90)
+
+
+def metric_values(row):
+    """
+    The rollup metrics present in a vocal_data row (a mapping with the
+    compact metric columns). Zeros stand for failed estimates and are left
+    out, except for HNR.
+    """
+    values = {}
+    for metric in ROLLUP_METRICS:
+        value = row.get(metric)
+        if value is not None and (value or metric == "hnr") and math.isfinite(value):
+            values[metric] = float(value)
+    return values
+
+
+def _scale(metric, value):
+    low, high, bins, log = ROLLUP_METRICS[metric]
+    if log:
+        return (math.log(max(value, low)) - math.log(low)) / (math.log(high) - math.log(low)) * bins
+    return (value - low) / (high - low) * bins
+
+
+def _unscale(metric, position):
+    low, high, bins, log = ROLLUP_METRICS[metric]
+    if log:
+        return math.exp(math.log(low) + position / bins * (math.log(high) - math.log(low)))
+    return low + position / bins * (high - low)
+
+
+def bin_index(metric, value):
+    bins = ROLLUP_METRICS[metric][2]
+    return min(max(int(_scale(metric, value)), 0), bins - 1)
+
+
+def bucket_start(timestamp, granularity):
+    if granularity == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class RollupAccumulator:
+    """
+    Rollup deltas for a batch of rows, keyed by (user_id, granularity,
+    bucket, metric), ready to be added to vocal_rollups.
+    """
+
+    def __init__(self):
+        self.buckets = {}  # key -> [count, sum, sum_sq, min, max, histogram]
+
+    def add(self, user_id, timestamp, values):
+        for granularity in ROLLUP_GRANULARITIES:
+            bucket = bucket_start(timestamp, granularity)
+            for metric, value in values.items():
+                key = (user_id, granularity, bucket, metric)
+                stats = self.buckets.get(key)
+                if stats is None:
+                    stats = self.buckets[key] = [0, 0.0, 0.0, value, value, [0] * ROLLUP_METRICS[metric][2]]
+                stats[0] += 1
+                stats[1] += value
+                stats[2] += value * value
+                stats[3] = min(stats[3], value)
+                stats[4] = max(stats[4], value)
+                stats[5][bin_index(metric, value)] += 1
+
+    def add_row(self, user_id, row):
+        values = metric_values(row)
+        if values:
+            self.add(user_id, row["timestamp"], values)
+
+    def records(self):
+        """Rows for ``upsert_rollups`` (vocal_rollups column order)."""
+        return [key + tuple(stats) for key, stats in self.buckets.items()]
+
+    def clear(self):
+        self.buckets.clear()
+
+    def __len__(self):
+        return len(self.buckets)
+
+
+def histogram_percentile(metric, histogram, q, low=None, high=None):
+    """
+    The q-th percentile (0-100) of the values binned in ``histogram``,
+    interpolated within its bin and clamped to the observed [low, high].
+    """
+    total = sum(histogram)
+    if not total:
+        return None
+    target = q / 100 * total
+    seen = 0
+    for i, count in enumerate(histogram):
+        if count and seen + count >= target:
+            value = _unscale(metric, i + (target - seen) / count)
+            break
+        seen += count
+    else:
+        value = _unscale(metric, len(histogram))
+    if low is not None:
+        value = max(value, low)
+    if high is not None:
+        value = min(value, high)
+    return value
+
+
+def trend_point(metric, row):
+    """One vocal_rollups row as a JSON-ready trend point."""
+    count = row["count"]
+    mean = row["sum"] / count
+    variance = max(row["sum_sq"] / count - mean * mean, 0.0)
+    point = {
+        "bucket": row["bucket"].isoformat(),
+        "count": count,
+        "mean": mean,
+        "std": math.sqrt(variance),
+        "min": row["min"],
+        "max": row["max"],
+    }
+    for q in TREND_PERCENTILES:
+        point[f"p{q}"] = histogram_percentile(metric, row["histogram"], q, row["min"], row["max"])
+    return point
+
+
+async def apply_rollups(conn, rows):
+    """
+    Add a batch of written vocal_data rows (dicts by column) to the rollups
+    of their users: the row's own user_id if it has one, otherwise the user
+    its session belongs to (the rule rebuild_rollups applies through
+    ROLLUP_SOURCE_SQL). Rows with neither are skipped.
+    """
+    unresolved = list({row["session_id"] for row in rows if row.get("user_id") is None})
+    users = await fetch_session_users(conn, unresolved) if unresolved else {}
+    accumulator = RollupAccumulator()
+    for row in rows:
+        user_id = row.get("user_id") or users.get(str(row["session_id"]))
+        if user_id is not None and isinstance(row["timestamp"], datetime):
+            accumulator.add_row(user_id, row)
+    if accumulator:
+        await upsert_rollups(conn, accumulator.records())
+    return len(accumulator)
+
+
+async def rebuild_rollups(conn, user_id=None, batch_rows=5000, progress=None):
+    """
+    Recompute vocal_rollups from vocal_data, for one user or everyone, in a
+    single transaction: readers keep seeing the old rollups until it commits.
+    Rows flushed while it runs may be counted twice, so run it when the app
+    is idle or stopped. Returns the number of vocal_data rows read.
+    """
+    accumulator = RollupAccumulator()
+    rows = 0
+    async with conn.transaction():
+        await delete_rollups(conn, user_id)
+        async for row in iter_rollup_source(conn, user_id):
+            accumulator.add_row(row["user_id"], row)
+            rows += 1
+            # Partial aggregates merge on upsert, so memory stays bounded
+            if rows % batch_rows == 0:
+                await upsert_rollups(conn, accumulator.records())
+                accumulator.clear()
+                if progress:
+                    progress(rows)
+        if accumulator:
+            await upsert_rollups(conn, accumulator.records())
+    return rows
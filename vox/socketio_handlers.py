@@ -1,59 +1,138 @@
 import numpy as np
 import asyncio
 import os
-from vox.fastapi_app import sio, get_db_pool, get_socketio, app
+from http.cookies import SimpleCookie
+from vox.fastapi_app import sio, get_db_pool, get_socketio, get_analysis_engine, get_batch_scheduler, get_vocal_writer, get_identity_cache, app
 from vox.utils import LLM_PERSONALITY_PROMPT_BASE
-from vox.audio_processing import extract_pitch_parselmouth, extract_hnr_parselmouth, extract_voice_quality_parselmouth, generate_voice_report_parselmouth, extract_harmonics, extract_formants_parselmouth
-from vox.database import save_vocal_data_async, update_recording_path_async
+from vox.analysis_engine import AnalysisOverloaded
+from vox.audio_transport import check_sample_rate, decode_raw_audio
+from vox.audio_stream import AudioStream, PitchTrackerCache, FULL_ANALYSIS_INTERVAL, ANALYSIS_SAMPLE_RATE
+from vox.database import parse_timestamp, update_recording_path_async
+from vox.identity import get_user_profile, user_name_and_pronouns
 from vox.llm import generate_feedback
+from vox.repository import fetch_latest_full_metrics, is_uuid
 
 logger = app.state.logger
 
+# Live tier: "fast" emits pitch, LPC formants and volume per window and leaves the
+# Praat metrics to the periodic full tier; "full" runs the whole chain per window.
+LIVE_TIER = os.environ.get("VOX_LIVE_TIER", "fast")
+LIVE_PITCH_MIN_CONFIDENCE = 0.5
+
+# Per-session streaming buffers and aubio pitch trackers, keyed by Socket.IO sid
+audio_streams = {}
+pitch_trackers = PitchTrackerCache()
+# One analysis worker per session drains that session's inbox
+analysis_workers = {}
+# Socket.IO sid -> the HTTP session (session_id cookie) the socket was opened
+# from; vocal_data rows are stored under it, not under the sid
+socket_sessions = {}
+
+def open_audio_stream(sid, input_rate):
+    analysis_rate = min(input_rate, ANALYSIS_SAMPLE_RATE)
+    # Keep the aubio window at ~46 ms whatever the analysis rate
+    buf_size = 2048 if analysis_rate > 24000 else 1024
+    stream = audio_streams[sid] = AudioStream(
+        input_rate,
+        pitch_tracker=pitch_trackers.get(sid, analysis_rate, buf_size=buf_size, hop_size=buf_size // 2),
+        collect_segments=LIVE_TIER != "full"
+    )
+    return stream
+
+def close_audio_stream(sid):
+    stream = audio_streams.pop(sid, None)
+    if stream is not None:
+        # Windows still queued belong to the old timeline; the running
+        # worker finishes its current window and then finds the inbox empty
+        stream.inbox.clear()
+    analysis_workers.pop(sid, None)
+    pitch_trackers.evict(sid)
+
+def http_session_id(environ):
+    """The session_id cookie of a Socket.IO handshake, if it is a valid session id."""
+    cookie = SimpleCookie(environ.get("HTTP_COOKIE", ""))
+    session_id = cookie["session_id"].value if "session_id" in cookie else None
+    return session_id if session_id and is_uuid(session_id) else None
+
+async def vocal_owner(sid):
+    """
+    (session_id, user_id) that a socket's vocal_data rows are written under,
+    (None, None) for a socket without an HTTP session.
+    """
+    session_id = socket_sessions.get(sid)
+    if session_id is None or get_db_pool() is None:
+        return session_id, None
+    try:
+        user = await get_user_profile(get_db_pool(), get_identity_cache(), session_id)
+    except Exception as e:
+        # The writer's rollups fall back to the session's user
+        logger.error(f"Session {sid} - User lookup failed: {e}")
+        user = None
+    return session_id, user["user_id"] if user else None
+
 @sio.event
 async def connect(sid, environ):
+    socket_sessions[sid] = http_session_id(environ)
     logger.info(f"Socket.IO: Client connected: {sid}")
 
 @sio.event
 async def disconnect(sid):
+    close_audio_stream(sid)
+    socket_sessions.pop(sid, None)
     logger.info(f"Socket.IO: Client disconnected: {sid}")
 
 @sio.on('start_recording')
 async def handle_start_recording(sid, data=None):
     logger.info(f"Session {sid} - Starting recording")
-    await sio.emit('recording_status', {'status': 'started', 'message': 'Recording started'}, room=sid)
+    # A new recording starts a fresh timeline and a fresh pitch tracker
+    close_audio_stream(sid)
+    status = {'status': 'started', 'message': 'Recording started'}
+    if data and data.get('sample_rate'):
+        # Sample-rate negotiation: echo the rate the server will analyze at
+        try:
+            stream = open_audio_stream(sid, check_sample_rate(data['sample_rate']))
+            status['sample_rate'] = stream.input_rate
+            status['analysis_sample_rate'] = stream.sample_rate
+        except (TypeError, ValueError) as e:
+            status = {'status': 'error', 'message': str(e)}
+    await sio.emit('recording_status', status, room=sid)
 
 @sio.on('stop_recording')
 async def handle_stop_recording(sid, data=None):
     logger.info(f"Session {sid} - Stopping recording")
+    stream = audio_streams.get(sid)
+    close_audio_stream(sid)
     await sio.emit('recording_status', {'status': 'stopped', 'message': 'Recording stopped'}, room=sid)
 
     async def generate_and_emit_feedback():
         try:
+            # Full-tier analysis of whatever was recorded since the last segment
+            result = None
+            if stream is not None:
+                # Wait for a frame still being processed to land in the segment
+                async with stream.lock:
+                    start_time = stream.segment_start_time
+                    segment = take_voiced_segment(stream)
+                if segment is not None:
+                    result = await run_full_analysis(sid, stream, segment, start_time)
+                result = result or stream.last_full_result
+
             db_pool = get_db_pool()
-            async with db_pool.acquire() as conn:
-                row = await conn.fetchrow(
-                    "SELECT pitch, hnr, harmonics, formants FROM vocal_data WHERE session_id = $1 ORDER BY timestamp DESC LIMIT 1",
-                    sid
-                )
-            if not row:
+            session_id = socket_sessions.get(sid)
+            if result is None and session_id is not None:
+                async with db_pool.acquire() as conn:
+                    result = await fetch_latest_full_metrics(conn, session_id)
+            if not result:
                 feedback_text = "No recent vocal data found to generate feedback."
             else:
-                pitch = row['pitch']
-                hnr = row['hnr']
-                harmonics = row['harmonics']
-                formants = row['formants']
+                pitch = result['pitch']
+                hnr = result['hnr']
+                harmonics = result['harmonics']
+                formants = result['formants']
+                jitter_shimmer = result['jitter_shimmer']
 
-                # Look up user via sessions table
-                async with db_pool.acquire() as conn:
-                    session_row = await conn.fetchrow("SELECT user_id FROM sessions WHERE session_id = $1", sid)
-                    user = None
-                    if session_row and session_row["user_id"]:
-                        user = await conn.fetchrow(
-                            "SELECT user_name, user_pronouns FROM users WHERE user_id = $1",
-                            session_row["user_id"]
-                        )
-                user_name = user['user_name'] if user and user['user_name'] else 'friend'
-                user_pronouns = user['user_pronouns'] if user and user['user_pronouns'] else 'they/them/theirs/themselves'
+                user = await get_user_profile(db_pool, get_identity_cache(), session_id) if session_id else None
+                user_name, user_pronouns = user_name_and_pronouns(user)
 
                 prompt = LLM_PERSONALITY_PROMPT_BASE + f"""
 User info:
@@ -65,6 +144,7 @@ Latest vocal metrics:
 - Harmonics-to-Noise Ratio (HNR): {hnr:.2f}
 - Harmonics: {harmonics}
 - Formants: {formants}
+- Jitter/Shimmer: {jitter_shimmer}
 
 Provide personalized, supportive feedback on the user's voice based on these metrics. Be encouraging and offer practical tips if appropriate.
 """
@@ -80,36 +160,114 @@ Provide personalized, supportive feedback on the user's voice based on these met
 
 @sio.on('raw_audio')
 async def handle_raw_audio(sid, data):
-    audio = np.array(data['audio'], dtype=np.float32)
-    timestamp = data['timestamp']
+    try:
+        audio, sample_rate, seq = decode_raw_audio(data)
+        # The client stamps a frame when it sends it, i.e. at its last sample
+        frame_time = parse_timestamp(data['timestamp'])
+    except (KeyError, TypeError, ValueError) as e:
+        logger.warning(f"Session {sid} - Invalid raw_audio payload: {e}")
+        return
+
+    stream = audio_streams.get(sid)
+    if stream is None or stream.input_rate != sample_rate:
+        close_audio_stream(sid)
+        stream = open_audio_stream(sid, sample_rate)
 
-    from aubio import pitch as aubio_pitch
+    # Resampling, pitch tracking and VAD run in a worker thread so a slow
+    # frame doesn't stall other sockets; only the buffer append and the
+    # inbox put stay on the loop. The lock keeps each stream's frames in order.
+    async with stream.lock:
+        if not stream.accept(seq):
+            return
+        audio = await asyncio.to_thread(stream.process, audio)
+        items = stream.append(audio, frame_time)
+        if items and stream.vad is not None:
+            voiced = await asyncio.to_thread(stream.voiced, items)
+        else:
+            voiced = [True] * len(items)
+    if audio_streams.get(sid) is not stream:
+        return  # stopped or restarted while the frame was processed
 
-    pitch_detector = aubio_pitch("yin", 2048, 1024, 44100)
-    pitch_detector.set_tolerance(0.8)
-    pitch = pitch_detector(audio)[0]
-    confidence = pitch_detector.get_confidence()
+    dropped = 0
+    for item, active in zip(items, voiced):
+        if not active:
+            # Silence or noise: no DSP, no DB row, just a small status update
+            await sio.emit('voice_activity', {'active': False, 'volume': stream.vad.level_db}, room=sid)
+            continue
+        stream.segment_voiced_windows += 1
+        dropped += stream.inbox.put(item)
 
-    if confidence > 0.9 and pitch > 20:
-        final_pitch = pitch
-    else:
-        final_pitch = extract_pitch_parselmouth(audio, 44100)
+    if dropped:
+        # The worker is behind: tell the client its live view is skipping
+        await sio.emit('analysis_status', {
+            'dropped': dropped,
+            'total_dropped': stream.inbox.dropped,
+            'coalesced': stream.inbox.coalesced,
+            'policy': stream.inbox.policy
+        }, room=sid)
+    if len(stream.inbox) and sid not in analysis_workers:
+        analysis_workers[sid] = asyncio.create_task(drain_inbox(sid, stream))
 
+    if LIVE_TIER != "full" and stream.segment_seconds >= FULL_ANALYSIS_INTERVAL:
+        # Take the segment now so a later frame can't schedule it twice
+        start_time = stream.segment_start_time
+        segment = take_voiced_segment(stream)
+        if segment is not None:
+            asyncio.create_task(run_full_analysis(sid, stream, segment, start_time))
+
+async def drain_inbox(sid, stream):
+    """
+    Analyze a session's queued windows one at a time until its inbox is empty.
+    """
     try:
-        hnr = extract_hnr_parselmouth(audio, 44100)
+        while len(stream.inbox):
+            item = stream.inbox.get()
+            if LIVE_TIER == "full":
+                await analyze_window(sid, item["audio"], stream.sample_rate, item["timestamp"], item["pitch"], item["confidence"])
+            else:
+                await analyze_window_live(sid, stream, item["audio"], item["timestamp"], item["pitch"], item["confidence"])
     except Exception as e:
-        logger.error(f"Parselmouth HNR extraction error: {e}")
-        hnr = 0.0
+        logger.error(f"Session {sid} - Analysis worker error: {e}")
+    finally:
+        if audio_streams.get(sid) is stream:
+            analysis_workers.pop(sid, None)
 
-    jitter_shimmer = extract_voice_quality_parselmouth(audio, 44100)
-    praat_report = generate_voice_report_parselmouth(audio, 44100)
-    harmonics = extract_harmonics(audio, final_pitch, 44100)
-    formants = extract_formants_parselmouth(audio, 44100)
+def timestamp_json(timestamp):
+    # Naive UTC, marked as such for the client's Date parsing
+    return timestamp.isoformat() + "Z"
 
-    db_pool = get_db_pool()
-    asyncio.create_task(
-        save_vocal_data_async(db_pool, sid, timestamp, final_pitch, hnr, harmonics, formants, jitter_shimmer, praat_report, logger)
-    )
+def take_voiced_segment(stream):
+    """
+    Take the stream's current segment, or None if it held no voiced windows.
+    """
+    voiced = stream.segment_voiced_windows > 0
+    segment = stream.take_segment()
+    return segment if voiced else None
+
+async def analyze_window(sid, window, sample_rate, timestamp, pitch=None, confidence=0.0):
+    # DSP runs on the analysis engine's pool so this handler only awaits it
+    try:
+        # Pitch and LPC formants are batched with other sessions' windows
+        live = await get_batch_scheduler().submit(window, sample_rate)
+        if pitch is None or live['confidence'] > confidence:
+            pitch, confidence = live['pitch'], live['confidence']
+        result = await get_analysis_engine().analyze(window, sample_rate, pitch, confidence, live['formants'])
+    except AnalysisOverloaded:
+        logger.warning(f"Session {sid} - Analysis queue full, dropping audio window")
+        return
+    except asyncio.TimeoutError:
+        logger.warning(f"Session {sid} - Audio analysis timed out, dropping audio window")
+        return
+
+    final_pitch = result['pitch']
+    hnr = result['hnr']
+    harmonics = result['harmonics']
+    formants = result['formants']
+    jitter_shimmer = result['jitter_shimmer']
+    praat_report = result['praat_report']
+
+    session_id, user_id = await vocal_owner(sid)
+    await get_vocal_writer().add(session_id, user_id, timestamp, final_pitch, hnr, harmonics, formants, jitter_shimmer, praat_report)
 
     await sio.emit('audio_analysis', {
         'pitch': float(final_pitch),
@@ -120,7 +278,7 @@ async def handle_raw_audio(sid, data):
         'praat_report': praat_report
     }, room=sid)
     await sio.emit('history_update', {
-        'timestamp': timestamp,
+        'timestamp': timestamp_json(timestamp),
         'pitch': float(final_pitch),
         'hnr': float(hnr),
         'harmonics': harmonics,
@@ -130,15 +288,82 @@ async def handle_raw_audio(sid, data):
         'recording_path': None
     }, room=sid)
 
+async def analyze_window_live(sid, stream, window, timestamp, pitch=None, confidence=0.0):
+    """
+    Live tier: pitch, LPC formants and volume only. HNR and harmonics shown
+    alongside them come from the most recent full-tier segment.
+    """
+    try:
+        # Pitch and LPC formants are batched with other sessions' windows
+        live = await get_batch_scheduler().submit(window, stream.sample_rate)
+    except AnalysisOverloaded:
+        logger.warning(f"Session {sid} - Analysis queue full, dropping audio window")
+        return
+    except asyncio.TimeoutError:
+        logger.warning(f"Session {sid} - Audio analysis timed out, dropping audio window")
+        return
+
+    if pitch is None or live['confidence'] > confidence:
+        pitch, confidence = live['pitch'], live['confidence']
+    final_pitch = pitch if confidence > LIVE_PITCH_MIN_CONFIDENCE and pitch > 20 else 0.0
+    formants = live['formants']
+    full = stream.last_full_result or {}
+
+    session_id, user_id = await vocal_owner(sid)
+    await get_vocal_writer().add(session_id, user_id, timestamp, final_pitch, None, None, formants, None, None)
+
+    await sio.emit('audio_analysis', {
+        'pitch': float(final_pitch),
+        'hnr': float(full.get('hnr', 0.0)),
+        'harmonics': full.get('harmonics', []),
+        'formants': formants,
+        'volume': live['volume'],
+        'jitter_shimmer': full.get('jitter_shimmer')
+    }, room=sid)
+
+async def run_full_analysis(sid, stream, segment, timestamp):
+    """
+    Full tier: voice report, jitter/shimmer and HNR over a segment of the
+    session's accumulated audio, stored under the ``timestamp`` of its first
+    sample. Stores and emits the result and returns it.
+    """
+    if len(segment) == 0:
+        return None
+    try:
+        result = await get_analysis_engine().analyze_segment(segment, stream.sample_rate)
+    except AnalysisOverloaded:
+        logger.warning(f"Session {sid} - Analysis queue full, skipping full analysis segment")
+        return None
+    except asyncio.TimeoutError:
+        logger.warning(f"Session {sid} - Full analysis timed out")
+        return None
+    stream.last_full_result = result
+
+    session_id, user_id = await vocal_owner(sid)
+    await get_vocal_writer().add(session_id, user_id, timestamp, result['pitch'], result['hnr'], result['harmonics'], result['formants'], result['jitter_shimmer'], result['praat_report'])
+
+    await sio.emit('history_update', {
+        'timestamp': timestamp_json(timestamp),
+        'pitch': float(result['pitch']),
+        'hnr': float(result['hnr']),
+        'harmonics': result['harmonics'],
+        'formants': result['formants'],
+        'jitter_shimmer': result['jitter_shimmer'],
+        'praat_report': result['praat_report'],
+        'recording_path': None
+    }, room=sid)
+    return result
+
 @sio.on('save_recording')
 async def handle_save_recording_socket(sid, data):
     timestamp = data['timestamp']
     recording_path = data['recording_path']
 
-    db_pool = get_db_pool()
-    asyncio.create_task(
-        update_recording_path_async(db_pool, sid, timestamp, recording_path)
-    )
+    session_id = socket_sessions.get(sid)
+    if session_id is not None:
+        asyncio.create_task(
+            update_recording_path_async(get_db_pool(), session_id, timestamp, recording_path)
+        )
 
     await sio.emit('history_update', {
         'timestamp': timestamp,
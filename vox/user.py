@@ -1,10 +1,35 @@
+import os
+import json
 import uuid
-from fastapi import APIRouter, Request, Depends, status
-from fastapi.responses import JSONResponse
+import typing as _t
+from datetime import datetime, timedelta
+from fastapi import APIRouter, Request, Depends, Query, status
+from fastapi.responses import JSONResponse, StreamingResponse
 from vox.limiter import limiter
+from vox.identity import get_user_profile
+from vox.database import parse_timestamp
+from vox.db_pool import EXPORT
+from vox.rollups import ROLLUP_METRICS, bucket_start, trend_point
+from vox.repository import (
+    PERFORMANCE_DEFAULT_FIELDS,
+    PERFORMANCE_FIELDS,
+    decode_cursor,
+    encode_cursor,
+    fetch_performance_buckets,
+    fetch_performances_page,
+    fetch_rollups,
+    fetch_user_account,
+    iter_performances,
+    performance_dict,
+    update_session_user,
+)
 
 router = APIRouter()
 
+PERFORMANCES_PAGE_SIZE = int(os.environ.get("VOX_PERFORMANCES_PAGE_SIZE", "100"))
+PERFORMANCES_MAX_LIMIT = int(os.environ.get("VOX_PERFORMANCES_MAX_LIMIT", "1000"))
+PERFORMANCES_STREAM_BATCH = 100
+
 
 def get_db_pool(request: Request):
     """Dependency to get db_pool from app state."""
@@ -27,13 +52,9 @@ async def set_target_gender(request: Request, sid: str = Depends(get_session_id)
     target_gender = data.get("target", "unspecified").strip()
 
     async with db_pool.acquire() as conn:
-        # Update by user_id from session
-        session_row = await conn.fetchrow("SELECT user_id FROM sessions WHERE session_id = $1", sid)
-        if session_row:
-            await conn.execute(
-                "UPDATE users SET target_gender = $1 WHERE user_id = $2",
-                target_gender, session_row["user_id"]
-            )
+        user_id = await update_session_user(conn, sid, target_gender=target_gender)
+    if user_id:
+        request.app.state.identity_cache.invalidate_user(user_id)
 
     request.app.state.logger.info(f"Session {sid} - set_target_gender: {target_gender}")
     return JSONResponse(
@@ -57,13 +78,9 @@ async def set_user_info(request: Request, sid: str = Depends(get_session_id), db
         )
 
     async with db_pool.acquire() as conn:
-        # Set user info by user_id from session
-        session_row = await conn.fetchrow("SELECT user_id FROM sessions WHERE session_id = $1", sid)
-        if session_row:
-            await conn.execute(
-                "UPDATE users SET user_name = $1, user_pronouns = $2 WHERE user_id = $3",
-                user_name, user_pronouns, session_row["user_id"]
-            )
+        user_id = await update_session_user(conn, sid, user_name=user_name, user_pronouns=user_pronouns)
+    if user_id:
+        request.app.state.identity_cache.invalidate_user(user_id)
 
     request.app.state.logger.info(f"Session {sid} - set_user_info: Name: {user_name}, Pronouns: {user_pronouns}")
     return JSONResponse(
@@ -72,33 +89,142 @@ async def set_user_info(request: Request, sid: str = Depends(get_session_id), db
     )
 
 
-@router.get("/get_performances", response_class=JSONResponse)
-async def get_performances(request: Request, sid: str = Depends(get_session_id), db_pool=Depends(get_db_pool)):
+def performance_json(row):
+    """A history row or bucket as a JSON-ready dict."""
+    return {key: value.isoformat() if isinstance(value, datetime) else value for key, value in row.items()}
+
+
+def bad_request(message):
+    return JSONResponse(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        content={"status": "error", "message": message}
+    )
+
+
+@router.get("/get_performances")
+async def get_performances(
+    request: Request,
+    sid: str = Depends(get_session_id),
+    db_pool=Depends(get_db_pool),
+    limit: _t.Optional[int] = Query(None, ge=1),
+    cursor: _t.Optional[str] = Query(None),
+    fields: _t.Optional[str] = Query(None),
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    points: _t.Optional[int] = Query(None, ge=1, le=PERFORMANCES_MAX_LIMIT),
+    start: _t.Optional[str] = Query(None),
+    end: _t.Optional[str] = Query(None)
+):
+    """
+    The user's performance history, newest first.
+
+    - json (default): one page of ``limit`` rows (default 100); the cursor of
+      the next page is in the X-Next-Cursor header, pass it back as ``cursor``.
+    - ndjson: rows are streamed from a database cursor, one JSON object per
+      line, until ``limit`` (default: the whole history); if rows remain, the
+      last line is ``{"next_cursor": ...}``.
+    - ``fields``: comma-separated columns to return besides the timestamp
+      (default PERFORMANCE_DEFAULT_FIELDS).
+    - ``points``: downsample ``start``..``end`` (ISO, default the last 7 days)
+      to at most that many buckets of mean pitch and HNR, oldest first.
+    """
+    try:
+        selected = tuple(f.strip() for f in fields.split(",") if f.strip()) if fields else PERFORMANCE_DEFAULT_FIELDS
+        if set(selected) - set(PERFORMANCE_FIELDS):
+            raise ValueError(f"fields must be among {', '.join(PERFORMANCE_FIELDS)}")
+        if cursor:
+            decode_cursor(cursor)
+        range_end = parse_timestamp(end) if end else datetime.utcnow()
+        range_start = parse_timestamp(start) if start else range_end - timedelta(days=7)
+    except ValueError as e:
+        return bad_request(str(e))
+
+    user = await get_user_profile(db_pool, request.app.state.identity_cache, sid)
+    if not user:
+        return JSONResponse(status_code=status.HTTP_200_OK, content=[])
+
+    if points:
+        async with db_pool.acquire() as conn:
+            rows = await fetch_performance_buckets(conn, user["user_id"], range_start, range_end, points)
+        return JSONResponse(status_code=status.HTTP_200_OK, content=[performance_json(dict(row)) for row in rows])
+
+    if format == "ndjson":
+        # An export holds its connection until the client has read it all: it
+        # gets a lane of its own, so slow downloads only ever wait on each other
+        return StreamingResponse(
+            stream_performances(db_pool.lane(EXPORT), user["user_id"], selected, cursor, limit),
+            media_type="application/x-ndjson"
+        )
+
     async with db_pool.acquire() as conn:
-        # Look up user_id from session
-        session_row = await conn.fetchrow("SELECT user_id FROM sessions WHERE session_id = $1", sid)
-        user_id = session_row["user_id"] if session_row else None
-        if user_id:
-            rows = await conn.fetch(
-                "SELECT timestamp, pitch, hnr, harmonics, formants, recording_path FROM vocal_data WHERE user_id = $1 ORDER BY timestamp DESC",
-                user_id
-            )
-        else:
-            rows = []
-    performances = [
-        {
-            "timestamp": row['timestamp'].isoformat() if row['timestamp'] else None,
-            "pitch": row['pitch'],
-            "hnr": row['hnr'],
-            "harmonics": row['harmonics'],
-            "formants": row['formants'],
-            "recording_path": row['recording_path']
-        }
-        for row in rows
-    ]
+        rows, next_cursor = await fetch_performances_page(
+            conn, user["user_id"], selected, min(limit or PERFORMANCES_PAGE_SIZE, PERFORMANCES_MAX_LIMIT), cursor
+        )
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
     return JSONResponse(
         status_code=status.HTTP_200_OK,
-        content=performances
+        content=[performance_json(performance_dict(row, selected)) for row in rows],
+        headers=headers
+    )
+
+
+async def stream_performances(db_pool, user_id, fields, cursor, limit):
+    # Lines go out in batches so a long history isn't one write per row
+    async with db_pool.acquire() as conn:
+        async with conn.transaction(readonly=True):
+            lines = []
+            sent = 0
+            last = None
+            async for row in iter_performances(conn, user_id, fields, cursor):
+                if limit is not None and sent == limit:
+                    lines.append(json.dumps({"next_cursor": encode_cursor(last)}) + "\n")
+                    break
+                lines.append(json.dumps(performance_json(performance_dict(row, fields))) + "\n")
+                sent += 1
+                last = row
+                if len(lines) >= PERFORMANCES_STREAM_BATCH:
+                    yield "".join(lines)
+                    lines = []
+            if lines:
+                yield "".join(lines)
+
+
+@router.get("/trends", response_class=JSONResponse)
+async def trends(
+    request: Request,
+    sid: str = Depends(get_session_id),
+    db_pool=Depends(get_db_pool),
+    granularity: str = Query("day", pattern="^(hour|day)$"),
+    metrics: _t.Optional[str] = Query(None),
+    start: _t.Optional[str] = Query(None),
+    end: _t.Optional[str] = Query(None)
+):
+    """
+    Per-hour or per-day progress (count, mean, std, min, max, p10/p50/p90)
+    of pitch, HNR, F1-F3, jitter and shimmer between ``start`` and ``end``
+    (ISO; default the last 90 days, or 7 for hourly). Reads only the
+    rollups, never raw vocal_data.
+    """
+    try:
+        selected = tuple(m.strip() for m in metrics.split(",") if m.strip()) if metrics else tuple(ROLLUP_METRICS)
+        if set(selected) - set(ROLLUP_METRICS):
+            raise ValueError(f"metrics must be among {', '.join(ROLLUP_METRICS)}")
+        range_end = parse_timestamp(end) if end else datetime.utcnow()
+        range_start = parse_timestamp(start) if start else range_end - timedelta(days=90 if granularity == "day" else 7)
+    except ValueError as e:
+        return bad_request(str(e))
+    # Include the bucket the range starts in, not just those after it
+    range_start = bucket_start(range_start, granularity)
+
+    series = {metric: [] for metric in selected}
+    user = await get_user_profile(db_pool, request.app.state.identity_cache, sid)
+    if user:
+        async with db_pool.acquire() as conn:
+            rows = await fetch_rollups(conn, user["user_id"], granularity, selected, range_start, range_end)
+        for row in rows:
+            series[row["metric"]].append(trend_point(row["metric"], row))
+    return JSONResponse(
+        status_code=status.HTTP_200_OK,
+        content={"status": "success", "granularity": granularity, "metrics": series}
     )
 
 
@@ -106,14 +232,7 @@ async def get_performances(request: Request, sid: str = Depends(get_session_id),
 async def profile(request: Request, sid: str = Depends(get_session_id), db_pool=Depends(get_db_pool)):
     async with db_pool.acquire() as conn:
         if request.method == 'GET':
-            # Fetch user by user_id from session
-            session_row = await conn.fetchrow("SELECT user_id FROM sessions WHERE session_id = $1", sid)
-            if not session_row:
-                return JSONResponse(
-                    status_code=status.HTTP_404_NOT_FOUND,
-                    content={'status': 'error', 'message': 'User not found'}
-                )
-            user = await conn.fetchrow("SELECT * FROM users WHERE user_id = $1", session_row["user_id"])
+            user = await fetch_user_account(conn, sid)
             if not user:
                 return JSONResponse(
                     status_code=status.HTTP_404_NOT_FOUND,
@@ -132,31 +251,20 @@ async def profile(request: Request, sid: str = Depends(get_session_id), db_pool=
             )
         else:
             data = await request.json()
-            user_name = data.get('name')
-            user_pronouns = data.get('pronouns')
-            updates = []
-            params = []
-            if user_name:
-                updates.append("user_name = $%d" % (len(params)+1))
-                params.append(user_name)
-            if user_pronouns:
-                updates.append("user_pronouns = $%d" % (len(params)+1))
-                params.append(user_pronouns)
-            if not updates:
+            user_name = data.get('name') or None
+            user_pronouns = data.get('pronouns') or None
+            if not user_name and not user_pronouns:
                 return JSONResponse(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     content={'status': 'error', 'message': 'No updates provided'}
                 )
-            # Update by user_id from session
-            session_row = await conn.fetchrow("SELECT user_id FROM sessions WHERE session_id = $1", sid)
-            if not session_row:
+            user_id = await update_session_user(conn, sid, user_name=user_name, user_pronouns=user_pronouns)
+            if not user_id:
                 return JSONResponse(
                     status_code=status.HTTP_404_NOT_FOUND,
                     content={'status': 'error', 'message': 'User not found'}
                 )
-            params.append(session_row["user_id"])
-            query = f"UPDATE users SET {', '.join(updates)} WHERE user_id = ${len(params)}"
-            await conn.execute(query, *params)
+            request.app.state.identity_cache.invalidate_user(user_id)
             return JSONResponse(
                 status_code=status.HTTP_200_OK,
                 content={'status': 'success', 'message': 'Profile updated'}
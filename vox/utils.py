@@ -1,7 +1,8 @@
-import glob
-import os
-from datetime import datetime, timedelta
+import logging
 from vox.fastapi_app import app
+from vox.retention import RECORDING_RETENTION_DAYS, sweep_old_recordings
+
+logger = logging.getLogger(__name__)
 
 LLM_PERSONALITY_PROMPT_BASE = (
     "You are Vox, a supportive voice therapy coach built for trans individuals, created by Shelbeely, a trans woman developer. "
@@ -17,23 +18,12 @@ LLM_PERSONALITY_PROMPT_BASE = (
     "Provide clear, practical feedback grounded in the data, and always aim to uplift the user in their journey to find their authentic voice.\n"
 )
 
-def cleanup_old_recordings():
-    now = datetime.now()
-    cutoff = now - timedelta(days=40)
-    cutoff_timestamp = cutoff.timestamp()
-    recordings_folder = 'recordings'
-    for session_dir in glob.glob(os.path.join(recordings_folder, '*')):
-        if os.path.isdir(session_dir):
-            for file in glob.glob(os.path.join(session_dir, '*.wav')):
-                if os.path.getmtime(file) < cutoff_timestamp:
-                    try:
-                        os.remove(file)
-                        logger.info(f"Deleted old recording: {file}")
-                    except Exception as e:
-                        logger.error(f"Error deleting {file}: {e}")
-            if not os.listdir(session_dir):
-                os.rmdir(session_dir)
-                logger.info(f"Deleted empty session directory: {session_dir}")
+def cleanup_old_recordings(days=RECORDING_RETENTION_DAYS):
+    """
+    Delete recordings older than ``days`` (VOX_RECORDING_RETENTION_DAYS, off
+    by default), rows or not. Blocking: run it in a thread or from a script.
+    """
+    return sweep_old_recordings(days)
 
 def log_activity(sid, action, details):
     logger.info(f"Session {sid} - {action}: {details}")